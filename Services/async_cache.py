@@ -0,0 +1,119 @@
+"""Async-safe TTL cache with coalesced loads, and single-flight calls.
+
+Concurrent callers that miss on the same key share one in-flight load
+instead of each starting their own, and a caller that is cancelled while
+waiting does not cancel the load for the others. Failed loads are not
+cached. ``invalidate`` may be called from any thread (the schema watcher
+calls it from its own); a load that was running when its key was
+invalidated is handed to its waiters but not stored.
+"""
+import asyncio
+import inspect
+import threading
+import time
+
+
+class AsyncTTLCache:
+    """Map keys to values loaded by coroutines, each kept for `ttl` seconds.
+
+    Args:
+        ttl (float): Seconds a loaded value is served before it is loaded again.
+        clock: Monotonic time source, replaceable in tests.
+    """
+
+    def __init__(self, ttl=300.0, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    async def get(self, key, loader):
+        """Return the cached value for `key`, calling ``loader()`` on a miss.
+
+        `loader` may return a value or an awaitable.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self.hits += 1
+                return entry[1]
+            pending = self._pending.get(key)
+            if pending is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                pending = asyncio.ensure_future(self._load(key, loader))
+                self._pending[key] = pending
+        # Shielded so a cancelled caller leaves the load running for the others
+        return await asyncio.shield(pending)
+
+    async def _load(self, key, loader):
+        task = asyncio.current_task()
+        try:
+            value = loader()
+            if inspect.isawaitable(value):
+                value = await value
+        except BaseException:
+            with self._lock:
+                if self._pending.get(key) is task:
+                    del self._pending[key]
+            raise
+        with self._lock:
+            # An invalidate() during the load unregistered it; its value may be stale
+            if self._pending.get(key) is task:
+                del self._pending[key]
+                self._entries[key] = (self.clock() + self.ttl, value)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one key, or every key when `key` is None."""
+        with self._lock:
+            # Loads already running must not store what they read before this call
+            if key is None:
+                self._entries.clear()
+                self._pending.clear()
+            else:
+                self._entries.pop(key, None)
+                self._pending.pop(key, None)
+
+    def stats(self):
+        """Hit, miss and coalesced-load counters plus the number of cached keys."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+                    "size": len(self._entries)}
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its outcome.
+
+    Unlike AsyncTTLCache nothing is kept once the call finishes: the next
+    caller for the key starts a new one.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._flights = {}
+
+    def in_flight(self, key):
+        return key in self._flights
+
+    async def do(self, key, function):
+        """Await ``function()`` for `key`, joining the call already running for it if any."""
+        flight = self._flights.get(key)
+        if flight is None:
+            self.calls += 1
+            flight = asyncio.ensure_future(function())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._flights.pop(key, None) if self._flights.get(key) is done else None)
+        else:
+            self.shared += 1
+        # Shielded so a disconnecting caller does not cancel the call for the others
+        return await asyncio.shield(flight)
+
+    def stats(self):
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._flights)}
@@ -0,0 +1,120 @@
+import asyncio
+import contextlib
+import os
+import stat
+import sys
+
+EXIT_COMMANDS = ['exit', 'quit', 'q', ':q', ':exit', ':quit']
+
+
+@contextlib.asynccontextmanager
+async def open_stdin_reader():
+    """Yield an async line reader for stdin that never blocks the event loop.
+
+    Pipes, ttys and sockets are wired straight into the loop with
+    connect_read_pipe on a duplicate of the stdin descriptor; anything
+    else (regular files, Windows consoles) falls back to reading lines on
+    a worker thread. On exit the transport is closed and stdin is made
+    blocking again, so later input() calls and the shell see it as before.
+    """
+    loop = asyncio.get_running_loop()
+    transport = None
+    try:
+        fd = sys.stdin.fileno()
+        mode = os.fstat(fd).st_mode
+        if not (stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode) or os.isatty(fd)):
+            # Regular files and devices such as /dev/null cannot be polled
+            raise ValueError("stdin is not a pipe, socket or tty")
+        pipe = os.fdopen(os.dup(fd), 'rb', buffering=0)
+        reader = asyncio.StreamReader()
+        protocol = asyncio.StreamReaderProtocol(reader)
+        try:
+            transport, _ = await loop.connect_read_pipe(lambda: protocol, pipe)
+        except BaseException:
+            pipe.close()
+            raise
+
+        async def readline():
+            line = await reader.readline()
+            return line.decode(errors='replace') if line else None
+    except (ValueError, NotImplementedError, OSError):
+        async def readline():
+            line = await asyncio.to_thread(sys.stdin.readline)
+            return line or None
+    try:
+        yield readline
+    finally:
+        if transport is not None:
+            transport.close()
+            # The duplicate shares the open file, so stdin was made non-blocking too
+            os.set_blocking(fd, True)
+
+
+class AsyncRepl:
+    """Read prompts from stdin while earlier prompts are still running.
+
+    Every non-empty line is started as its own task (at most
+    ``max_in_flight`` at once) and its result is printed, tagged with the
+    prompt number and text, as soon as it completes. The loop keeps
+    running between keystrokes, so background tasks are never stalled.
+    """
+
+    def __init__(self, handler, prompt="Enter your natural language query: ", max_in_flight=4, output=None):
+        self.handler = handler
+        self.prompt = prompt
+        self.output = output or sys.stdout
+        self._slots = asyncio.Semaphore(max(1, max_in_flight))
+        self._tasks = set()
+        self.history = []
+
+    def _write(self, text):
+        self.output.write(text)
+        self.output.flush()
+
+    async def _run_one(self, number, query):
+        async with self._slots:
+            try:
+                result = await self.handler(query)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result = f"Error: {e}"
+        self.history.append((query, result))
+        self._write(f"\n[{number}] {query}\n{result}\n{self.prompt}")
+
+    async def run(self, readline=None):
+        """Run until an exit command or EOF, then wait for in-flight prompts."""
+        if readline is None:
+            async with open_stdin_reader() as readline:
+                return await self._loop(readline)
+        return await self._loop(readline)
+
+    async def _loop(self, readline):
+        number = 0
+        self._write(self.prompt)
+        try:
+            while True:
+                line = await readline()
+                if line is None:
+                    break
+                query = line.strip()
+                if not query:
+                    self._write(self.prompt)
+                    continue
+                if query.lower() in EXIT_COMMANDS:
+                    break
+                number += 1
+                task = asyncio.create_task(self._run_one(number, query))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                self._write(f"[{number}] running: {query}\n{self.prompt}")
+            if self._tasks:
+                self._write(f"\nWaiting for {len(self._tasks)} running queries...\n")
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            print("Exiting interactive mode.", file=self.output)
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            for task in list(self._tasks):
+                task.cancel()
+            print("\nInteractive session terminated.", file=self.output)
+            raise
+        return self.history
@@ -0,0 +1,72 @@
+"""Microbenchmark: per-pattern regex intent matching vs the compiled IntentEngine.
+
+Run from the Services directory:
+
+    python benchmarks/bench_intent.py [--repeat 2000]
+"""
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_engine import INTENT_PATTERNS, IntentEngine
+
+QUERIES = [
+    "count of high severity threats last week",
+    "Show me the top 10 feeds by threat count",
+    "What is the distribution of threats by category?",
+    "average bandwidth per device country in the last 30 days",
+    "delete all low severity threats older than 90 days",
+    "list distinct threat types seen since yesterday",
+    "Which feeds had the lowest number of detections this month",
+    "breakdown of policy actions grouped by severity",
+    "threats from Russia to devices in Germany",
+    "tell me about the td_agg_threat table columns",
+    "how many unique actors are related to malware",
+    "show recent threats",
+]
+
+
+def legacy_get_query_intent(query_text):
+    """Reference implementation: one re.search per pattern, dict rebuilt per call."""
+    query_lower = query_text.lower().strip()
+    patterns = dict(INTENT_PATTERNS)
+    matched_intents = []
+    for intent, pattern in patterns.items():
+        if re.search(pattern, query_lower):
+            matched_intents.append(intent)
+    if not matched_intents:
+        return ['select_basic']
+    return matched_intents
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark intent classification')
+    parser.add_argument('--repeat', type=int, default=2000, help='Passes over the query corpus')
+    args = parser.parse_args()
+
+    engine = IntentEngine()
+
+    for query in QUERIES:
+        expected = legacy_get_query_intent(query)
+        actual = engine.classify(query)
+        if expected != actual:
+            print(f"MISMATCH for {query!r}: {expected} != {actual}", file=sys.stderr)
+            sys.exit(1)
+
+    calls = args.repeat * len(QUERIES)
+    legacy = timeit.timeit(lambda: [legacy_get_query_intent(q) for q in QUERIES], number=args.repeat)
+    single = timeit.timeit(lambda: [engine.classify(q) for q in QUERIES], number=args.repeat)
+    batch = timeit.timeit(lambda: engine.classify_many(QUERIES), number=args.repeat)
+
+    print(f"{'implementation':<28}{'us/query':>12}{'speedup':>10}")
+    for name, elapsed in (('re.search per pattern', legacy), ('IntentEngine.classify', single),
+                          ('IntentEngine.classify_many', batch)):
+        print(f"{name:<28}{elapsed / calls * 1e6:>12.2f}{legacy / elapsed:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
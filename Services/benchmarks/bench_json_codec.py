@@ -0,0 +1,89 @@
+"""Microbenchmark: per-request JSON work with the stdlib vs json_codec.
+
+The request path loads the schema metadata, validates the filled-in
+Grafana template, builds the dashboard API payload and serializes the
+/prompt response. The stdlib column repeats what the code did before
+json_codec (the template parsed twice and the payload re-serialized by
+requests' ``json=``); the json_codec columns parse the template once and
+embed it as RawJSON, with orjson and with the stdlib fallback. Run from
+the Services directory:
+
+    python benchmarks/bench_json_codec.py [--repeat 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICES_DIR)
+
+import json_codec
+
+TEMPLATE_FILE = os.path.join(SERVICES_DIR, 'json-templates', 'createdashboarddemo.json')
+METADATA_FILE = os.path.join(SERVICES_DIR, 'table_metadata.json')
+
+SQL_QUERY = ("SELECT toStartOfInterval(timestamp_day, INTERVAL 1 DAY) AS time_bucket, sum(count) AS threat_count "
+             "FROM td_agg_threat WHERE timestamp_day >= today() - 7 GROUP BY time_bucket ORDER BY time_bucket LIMIT 1000")
+RESPONSE = {"status": "success", "query": "daily threat count last week",
+            "dashboard": "http://localhost:3000/d/abc123/b1td-dashboard-2",
+            "route": {"path": "agent", "confidence": 0.42, "threshold": 0.8}, "provisional": False}
+
+
+def fill_template(template):
+    return template.replace("{{TITLE}}", "B1TD Dashboard 2").replace("{{SQL_QUERY}}", SQL_QUERY)
+
+
+def stdlib_request(template):
+    content = fill_template(template)
+    json.loads(content)                                   # generate_grafana_json validation
+    payload = {"dashboard": json.loads(content), "overwrite": True}   # create_dashboard
+    json.dumps(payload, allow_nan=False).encode()         # requests.post(json=payload)
+    json.dumps(RESPONSE, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def codec_request(template):
+    content = fill_template(template)
+    json_codec.loads(content)
+    json_codec.dumps({"dashboard": json_codec.RawJSON(content), "overwrite": True})
+    json_codec.dumps(RESPONSE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the JSON codec on the request path')
+    parser.add_argument('--repeat', type=int, default=2000, help='Simulated requests per measurement')
+    args = parser.parse_args()
+
+    with open(TEMPLATE_FILE, 'r') as file:
+        template = file.read()
+    with open(METADATA_FILE, 'rb') as file:
+        metadata = file.read()
+
+    backend = json_codec.orjson
+    cases = [('stdlib json', stdlib_request, json.loads, None)]
+    if backend is not None:
+        cases.append(('json_codec (orjson)', codec_request, json_codec.loads, backend))
+    else:
+        print("orjson is not installed; measuring the stdlib fallback only", file=sys.stderr)
+    cases.append(('json_codec (stdlib)', codec_request, json_codec.loads, None))
+
+    loads_repeat = max(1, args.repeat // 20)
+    rows = []
+    for name, request, load, codec_backend in cases:
+        json_codec.orjson = codec_backend
+        try:
+            per_request = timeit.timeit(lambda: request(template), number=args.repeat) / args.repeat
+            per_load = timeit.timeit(lambda: load(metadata), number=loads_repeat) / loads_repeat
+        finally:
+            json_codec.orjson = backend
+        rows.append((name, per_request, per_load))
+
+    baseline = rows[0][1]
+    print(f"{'codec':<22}{'dashboard+response us':>22}{'speedup':>10}{'metadata load us':>18}")
+    for name, per_request, per_load in rows:
+        print(f"{name:<22}{per_request * 1e6:>22.1f}{baseline / per_request:>9.1f}x{per_load * 1e6:>18.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Burst of chat completions against a local stub of the Azure endpoint.
+
+The stub answers like a chat completions deployment after --latency-ms,
+and like Azure it rejects requests beyond --server-rpm per window with 429
+and Retry-After. The same burst (interactive and batch requests mixed) is
+sent once straight through an httpx client with the same pool size and
+once through llm_gateway configured just under the stub's limit. Run from the
+Services directory:
+
+    python benchmarks/bench_llm_gateway.py [--requests 60] [--server-rpm 1200]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICES_DIR)
+
+import httpx
+import llm_gateway
+
+PATH = "/openai/deployments/stub/chat/completions?api-version=2024-06-01"
+WINDOW_SECONDS = 1.0
+
+
+def start_stub(server_rpm, latency):
+    """Serve the stub on a free local port; returns (server, base_url)."""
+    allowed = max(1, int(server_rpm / 60 * WINDOW_SECONDS))
+    accepted = deque()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            now = time.monotonic()
+            with lock:
+                while accepted and accepted[0] <= now - WINDOW_SECONDS:
+                    accepted.popleft()
+                limited = len(accepted) >= allowed
+                if not limited:
+                    accepted.append(now)
+            if limited:
+                self._reply(429, {"error": {"code": "429", "message": "Rate limit exceeded"}}, {"Retry-After": "1"})
+                return
+            time.sleep(latency)
+            prompt_tokens = len(body) // llm_gateway.BYTES_PER_TOKEN
+            self._reply(200, {"id": "chatcmpl-stub", "object": "chat.completion", "model": "stub",
+                              "choices": [{"index": 0, "finish_reason": "stop",
+                                           "message": {"role": "assistant", "content": "SELECT 1"}}],
+                              "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 5,
+                                        "total_tokens": prompt_tokens + 5}})
+
+        def _reply(self, status, payload, headers=()):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in dict(headers).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 256
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+async def burst(client, requests, batch_share):
+    """Send the burst; returns (status codes, seconds, latency per priority)."""
+    body = {"model": "stub", "max_tokens": 64,
+            "messages": [{"role": "user", "content": "show the top 10 threat types in the last week"}]}
+    latencies = {llm_gateway.PRIORITY_INTERACTIVE: [], llm_gateway.PRIORITY_BATCH: []}
+
+    async def one(index):
+        is_batch = int((index + 1) * batch_share) > int(index * batch_share)
+        level = llm_gateway.PRIORITY_BATCH if is_batch else llm_gateway.PRIORITY_INTERACTIVE
+        with llm_gateway.priority(level):
+            started = time.perf_counter()
+            response = await client.post(PATH, json=body)
+            latencies[level].append(time.perf_counter() - started)
+            return response.status_code
+
+    started = time.perf_counter()
+    statuses = await asyncio.gather(*(one(index) for index in range(requests)))
+    return statuses, time.perf_counter() - started, latencies
+
+
+def p95(values):
+    return sorted(values)[int(0.95 * (len(values) - 1))] if values else 0.0
+
+
+async def run(args):
+    server, base_url = start_stub(args.server_rpm, args.latency_ms / 1000)
+    try:
+        rows = []
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+            rows.append(("direct", None, await burst(client, args.requests, args.batch_share)))
+        # Let the direct burst age out of the stub's window
+        await asyncio.sleep(WINDOW_SECONDS)
+        # A bucket admits its capacity plus one window of refill within any
+        # window, so the burst is kept to a tenth of the stub's window
+        gateway = llm_gateway.LLMGateway(rpm=int(args.server_rpm * 0.8), max_concurrency=args.concurrency,
+                                         burst_seconds=WINDOW_SECONDS / 10)
+        client = llm_gateway.http_client(gateway)
+        client.base_url = base_url
+        async with client:
+            rows.append(("llm_gateway", gateway, await burst(client, args.requests, args.batch_share)))
+    finally:
+        server.shutdown()
+
+    print(f"{'client':<14}{'ok':>6}{'429':>6}{'seconds':>10}{'interactive p95 ms':>20}{'batch p95 ms':>14}")
+    for name, _, (statuses, seconds, latencies) in rows:
+        print(f"{name:<14}{statuses.count(200):>6}{statuses.count(429):>6}{seconds:>10.2f}"
+              f"{p95(latencies[llm_gateway.PRIORITY_INTERACTIVE]) * 1000:>20.0f}"
+              f"{p95(latencies[llm_gateway.PRIORITY_BATCH]) * 1000:>14.0f}")
+    print(f"gateway stats: {rows[1][1].stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the LLM gateway against a stub endpoint')
+    parser.add_argument('--requests', type=int, default=60, help='Requests in the burst')
+    parser.add_argument('--server-rpm', type=int, default=1200, help="Stub's requests-per-minute limit")
+    parser.add_argument('--latency-ms', type=float, default=50, help='Stub response time')
+    parser.add_argument('--concurrency', type=int, default=8, help='Gateway concurrency limit')
+    parser.add_argument('--batch-share', type=float, default=0.5, help='Fraction of batch-priority requests')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark: rule-based generator throughput against the number of worker processes.
+
+Run from the Services directory:
+
+    python benchmarks/bench_parallel.py [--queries 200000] [--workers 1,2,4,8]
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parallel_generate import generate_parallel
+
+TEMPLATES = [
+    "count of {severity} severity threats last {days} days",
+    "top {n} feed names by threat count",
+    "distribution of threats by category in the last week",
+    "average bandwidth by device country last month",
+    "total bandwidth per feed name since yesterday",
+    "show recent {severity} severity threats",
+    "distinct threat types seen in the last {days} days",
+    "breakdown of policy actions grouped by severity",
+]
+
+
+def corpus(size):
+    """Yield `size` prompts built from the templates."""
+    values = itertools.cycle(itertools.product(("high", "medium", "low", "critical"), (1, 7, 30), (5, 10, 25)))
+    for index in range(size):
+        severity, days, n = next(values)
+        yield TEMPLATES[index % len(TEMPLATES)].format(severity=severity, days=days, n=n)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parallel rule-based SQL generation')
+    parser.add_argument('--queries', type=int, default=200000, help='Prompts per run')
+    parser.add_argument('--workers', default=None, help='Comma separated worker counts (default 1,2,4,... up to CPU count)')
+    parser.add_argument('--chunksize', type=int, default=512)
+    args = parser.parse_args()
+
+    if args.workers:
+        counts = [int(w) for w in args.workers.split(',')]
+    else:
+        cpus = os.cpu_count() or 1
+        counts = sorted({1, cpus} | {2 ** i for i in range(cpus.bit_length()) if 2 ** i <= cpus})
+
+    baseline = None
+    print(f"{'workers':>8}{'seconds':>10}{'queries/s':>12}{'speedup':>9}")
+    for workers in counts:
+        started = time.perf_counter()
+        done = sum(1 for _ in generate_parallel(corpus(args.queries), workers=workers, chunksize=args.chunksize))
+        elapsed = time.perf_counter() - started
+        qps = done / elapsed
+        baseline = baseline or qps
+        print(f"{workers:>8}{elapsed:>10.2f}{qps:>12.0f}{qps / baseline:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
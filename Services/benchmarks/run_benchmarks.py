@@ -0,0 +1,210 @@
+"""Microbenchmark suite for the fallback NL -> SQL pipeline.
+
+Measures per-call latency percentiles and allocation peaks of
+get_query_intent, extract_entities, generate_sql_from_intent,
+convert_schema_json_to_ddl and MockAgent.run over a corpus of
+threat-analytics questions, plus end-to-end nl_to_sql throughput in
+fallback mode. Run from the Services directory:
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --repeat 5 --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --baseline other.json --max-regression 0.25
+    python benchmarks/run_benchmarks.py --baseline ''
+
+Every run is compared with the committed benchmarks/baseline.json (or
+--baseline; an empty path skips the check) and exits with status 1 when
+any function's median latency (or the end-to-end throughput) is worse
+than the baseline by more than --max-regression. Refresh the baseline
+with --save-baseline after an intended change or on new hardware.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICES_DIR)
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus.txt')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def load_corpus(path):
+    with open(path, 'r') as file:
+        return [line.strip() for line in file if line.strip() and not line.startswith('#')]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(function, arguments, calls):
+    """Time `calls` invocations cycling through `arguments`, then trace allocations."""
+    for args in arguments[:10]:
+        function(*args)
+
+    timings = []
+    perf_counter_ns = time.perf_counter_ns
+    for index in range(calls):
+        args = arguments[index % len(arguments)]
+        started = perf_counter_ns()
+        function(*args)
+        timings.append(perf_counter_ns() - started)
+    timings.sort()
+
+    # Allocation peak per call, measured separately so tracing does not skew timings
+    peaks = []
+    tracemalloc.start()
+    try:
+        for args in arguments:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            function(*args)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'calls': calls,
+        'p50_us': timings[len(timings) // 2] / 1000,
+        'p90_us': percentile(timings, 0.90) / 1000,
+        'p99_us': percentile(timings, 0.99) / 1000,
+        'max_us': timings[-1] / 1000,
+        'alloc_bytes_per_call': sum(peaks) / len(peaks),
+    }
+
+
+def throughput(function, arguments, seconds):
+    """Calls per second of `function` over the corpus for roughly `seconds`."""
+    calls = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        for args in arguments:
+            function(*args)
+        calls += len(arguments)
+    return calls / (time.perf_counter() - started)
+
+
+def run(corpus, calls, seconds):
+    import jsonschema
+    import natural_language_to_sql as nl
+
+    schema_ddl = nl.get_threat_data_schema()
+    schema_json = jsonschema.get_table_schema_json('td_agg_threat', os.path.join(SERVICES_DIR, 'table_metadata.json'))
+    intents = [nl.get_query_intent(query) for query in corpus]
+    entities = [nl.extract_entities(query) for query in corpus]
+
+    cases = {
+        'get_query_intent': (nl.get_query_intent, [(query,) for query in corpus]),
+        'extract_entities': (nl.extract_entities, [(query,) for query in corpus]),
+        'generate_sql_from_intent': (nl.generate_sql_from_intent,
+                                     [(i, e, e['table'] or nl.DEFAULT_TABLE) for i, e in zip(intents, entities)]),
+        'convert_schema_json_to_ddl': (nl.convert_schema_json_to_ddl, [(schema_json,)]),
+    }
+    mock_agent_class = getattr(nl, 'MockAgent', None)
+    if mock_agent_class is not None:
+        # The same system prompt and request shape nl_to_sql hands the agent
+        agent = mock_agent_class(system_prompt=nl.system_prompt(schema_ddl))
+        cases['MockAgent.run'] = (agent.run, [(nl.request_with_context(query),) for query in corpus])
+
+    results = {}
+    for name, (function, arguments) in cases.items():
+        results[name] = measure(function, arguments, calls)
+
+    if getattr(nl, 'USING_REAL_AGENT', False):
+        print("nl_to_sql is using a real agent; skipping the fallback throughput run", file=sys.stderr)
+    else:
+        results['nl_to_sql'] = {'queries_per_second': throughput(nl.nl_to_sql, [(q, schema_ddl) for q in corpus], seconds)}
+    return results
+
+
+def median_run(runs):
+    """Per function, the result of the run with the median p50 (or throughput)."""
+    merged = {}
+    for name in runs[0]:
+        key = 'queries_per_second' if 'queries_per_second' in runs[0][name] else 'p50_us'
+        ordered = sorted((result[name] for result in runs if name in result), key=lambda item: item[key])
+        merged[name] = ordered[len(ordered) // 2]
+    return merged
+
+
+def print_results(results):
+    print(f"{'function':<28}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'max us':>10}{'alloc B/call':>14}")
+    for name, result in results.items():
+        if 'queries_per_second' in result:
+            continue
+        print(f"{name:<28}{result['p50_us']:>10.1f}{result['p90_us']:>10.1f}{result['p99_us']:>10.1f}"
+              f"{result['max_us']:>10.1f}{result['alloc_bytes_per_call']:>14.0f}")
+    if 'nl_to_sql' in results:
+        print(f"\nnl_to_sql end-to-end (fallback): {results['nl_to_sql']['queries_per_second']:.0f} queries/s")
+
+
+def compare(results, baseline, max_regression):
+    """Return a list of regressions beyond the allowed fraction."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if 'queries_per_second' in result:
+            floor = previous['queries_per_second'] * (1 - max_regression)
+            if result['queries_per_second'] < floor:
+                regressions.append(f"{name}: {result['queries_per_second']:.0f} queries/s < "
+                                   f"{previous['queries_per_second']:.0f} baseline")
+        else:
+            ceiling = previous['p50_us'] * (1 + max_regression)
+            if result['p50_us'] > ceiling:
+                regressions.append(f"{name}: p50 {result['p50_us']:.1f}us > {previous['p50_us']:.1f}us baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the fallback NL to SQL pipeline')
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help='File with one question per line')
+    parser.add_argument('--calls', type=int, default=20000, help='Timed calls per function')
+    parser.add_argument('--seconds', type=float, default=3.0, help='Duration of the end-to-end throughput run')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs to take the median of')
+    parser.add_argument('--save-baseline', metavar='PATH', help='Write the results as a baseline JSON file')
+    parser.add_argument('--baseline', metavar='PATH', default=DEFAULT_BASELINE,
+                        help="Baseline to compare against, failing on regressions ('' to skip)")
+    parser.add_argument('--max-regression', type=float, default=0.25, help='Allowed slowdown as a fraction of the baseline')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+
+    # Read before the run so --save-baseline over the same file still compares with the old one
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+
+    corpus = load_corpus(args.corpus)
+    results = median_run([run(corpus, args.calls, args.seconds) for _ in range(max(1, args.repeat))])
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print("\nPerformance regressions:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.max_regression:.0%} of {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+import re
+from datetime import date
+
+REFUSAL_PREFIX = "-- Refused:"
+
+DEFAULT_TIME_COLUMN = "timestamp_day"
+DEFAULT_DIMENSIONS = ("feed_name", "severity")
+
+_AGGREGATE_RE = re.compile(r'^(Simple)?AggregateFunction\(\s*(\w+)')
+_NUMERIC_RE = re.compile(r'^(?:Nullable\()?(?:U?Int\d+|Float\d+|Decimal)')
+_NUMBER_RE = re.compile(r'^-?\d+(?:\.\d+)?$')
+
+# With table statistics, a SELECT without a time filter on a table larger
+# than this is limited to the widest of WINDOW_DAYS that stays under it.
+SCAN_TARGET_ROWS = 10_000_000
+WINDOW_DAYS = (365, 90, 30, 7, 1)
+# Time-series buckets, finest first, and the most buckets a series may have
+BUCKETS = ((1, 'hour', 1 / 24), (6, 'hour', 1 / 4), (1, 'day', 1), (1, 'week', 7), (1, 'month', 30))
+MAX_BUCKETS = 200
+# A series limited by the default window still gets at least this many buckets
+MIN_SERIES_BUCKETS = 7
+# Row limit of a time series, so the default LIMIT does not cut it short
+SERIES_LIMIT = 1000
+_PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
+
+def quote_literal(value):
+    """Quote a string literal for ClickHouse."""
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def refusal(reason):
+    """Return a SQL comment explaining why no statement was generated."""
+    return f"{REFUSAL_PREFIX} {reason}"
+
+
+class ClickHouseQueryBuilder:
+    """Turn fallback intents/entities into ClickHouse SQL for one table.
+
+    Knows the table's column types, so ``SimpleAggregateFunction`` columns
+    are always read through their aggregate (``sum(count)``) with the other
+    selected columns in ``GROUP BY``, time filters compare the partition
+    column against ``today()`` so ClickHouse can prune partitions, and
+    mutations become ``ALTER TABLE ... DELETE`` or are refused. With
+    table_stats statistics, large tables get a default time window and
+    time series get a ``toStartOfInterval`` bucket sized to the range.
+    """
+
+    def __init__(self, table_name, column_types=None, stats=None):
+        self.table_name = table_name
+        self.column_types = column_types
+        self.stats = stats
+        # column -> SQL expression that merges it, e.g. count -> sum(count)
+        self.measures = {}
+        for column, column_type in (column_types or {}).items():
+            match = _AGGREGATE_RE.match(column_type)
+            if match:
+                function = match.group(2) if match.group(1) else match.group(2) + "Merge"
+                self.measures[column] = f"{function}({column})"
+        self.time_column = self._find_time_column()
+
+    def _find_time_column(self):
+        if not self.column_types or DEFAULT_TIME_COLUMN in self.column_types:
+            return DEFAULT_TIME_COLUMN
+        for column, column_type in self.column_types.items():
+            if column not in self.measures and column_type.startswith(("Date", "Nullable(Date")):
+                return column
+        return None
+
+    def has_column(self, column):
+        return self.column_types is None or column in self.column_types
+
+    def time_predicate(self, period, value, operator=">="):
+        """Partition-prunable predicate on the time column."""
+        value = int(value)
+        if period == 'day':
+            bound = f"today() - {value}"
+        elif period == 'week':
+            bound = f"today() - {7 * value}"
+        else:
+            bound = f"today() - INTERVAL {value} {period.upper()}"
+        return f"{self.time_column} {operator} {bound}"
+
+    def default_window(self):
+        """Days a query without a time filter is limited to, or None to scan everything."""
+        span = self.stats.span_days() if self.stats and self.time_column else None
+        if not span or self.stats.rows <= SCAN_TARGET_ROWS:
+            return None
+        rows_per_day = self.stats.rows / span
+        for days in WINDOW_DAYS:
+            if days < span and days * rows_per_day <= SCAN_TARGET_ROWS:
+                return days
+        return None
+
+    def series_window(self, days):
+        """Widen a default window of `days` so a series over it has MIN_SERIES_BUCKETS buckets."""
+        finest = 1 if self.time_column.endswith('_day') else BUCKETS[0][2]
+        for candidate in sorted(WINDOW_DAYS):
+            if candidate >= days and candidate / finest >= MIN_SERIES_BUCKETS:
+                return candidate
+        return days
+
+    def window_predicate(self, days):
+        """Filter to the last `days` days of data, anchored on the newest data when it is old."""
+        newest = date.fromisoformat(self.stats.max_time[:10])
+        if (date.today() - newest).days <= days:
+            return f"{self.time_column} >= today() - {days}"
+        return f"{self.time_column} >= toDate('{newest.isoformat()}') - {days}"
+
+    def bucket(self, days):
+        """toStartOfInterval expression giving at most MAX_BUCKETS points over `days` days."""
+        daily = self.time_column.endswith('_day')
+        for count, unit, length in BUCKETS:
+            if daily and length < 1:
+                continue
+            if days / length <= MAX_BUCKETS:
+                break
+        return f"toStartOfInterval({self.time_column}, INTERVAL {count} {unit.upper()})"
+
+    def condition(self, column, value):
+        column_type = (self.column_types or {}).get(column, "String")
+        if column in self.measures:
+            # SimpleAggregateFunction(sum, UInt64) compares like UInt64
+            column_type = column_type.split(",", 1)[-1].strip()
+        if _NUMERIC_RE.match(column_type) and _NUMBER_RE.match(str(value)):
+            return f"{column} = {value}"
+        return f"{column} = {quote_literal(value)}"
+
+    def _is_numeric(self, column):
+        """Whether a column holds a measure rather than a grouping key."""
+        return column in self.measures or bool(_NUMERIC_RE.match((self.column_types or {}).get(column, "")))
+
+    def default_metric(self):
+        """The expression that counts events, honouring pre-aggregated counts."""
+        if "count" in self.measures and self.measures["count"].startswith("sum("):
+            return self.measures["count"]
+        if "count" not in self.measures and self._is_numeric("count"):
+            # A plain numeric count column already holds pre-counted rows
+            return "sum(count)"
+        return "count()"
+
+    def build(self, intents, entities):
+        """Return the SQL for the given intents and entities."""
+        if 'delete' in intents:
+            return self._build_delete(entities)
+        if 'insert' in intents:
+            return refusal(f"the fallback generator does not write rows into {self.table_name}")
+        if 'update' in intents:
+            return refusal(f"updates to {self.table_name} need an explicit ALTER TABLE ... UPDATE")
+        return self._build_select(intents, entities)
+
+    def _time_entity(self, entities):
+        time = entities.get('time') or {}
+        if 'period' in time and self.time_column:
+            return time['period'], time['value']
+        return None
+
+    def _build_delete(self, entities):
+        conditions = [self.condition(col, val) for col, val in entities['conditions'].items()
+                      if self.has_column(col) and col not in self.measures]
+        time = self._time_entity(entities)
+        if time:
+            conditions.append(self.time_predicate(time[0], time[1], "<"))
+        if not conditions:
+            return refusal(f"unconditional DELETE on {self.table_name}")
+        return f"ALTER TABLE {self.table_name} DELETE WHERE " + " AND ".join(conditions)
+
+    def _build_select(self, intents, entities):
+        mentioned = [col for col in entities['columns'] if self.has_column(col)]
+        # Numeric columns the user named ("total bandwidth") are metrics, not groups.
+        metrics = [col for col in mentioned if col != "count" and self._is_numeric(col)]
+        dimensions = [col for col in mentioned if not self._is_numeric(col)]
+        aggregates = []
+
+        if 'select_avg' in intents:
+            aggregates.append(self._average(mentioned))
+        elif 'select_sum' in intents or 'select_count' in intents and metrics:
+            aggregates.append(self._total(mentioned))
+        elif 'select_count' in intents:
+            aggregates.append(f"{self.default_metric()} AS threat_count")
+        elif 'select_distinct' in intents:
+            if not dimensions:
+                dimensions = [col for col in DEFAULT_DIMENSIONS if self.has_column(col)]
+
+        # Bucket sizes come from the statistics; without them the query keeps its usual shape
+        series = 'select_time_series' in intents and self.time_column and self.stats is not None
+        if series and not aggregates:
+            aggregates.append(f"{self.default_metric()} AS total_count")
+
+        ranking = 'select_top' in intents or 'select_bottom' in intents
+        if not dimensions and ('select_group' in intents or ranking and self.measures):
+            dimensions = [col for col in DEFAULT_DIMENSIONS if self.has_column(col)]
+        if not aggregates and dimensions and 'select_distinct' not in intents and \
+                ('select_group' in intents or ranking or self.measures):
+            # Rows of an aggregating table are partial; merge them per group.
+            aggregates.append(f"{self.default_metric()} AS total_count")
+
+        where_conditions = []
+        having_conditions = []
+        time = self._time_entity(entities)
+        if time and ('select_time_range' in intents or 'select_recent' in intents):
+            where_conditions.append(self.time_predicate(*time))
+            window = _PERIOD_DAYS.get(time[0], 1) * int(time[1])
+        else:
+            window = self.default_window()
+            if window and series:
+                window = self.series_window(window)
+            if window:
+                where_conditions.append(self.window_predicate(window))
+
+        columns = list(dimensions)
+        if series:
+            days = window or (self.stats.span_days() if self.stats else None) or 1
+            columns.insert(0, f"{self.bucket(days)} AS time_bucket")
+            dimensions = ["time_bucket"] + dimensions
+
+        if 'select_distinct' in intents and not aggregates:
+            select_list = "DISTINCT " + ", ".join(dimensions) if dimensions else "*"
+        else:
+            select_list = ",\n    ".join(aggregates + columns) or "*"
+
+        for col, val in entities['conditions'].items():
+            if not self.has_column(col):
+                continue
+            if col in self.measures and aggregates:
+                having_conditions.append(self.condition(col, val).replace(col, self.measures[col], 1))
+            else:
+                where_conditions.append(self.condition(col, val))
+
+        sql = f"SELECT {select_list}\nFROM {self.table_name}"
+        if where_conditions:
+            sql += "\nWHERE " + " AND ".join(where_conditions)
+        if aggregates and dimensions:
+            sql += "\nGROUP BY " + ", ".join(dimensions)
+        if having_conditions:
+            sql += "\nHAVING " + " AND ".join(having_conditions)
+
+        order_by = self._order_by(intents, aggregates, dimensions)
+        if series and not order_by:
+            order_by = "time_bucket"
+        if order_by:
+            sql += f"\nORDER BY {order_by}"
+        limit = int(entities['limit'])
+        if series and not ranking:
+            limit = max(limit, SERIES_LIMIT)
+        sql += f"\nLIMIT {limit}"
+        return sql
+
+    def _average(self, mentioned):
+        column = self._metric_column(mentioned, ("bandwidth", "bandwidth_total"))
+        if column in self.measures:
+            # Average of the merged per-day totals, not of partial rows.
+            per_bucket = f"uniqExact({self.time_column})" if self.time_column else "count()"
+            return f"{self.measures[column]} / {per_bucket} AS average_{column}"
+        if column:
+            return f"avg({column}) AS average_{column}"
+        return "count() AS average_count"
+
+    def _total(self, mentioned):
+        column = self._metric_column(mentioned, ("bandwidth_total", "bandwidth"))
+        if column is None:
+            return "count() AS total_count"
+        alias = "total_bandwidth" if column.startswith("bandwidth") else f"total_{column}"
+        return f"{self.measures.get(column, f'sum({column})')} AS {alias}"
+
+    def _metric_column(self, mentioned, bandwidth_columns):
+        """Pick the numeric column an avg/sum is about, defaulting to count."""
+        if "bandwidth" in mentioned or "bandwidth_total" in mentioned:
+            for column in bandwidth_columns:
+                if self.has_column(column):
+                    return column
+        for column in mentioned:
+            if self._is_numeric(column):
+                return column
+        if self.has_column("count"):
+            return "count"
+        return None
+
+    def _order_by(self, intents, aggregates, dimensions):
+        if 'select_top' in intents or 'select_bottom' in intents:
+            direction = "DESC" if 'select_top' in intents else "ASC"
+            if aggregates:
+                alias = aggregates[0].rsplit(" AS ", 1)[1]
+                return f"{alias} {direction}"
+            if self.column_types is None:
+                return f"count {direction}"
+        if 'select_recent' in intents and self.time_column and not aggregates:
+            return f"{self.time_column} DESC"
+        return ""
+
+
+def build_query(intents, entities, table_name, column_types=None, stats=None):
+    """Generate ClickHouse SQL for the fallback intents and entities."""
+    return ClickHouseQueryBuilder(table_name, column_types, stats).build(intents, entities)
@@ -1,40 +1,103 @@
-import json
-from mcp_clickhouse import create_clickhouse_client, list_databases, list_tables, run_select_query
-
-def getTableSchemaFromMCP(database, table_name):
-    client = create_clickhouse_client()
-    schema_query = f"SELECT COLUMN_NAME AS name, DATA_TYPE AS type FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = '{database}' AND TABLE_NAME = '{table_name}';"
-    schema_result = client.command(schema_query)
-
-    actual_result = []
-    for i in schema_result:
-        if len(i.split("\n")) > 0:
-            for j in i.split("\n"):
-                actual_result.append(j)
-        else:
-            actual_result.append(i)
-    
-    count = 0
-    parsed_result = []
-    columnname = ""
-    columntype = ""
-    for i in actual_result:
-        count +=1
-        if count%2 != 0:
-            columnname = i
-        else:
-            columntype = i
-            parsed_result.append({"columnname":columnname, "columntype":columntype})
-
-    json_result = []
-    
-    json_result.append({"tablename": table_name, "schema": parsed_result})
-    output_json = {"tables": json_result}
-    return output_json
+import argparse
+import os
+import sys
+import tempfile
+from typing import NamedTuple
+
+import json_codec
+from mcp_clickhouse import create_clickhouse_client
+
+DEFAULT_DATABASES = ["reports"]
+DEFAULT_METADATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "table_metadata.json")
+
+# Every column of every table in the requested databases, in one round trip
+COLUMNS_QUERY = """SELECT database, table, name, type, position
+FROM system.columns
+WHERE database IN {databases:Array(String)}
+ORDER BY database, table, position"""
+
+TABLE_COLUMNS_QUERY = """SELECT database, table, name, type, position
+FROM system.columns
+WHERE database IN {databases:Array(String)} AND table IN {tables:Array(String)}
+ORDER BY database, table, position"""
+
+
+class ColumnRow(NamedTuple):
+    database: str
+    table: str
+    name: str
+    type: str
+    position: int
+
+
+def fetch_columns(databases, tables=None, client=None):
+    """Fetch column definitions for whole databases with a single system.columns query.
+
+    Args:
+        databases (list): Database names to introspect.
+        tables (list): Optional table names to restrict the result to.
+        client: ClickHouse client to reuse; one is created when omitted.
+
+    Returns:
+        list[ColumnRow]: Rows ordered by database, table and column position.
+    """
+    client = client or create_clickhouse_client()
+    parameters = {"databases": list(databases)}
+    query = COLUMNS_QUERY
+    if tables:
+        parameters["tables"] = list(tables)
+        query = TABLE_COLUMNS_QUERY
+    result = client.query(query, parameters=parameters)
+    return [ColumnRow(*row) for row in result.result_rows]
+
+
+def build_metadata(rows):
+    """Group column rows into the table_metadata.json structure.
+
+    Table names are qualified as ``database.table`` only when the rows span
+    more than one database.
+    """
+    qualify = len({row.database for row in rows}) > 1
+    tables = {}
+    for row in rows:
+        tablename = f"{row.database}.{row.table}" if qualify else row.table
+        tables.setdefault(tablename, []).append({"columnname": row.name, "columntype": row.type})
+    return {"tables": [{"tablename": name, "schema": schema} for name, schema in tables.items()]}
+
+
+def write_snapshot(metadata, json_file_path=DEFAULT_METADATA_FILE):
+    """Atomically replace `json_file_path` with the metadata snapshot."""
+    directory = os.path.dirname(os.path.abspath(json_file_path))
+    fd, temp_path = tempfile.mkstemp(prefix=".table_metadata.", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(json_codec.dumps(metadata, indent=True))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, json_file_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def refresh_table_metadata(databases=None, json_file_path=DEFAULT_METADATA_FILE, client=None):
+    """Introspect the databases and write a fresh table_metadata.json snapshot."""
+    metadata = build_metadata(fetch_columns(databases or DEFAULT_DATABASES, client=client))
+    write_snapshot(metadata, json_file_path)
+    return metadata
+
+
+def getTableSchemaFromMCP(database, table_name, client=None):
+    rows = fetch_columns([database], [table_name], client)
+    parsed_result = [{"columnname": row.name, "columntype": row.type} for row in rows]
+    return {"tables": [{"tablename": table_name, "schema": parsed_result}]}
 
 
 
 if __name__ == "__main__":
-    table_name = "td_agg_threat"
-    result = getTableSchemaFromMCP(table_name)
-    print(result)
+    parser = argparse.ArgumentParser(description="Write a table_metadata.json snapshot from ClickHouse system.columns")
+    parser.add_argument("databases", nargs="*", default=DEFAULT_DATABASES, help="Databases to introspect")
+    parser.add_argument("--output", "-o", default=DEFAULT_METADATA_FILE, help="Snapshot file to write")
+    args = parser.parse_args()
+    result = refresh_table_metadata(args.databases, args.output)
+    print(f"Wrote {len(result['tables'])} tables to {args.output}", file=sys.stderr)
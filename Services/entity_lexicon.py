@@ -0,0 +1,261 @@
+import os
+import re
+import sys
+
+import jsonschema
+
+# SCHEMA_CATALOG_PATH may point at a JSON snapshot or a SQLite schema catalog
+DEFAULT_METADATA_FILE = (os.getenv('SCHEMA_CATALOG_PATH')
+                         or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'table_metadata.json'))
+
+# Values we know for LowCardinality columns; the metadata file only carries types.
+KNOWN_VALUES = {
+    'severity': ('critical', 'high', 'medium', 'low', 'info'),
+    'confidence': ('high', 'medium', 'low'),
+}
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_ASSIGN_RE = re.compile(r'\s*(?:is\b|equals\b|=)\s*[\'"]?([a-z0-9_\-.]+)[\'"]?')
+_TERMINAL = None
+
+
+def _normalize(token):
+    # Fold simple plurals so "threats" and "feed names" hit "threat" and "feed_name".
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def _tokens(text):
+    return [_normalize(token) for token in _TOKEN_RE.findall(text.lower())]
+
+
+def _value_for(values, columnname):
+    for entry in values:
+        if entry[1] == columnname:
+            return entry[2]
+    return None
+
+
+class EntityLexicon:
+    """Token trie over every table name, column name and known column value.
+
+    Built once from the (tablename, columnname, columntype) rows of the
+    schema registry and keeps only names; column types are looked up per
+    table with ``column_types``. ``scan`` walks the query a single time and
+    does one dict lookup per token, so the cost does not grow with the
+    number of tables or columns in the schema.
+    """
+
+    def __init__(self, rows, known_values=None):
+        # tablename -> frozenset of column names
+        self.table_columns = {}
+        self.column_tables = {}
+        self.low_cardinality = set()
+        self._trie = {}
+        columns_by_table = {}
+        for tablename, columnname, columntype in rows:
+            if not tablename:
+                continue
+            names = columns_by_table.setdefault(tablename, [])
+            if columnname is None:
+                continue
+            # Wide catalogs repeat the same column names across tables
+            names.append(sys.intern(columnname))
+            if columntype.startswith('LowCardinality'):
+                self.low_cardinality.add(columnname)
+        # Name tokens shared by many tables ("td", "agg") do not identify one;
+        # what is left ("threat", "dns combined") is an alias for the table.
+        token_counts = {}
+        for tablename in columns_by_table:
+            for token in set(_tokens(tablename)):
+                token_counts[token] = token_counts.get(token, 0) + 1
+        common = {token for token, count in token_counts.items() if count * 4 >= len(columns_by_table)}
+        for tablename, names in columns_by_table.items():
+            columns = dict.fromkeys(names)
+            self.table_columns[tablename] = frozenset(columns)
+            tokens = _tokens(tablename)
+            self._add(tokens, ('table', tablename))
+            alias = [token for token in tokens if token not in common]
+            if alias and alias != tokens:
+                self._add(alias, ('alias', tablename))
+            for columnname in columns:
+                self.column_tables.setdefault(columnname, []).append(tablename)
+                self._add(_tokens(columnname), ('column', columnname))
+        for columnname, values in (KNOWN_VALUES if known_values is None else known_values).items():
+            self.add_values(columnname, values)
+
+    @classmethod
+    def from_file(cls, json_file_path=DEFAULT_METADATA_FILE):
+        """Build a lexicon from a table_metadata.json style file or schema catalog."""
+        return cls(jsonschema.get_registry(json_file_path).column_rows())
+
+    def _add(self, tokens, entry):
+        if not tokens:
+            return
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        entries = node.setdefault(_TERMINAL, [])
+        if entry not in entries:
+            entries.append(entry)
+
+    def add_values(self, columnname, values):
+        """Register known values of a (LowCardinality) column."""
+        for value in values:
+            self._add(_tokens(value), ('value', columnname, str(value).lower()))
+
+    def scan(self, query_lower):
+        """Return the (start, end, entries) of every longest phrase match, in order."""
+        spans = [(m.start(), m.end(), _normalize(m.group())) for m in _TOKEN_RE.finditer(query_lower)]
+        matches = []
+        trie = self._trie
+        index = 0
+        while index < len(spans):
+            node = trie
+            found = None
+            probe = index
+            while probe < len(spans):
+                node = node.get(spans[probe][2])
+                if node is None:
+                    break
+                probe += 1
+                if _TERMINAL in node:
+                    found = (probe, node[_TERMINAL])
+            if found is None:
+                index += 1
+                continue
+            end, entries = found
+            matches.append((spans[index][0], spans[end - 1][1], entries))
+            index = end
+        return matches
+
+    def extract(self, query_lower, table_name=None, default_table=None):
+        """Resolve the table, columns and value conditions mentioned in a query."""
+        mentioned_tables = []
+        mentioned_columns = []
+        alias_tables = []
+        conditions = {}
+        # Value hits that were not adjacent to a column they belong to.
+        pending_values = []
+        previous = None
+        for start, end, entries in self.scan(query_lower):
+            adjacent = previous is not None and not query_lower[previous[2]:start].strip()
+            columns = [entry[1] for entry in entries if entry[0] == 'column']
+            values = [entry for entry in entries if entry[0] == 'value']
+            for entry in entries:
+                if entry[0] == 'table' and entry[1] not in mentioned_tables:
+                    mentioned_tables.append(entry[1])
+                elif entry[0] == 'alias':
+                    alias_tables.append(entry[1])
+
+            if columns:
+                columnname = columns[0]
+                if columnname not in mentioned_columns:
+                    mentioned_columns.append(columnname)
+                assignment = _ASSIGN_RE.match(query_lower, end)
+                if assignment:
+                    # "feed name is alienvault"
+                    conditions[columnname] = assignment.group(1)
+                elif adjacent and previous[0] == 'values':
+                    # "high severity"
+                    value = _value_for(previous[1], columnname)
+                    if value is not None:
+                        conditions.setdefault(columnname, value)
+                        pending_values.remove(previous[1])
+                previous = ('column', columnname, end)
+            elif values:
+                if adjacent and previous[0] == 'column':
+                    # "severity high"
+                    value = _value_for(values, previous[1])
+                    if value is not None:
+                        conditions.setdefault(previous[1], value)
+                        previous = None
+                        continue
+                pending_values.append(values)
+                previous = ('values', values, end)
+            else:
+                previous = None
+
+        table = self.resolve_table(mentioned_tables, mentioned_columns, table_name, alias_tables, default_table)
+        known = self.table_columns.get(table)
+
+        if known is not None:
+            columns = [c for c in mentioned_columns if c in known]
+            conditions = {c: v for c, v in conditions.items() if c in known}
+        else:
+            columns = mentioned_columns
+
+        # A lone value binds to its column only when exactly one column of
+        # the resolved table can hold it, e.g. "critical" -> severity.
+        for values in pending_values:
+            candidates = [entry for entry in values if known is None or entry[1] in known]
+            if len({entry[1] for entry in candidates}) == 1 and candidates[0][1] not in conditions:
+                conditions[candidates[0][1]] = candidates[0][2]
+
+        return {
+            'table': table,
+            'tables': mentioned_tables,
+            'columns': columns,
+            'conditions': conditions,
+        }
+
+    def resolve_table(self, mentioned_tables, mentioned_columns, table_name=None, alias_tables=(),
+                      default_table=None):
+        """Pick the table a query is about: named or aliased, then hinted, then best column coverage.
+
+        A table the query names or aliases wins over the `table_name` hint
+        (e.g. the table of a schema file); the hint wins over columns alone.
+        """
+        if mentioned_tables:
+            return mentioned_tables[0]
+        if table_name and not alias_tables:
+            return table_name
+        scores = {}
+        for tablename in alias_tables:
+            scores[tablename] = scores.get(tablename, 0) + 2
+        for columnname in mentioned_columns:
+            for tablename in self.column_tables.get(columnname, ()):
+                scores[tablename] = scores.get(tablename, 0) + 1
+        best = default_table if scores.get(default_table) else None
+        best_score = scores.get(default_table, 0)
+        # The default table, then metadata order, breaks ties.
+        for tablename in self.table_columns:
+            score = scores.get(tablename, 0)
+            if score > best_score:
+                best, best_score = tablename, score
+        return best
+
+
+_lexicons = {}
+
+
+def get_lexicon(json_file_path=DEFAULT_METADATA_FILE):
+    """Return the lexicon for a metadata file, rebuilt when the schema registry reloads it."""
+    registry = jsonschema.get_registry(json_file_path)
+    fingerprint = registry.fingerprint
+    cached = _lexicons.get(json_file_path)
+    if cached is None or cached[0] != fingerprint:
+        cached = (fingerprint, EntityLexicon(registry.column_rows()))
+        _lexicons[json_file_path] = cached
+    return cached[1]
+
+
+def column_types(tablename, json_file_path=DEFAULT_METADATA_FILE):
+    """Read-only {columnname: columntype} of one table, loaded on demand; None when unknown."""
+    return jsonschema.get_registry(json_file_path).columns(tablename)
+
+
+def schema_fingerprint(json_file_path=DEFAULT_METADATA_FILE):
+    """Fingerprint of the current schema, or '' when the metadata cannot be read."""
+    try:
+        return jsonschema.get_registry(json_file_path).fingerprint
+    except (OSError, ValueError):
+        return ""
+
+
+def reset_lexicons():
+    """Drop cached lexicons so the next lookup rebuilds from the metadata file."""
+    _lexicons.clear()
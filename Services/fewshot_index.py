@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Few-shot examples for the agent from earlier prompt/SQL pairs.
+
+Agent answers are recorded as JSONL pairs (``prompt`` and ``sql``, the
+prompt_router format written by main.record_agent_answer). The prompts
+are indexed as hashed character/word n-gram vectors and a question is
+scored against them by cosine similarity with NumPy. The closest pairs
+go into the agent request, so a question like one answered before can be
+answered in one turn instead of rediscovering tables through the tools.
+
+FEWSHOT_PAIRS_PATH names the pairs file (default ROUTER_RECORD_PATH),
+FEWSHOT_K the number of examples (default 3, 0 disables) and
+FEWSHOT_MIN_SCORE the similarity an example needs (default 0.35).
+
+    python fewshot_index.py "top 5 feeds by threat count last week" --pairs pairs.jsonl
+"""
+import argparse
+import os
+import re
+import sys
+
+import numpy as np
+
+import json_codec
+import text_features
+
+DEFAULT_K = 3
+DEFAULT_MIN_SCORE = 0.35
+# Longer SQL is not worth its tokens as an example
+MAX_EXAMPLE_CHARS = 1200
+
+_SQL_START_RE = re.compile(r'^\s*(?:select|with)\b', re.IGNORECASE)
+
+
+class FewShotIndex:
+    """Cosine-similarity index over the prompts of prompt/SQL pairs.
+
+    Args:
+        pairs (iterable): dicts with ``prompt`` and ``sql``. Later pairs for
+            the same prompt replace earlier ones; pairs whose SQL is not a
+            SELECT (refusals, errors) are skipped.
+        dim (int): Hashed feature dimension.
+    """
+
+    def __init__(self, pairs=(), dim=text_features.DEFAULT_DIM):
+        self.dim = dim
+        self.pairs = []
+        self._positions = {}
+        self._rows = np.zeros(0, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int64)
+        self._values = np.zeros(0, dtype=np.float32)
+        self.add(pairs)
+
+    def add(self, pairs):
+        """Index more pairs; only prompts not seen before are vectorized."""
+        new_prompts = []
+        for pair in pairs:
+            prompt, sql = pair.get('prompt'), pair.get('sql')
+            if not (prompt and sql and _SQL_START_RE.match(sql) and len(sql) <= MAX_EXAMPLE_CHARS):
+                continue
+            key = text_features.normalize_text(prompt)
+            position = self._positions.get(key)
+            if position is not None:
+                # Same normalized prompt, same vector: only the answer changes
+                self.pairs[position] = (prompt, sql.strip())
+                continue
+            self._positions[key] = len(self.pairs)
+            self.pairs.append((prompt, sql.strip()))
+            new_prompts.append(prompt)
+        if new_prompts:
+            first = len(self.pairs) - len(new_prompts)
+            indptr, indices, values = text_features.hashed_matrix(new_prompts, self.dim)
+            rows = np.repeat(np.arange(first, len(self.pairs)), np.diff(indptr))
+            self._rows = np.concatenate([self._rows, rows])
+            self._indices = np.concatenate([self._indices, indices])
+            self._values = np.concatenate([self._values, values])
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def scores(self, question):
+        """Cosine similarity of `question` to every indexed prompt."""
+        indices, values = text_features.hashed_features(question, self.dim)
+        query = np.zeros(self.dim, dtype=np.float32)
+        query[indices] = values
+        return np.bincount(self._rows, weights=self._values * query[self._indices], minlength=len(self.pairs))
+
+    def search(self, question, k=DEFAULT_K, min_score=DEFAULT_MIN_SCORE):
+        """Return up to `k` (score, prompt, sql), best first, skipping repeats of the same SQL."""
+        if not self.pairs or k <= 0:
+            return []
+        scores = self.scores(question)
+        results = []
+        seen_sql = set()
+        for index in np.argsort(-scores, kind='stable'):
+            score = float(scores[index])
+            if score < min_score or len(results) >= k:
+                break
+            prompt, sql = self.pairs[index]
+            if sql not in seen_sql:
+                seen_sql.add(sql)
+                results.append((round(score, 4), prompt, sql))
+        return results
+
+
+# pairs_file -> (bytes read, FewShotIndex)
+_cache = {}
+
+
+def pairs_path():
+    return os.getenv("FEWSHOT_PAIRS_PATH") or os.getenv("ROUTER_RECORD_PATH")
+
+
+def _read_pairs_from(path, offset):
+    """Pairs on the complete lines after `offset`, and the offset after them."""
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        data = file.read()
+    end = data.rfind(b'\n') + 1
+    pairs = []
+    for line in data[:end].splitlines():
+        try:
+            pair = json_codec.loads(line) if line.strip() else None
+        except json_codec.JSONDecodeError:
+            continue
+        if isinstance(pair, dict):
+            pairs.append(pair)
+    return pairs, offset + end
+
+
+def load_index(path=None):
+    """Return the index of a pairs file; None without pairs.
+
+    The file is append-only (main records every agent answer), so only
+    lines added since the last call are read and indexed. A file that
+    shrank was rewritten and is indexed again from the start.
+    """
+    path = path or pairs_path()
+    if not path:
+        return None
+    try:
+        size = os.stat(path).st_size
+    except OSError:
+        return None
+    offset, index = _cache.get(path, (0, None))
+    if index is None or size < offset:
+        offset, index = 0, FewShotIndex()
+    if size > offset:
+        try:
+            pairs, offset = _read_pairs_from(path, offset)
+        except OSError as e:
+            print(f"Ignoring few-shot pairs in {path}: {e}", file=sys.stderr)
+            return index
+        index.add(pairs)
+    _cache[path] = (offset, index)
+    return index
+
+
+def _settings():
+    try:
+        return int(os.getenv("FEWSHOT_K") or DEFAULT_K), float(os.getenv("FEWSHOT_MIN_SCORE") or DEFAULT_MIN_SCORE)
+    except ValueError:
+        print("Ignoring invalid FEWSHOT_K / FEWSHOT_MIN_SCORE", file=sys.stderr)
+        return DEFAULT_K, DEFAULT_MIN_SCORE
+
+
+def examples(question, path=None):
+    """Nearest recorded pairs for `question` as (score, prompt, sql); empty when disabled."""
+    k, min_score = _settings()
+    index = load_index(path) if k > 0 else None
+    return index.search(question, k, min_score) if index else []
+
+
+def prompt_section(question, path=None):
+    """Examples block for the agent request; empty when there are no close examples."""
+    found = examples(question, path)
+    if not found:
+        return ""
+    lines = ["Similar questions answered before. When one matches, adapt its SQL and reply "
+             "without exploring the tables again:"]
+    for _, prompt, sql in found:
+        lines.append(f"Q: {prompt}\nSQL: {sql}")
+    return "\n\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the few-shot examples picked for a question')
+    parser.add_argument('question', help='Natural language question')
+    parser.add_argument('--pairs', default=None, help='Pairs JSONL (default FEWSHOT_PAIRS_PATH or ROUTER_RECORD_PATH)')
+    parser.add_argument('-k', type=int, default=DEFAULT_K, help='Examples to return')
+    parser.add_argument('--min-score', type=float, default=DEFAULT_MIN_SCORE, help='Lowest similarity kept')
+    args = parser.parse_args()
+    index = load_index(args.pairs)
+    if index is None:
+        parser.error("no pairs file; pass --pairs or set FEWSHOT_PAIRS_PATH")
+    print(f"{len(index)} pairs indexed", file=sys.stderr)
+    for score, prompt, sql in index.search(args.question, args.k, args.min_score):
+        print(f"{score:.3f}  {prompt}\n       {' '.join(sql.split())}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+import re
+
+# Intent keyword patterns, in the order get_query_intent reports them.
+INTENT_PATTERNS = {
+    'delete': r'delete|remove|drop|truncate',
+    'insert': r'insert|add|create new|put in',
+    'update': r'update|modify|change|set',
+    'select_count': r'count|how many|number of|total',
+    'select_top': r'top|highest|most|maximum|best',
+    'select_bottom': r'bottom|lowest|least|minimum|worst',
+    'select_avg': r'average|mean|avg',
+    'select_sum': r'sum|total of|add up',
+    'select_recent': r'recent|latest|newest|last|yesterday|this week|this month',
+    'select_time_range': r'between|from.*to|since|last week|last month|last year|previous|ago',
+    'select_time_series': r'over time|trend|timeline|time series|per day|per hour|per week|daily|hourly|weekly',
+    'select_group': r'group by|grouped by|categories|categorize|distribution|breakdown',
+    'select_filter': r'where|with|filter|having|specific|only',
+    'select_join': r'join|related|relation|connected|association|link',
+    'select_distinct': r'distinct|unique|different',
+    'describe': r'describe|explain|tell me about|what is|details|schema|columns'
+}
+
+DEFAULT_INTENT = 'select_basic'
+
+_SPAN_RE = re.compile(r'^([^.*|\\]+)\.\*([^.*|\\]+)$')
+_NEWLINE = '\n'
+
+
+def _trie_pattern(keywords):
+    """Build a prefix-factored alternation that prefers the longest keyword."""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def render(node):
+        branches = [re.escape(char) + render(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            if len(branches) == 1 and len(body) > 1:
+                body = '(?:' + body + ')'
+            return body + '?'
+        return body
+
+    return render(trie)
+
+
+class IntentEngine:
+    """Single-pass intent matcher compiled from keyword alternation patterns.
+
+    Every literal keyword of every pattern goes into one prefix-factored
+    lookahead alternation that prefers the longest keyword. Scanning the
+    text once yields, at each position, the longest keyword starting there;
+    any shorter keyword that starts at the same position is a prefix of it,
+    so the prefix closure computed at build time recovers every keyword a
+    per-pattern ``re.search`` would have found. ``head.*tail`` parts are resolved from
+    the same scan by pairing head and tail positions within a line.
+    """
+
+    def __init__(self, patterns=None, default_intent=DEFAULT_INTENT):
+        patterns = INTENT_PATTERNS if patterns is None else patterns
+        self.intents = tuple(patterns)
+        self.default_intent = default_intent
+
+        keyword_bits = {}
+        span_rules = []
+        for bit, (intent, pattern) in enumerate(patterns.items()):
+            for part in pattern.split('|'):
+                span = _SPAN_RE.match(part)
+                if span:
+                    span_rules.append((span.group(1), span.group(2), 1 << bit))
+                elif re.escape(part) == part.replace(' ', '\\ '):
+                    keyword_bits[part] = keyword_bits.get(part, 0) | (1 << bit)
+                else:
+                    raise ValueError(f"Unsupported pattern part for intent '{intent}': {part!r}")
+
+        self._span_rules = tuple(span_rules)
+        keywords = set(keyword_bits)
+        for head, tail, _ in span_rules:
+            keywords.update((head, tail))
+        if span_rules:
+            keywords.add(_NEWLINE)
+
+        # Each keyword reports its own bits plus the bits of every keyword
+        # that is a prefix of it, plus which span heads/tails it contains
+        # as a prefix.
+        self._closure = {}
+        for keyword in keywords:
+            bits = 0
+            heads = []
+            tails = []
+            for other, other_bits in keyword_bits.items():
+                if keyword.startswith(other):
+                    bits |= other_bits
+            for index, (head, tail, _) in enumerate(span_rules):
+                if keyword.startswith(head):
+                    heads.append((index, len(head)))
+                if keyword.startswith(tail):
+                    tails.append(index)
+            self._closure[keyword] = (bits, tuple(heads), tuple(tails))
+
+        self._scanner = re.compile(f'(?=({_trie_pattern(keywords)}))')
+
+        self._result_cache = {}
+
+    def match_mask(self, query_lower):
+        """Return the bitmask of intents found in already lowercased text."""
+        mask = 0
+        closure = self._closure
+        span_rules = self._span_rules
+        # Earliest end offset of each span head on the current line.
+        head_ends = [None] * len(span_rules)
+        for match in self._scanner.finditer(query_lower):
+            keyword = match.group(1)
+            bits, heads, tails = closure[keyword]
+            mask |= bits
+            if not span_rules:
+                continue
+            if keyword == _NEWLINE:
+                head_ends = [None] * len(span_rules)
+                continue
+            position = match.start()
+            for index in tails:
+                head_end = head_ends[index]
+                if head_end is not None and head_end <= position:
+                    mask |= span_rules[index][2]
+            for index, length in heads:
+                if head_ends[index] is None:
+                    head_ends[index] = position + length
+        return mask
+
+    def mask_to_intents(self, mask):
+        """Expand a bitmask into the ordered list of intent names."""
+        if not mask:
+            return [self.default_intent]
+        cached = self._result_cache.get(mask)
+        if cached is None:
+            cached = tuple(intent for bit, intent in enumerate(self.intents) if mask >> bit & 1)
+            self._result_cache[mask] = cached
+        return list(cached)
+
+    def classify(self, query_text):
+        """Determine the intents of one natural language query."""
+        return self.mask_to_intents(self.match_mask(query_text.lower().strip()))
+
+    def classify_many(self, queries):
+        """Determine the intents of every query in an iterable, in order."""
+        match_mask = self.match_mask
+        mask_to_intents = self.mask_to_intents
+        return [mask_to_intents(match_mask(query.lower().strip())) for query in queries]
+
+
+# Compiling the scanner takes a few milliseconds, so it happens on first use, not at import
+_default_engine = None
+
+
+def get_engine():
+    """Return the shared engine over INTENT_PATTERNS, built on first use."""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = IntentEngine()
+    return _default_engine
+
+
+def classify(query_text):
+    """Determine the intents of a query with the default engine."""
+    return get_engine().classify(query_text)
+
+
+def classify_many(queries):
+    """Determine the intents of a batch of queries with the default engine."""
+    return get_engine().classify_many(queries)
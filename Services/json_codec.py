@@ -0,0 +1,91 @@
+"""One JSON codec for the service: orjson when installed, the stdlib otherwise.
+
+``dumps`` returns UTF-8 bytes in both cases and understands the read-only
+views the schema registry hands out (MappingProxyType).
+Documents that are already serialized can be embedded without a parse
+and re-serialize round trip by wrapping them in ``RawJSON``:
+
+    payload = json_codec.dumps({"dashboard": json_codec.RawJSON(template), "overwrite": True})
+"""
+import json
+import os
+from collections.abc import Mapping
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+# orjson.JSONDecodeError subclasses it, so callers catch one type for both backends
+JSONDecodeError = json.JSONDecodeError
+
+
+class RawJSON:
+    """Already serialized, valid JSON (str or bytes) to embed as-is by ``dumps``."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data.encode() if isinstance(data, str) else bytes(data)
+
+    def __bytes__(self):
+        return self.data
+
+    def __str__(self):
+        return self.data.decode()
+
+
+def loads(data):
+    """Parse JSON from str or bytes."""
+    if isinstance(data, RawJSON):
+        data = data.data
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _default(value):
+    if isinstance(value, Mapping):
+        return dict(value)
+    if hasattr(value, "_asdict"):
+        return value._asdict()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj, indent=False, sort_keys=False):
+    """Serialize to UTF-8 bytes; RawJSON values are copied into the output verbatim."""
+    if isinstance(obj, RawJSON):
+        return obj.data
+    fragments = {}
+
+    def default(value):
+        if isinstance(value, RawJSON):
+            if orjson and hasattr(orjson, "Fragment"):
+                return orjson.Fragment(value.data)
+            token = f"__raw_json_{os.urandom(8).hex()}__"
+            fragments[f'"{token}"'.encode()] = value.data
+            return token
+        return _default(value)
+
+    if orjson:
+        option = 0
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        data = orjson.dumps(obj, default=default, option=option)
+    else:
+        data = json.dumps(obj, default=default, ensure_ascii=False, sort_keys=sort_keys,
+                          indent=2 if indent else None, separators=None if indent else (",", ":")).encode()
+    for token, raw in fragments.items():
+        data = data.replace(token, raw, 1)
+    return data
+
+
+def dumps_str(obj, indent=False, sort_keys=False):
+    """``dumps`` decoded to str, for text files and printing."""
+    return dumps(obj, indent, sort_keys).decode()
@@ -1,4 +1,160 @@
-import json
+import os
+import sys
+import threading
+import time
+from types import MappingProxyType
+
+import json_codec
+
+# How often (seconds) a registry stats its file to look for changes
+CHECK_INTERVAL = 1.0
+
+
+class _Snapshot:
+    """One parsed version of the metadata file and its indexes."""
+
+    def __init__(self, data, fingerprint):
+        tables = {}
+        columns = {}
+        tables_by_column = {}
+        columns_by_type = {}
+        for table in data.get("tables", []):
+            tablename = table.get("tablename")
+            if not tablename:
+                continue
+            schema = tuple(MappingProxyType(dict(column)) for column in table.get("schema", []))
+            tables[tablename] = MappingProxyType({"tablename": tablename, "schema": schema})
+            column_types = {}
+            for column in schema:
+                columnname = column.get("columnname")
+                columntype = column.get("columntype", "String")
+                column_types[columnname] = columntype
+                tables_by_column.setdefault(columnname, []).append(tablename)
+                columns_by_type.setdefault(columntype, []).append((tablename, columnname))
+            columns[tablename] = MappingProxyType(column_types)
+        self.fingerprint = fingerprint
+        self.tables = MappingProxyType(tables)
+        self.columns = MappingProxyType(columns)
+        self.tables_by_column = MappingProxyType({name: tuple(t) for name, t in tables_by_column.items()})
+        self.columns_by_type = MappingProxyType({name: tuple(c) for name, c in columns_by_type.items()})
+
+
+class SchemaRegistry:
+    """Parsed, indexed view of a table_metadata.json file.
+
+    The file is parsed once; afterwards it is stat'ed at most every
+    ``check_interval`` seconds and re-parsed only when its mtime or size
+    changed and its content hash differs. Lookups return read-only views
+    of the shared index (MappingProxyType / tuples) without copying.
+    """
+
+    def __init__(self, json_file_path, check_interval=CHECK_INTERVAL):
+        self.json_file_path = json_file_path
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._stat = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current(self):
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - self._checked_at >= self.check_interval:
+            self.refresh()
+            snapshot = self._snapshot
+        return snapshot
+
+    def refresh(self, force=False):
+        """Reload the file if it changed; return True when a new version was loaded.
+
+        Raises FileNotFoundError / json_codec.JSONDecodeError on the first load.
+        A failed reload keeps serving the previous version.
+        """
+        import hashlib
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                stat = os.stat(self.json_file_path)
+                stat_key = (stat.st_mtime_ns, stat.st_size)
+                if not force and self._snapshot is not None and stat_key == self._stat:
+                    return False
+                with open(self.json_file_path, "rb") as file:
+                    content = file.read()
+                fingerprint = hashlib.sha256(content).hexdigest()
+                if not force and self._snapshot is not None and fingerprint == self._snapshot.fingerprint:
+                    self._stat = stat_key
+                    return False
+                snapshot = _Snapshot(json_codec.loads(content), fingerprint)
+            except (OSError, ValueError) as e:
+                if self._snapshot is None:
+                    raise
+                print(f"Keeping previous schema for {self.json_file_path}: {e}", file=sys.stderr)
+                return False
+            self._snapshot = snapshot
+            self._stat = stat_key
+            return True
+
+    @property
+    def fingerprint(self):
+        """Content hash of the loaded file; changes whenever the schema does."""
+        return self._current().fingerprint
+
+    @property
+    def tables(self):
+        """Read-only mapping of tablename -> {"tablename", "schema"} in file order."""
+        return self._current().tables
+
+    def column_rows(self):
+        """Yield (tablename, columnname, columntype) for every column in file order.
+
+        A table without columns yields one row with None for both.
+        """
+        for tablename, table in self._current().tables.items():
+            if not table["schema"]:
+                yield tablename, None, None
+            for column in table["schema"]:
+                yield tablename, column.get("columnname"), column.get("columntype", "String")
+
+    def get_table(self, tablename):
+        """Return the read-only entry for a table, or None."""
+        return self._current().tables.get(tablename)
+
+    def columns(self, tablename):
+        """Return a read-only {columnname: columntype} mapping for a table, or None."""
+        return self._current().columns.get(tablename)
+
+    def tables_with_column(self, columnname):
+        """Return the names of the tables that have a column, in file order."""
+        return self._current().tables_by_column.get(columnname, ())
+
+    def columns_of_type(self, columntype):
+        """Return (tablename, columnname) pairs whose column has exactly this type."""
+        return self._current().columns_by_type.get(columntype, ())
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(json_file_path="table_metadata.json"):
+    """Return the process-wide registry for a metadata file.
+
+    Paths ending in .sqlite, .sqlite3 or .db are served by the lazily
+    loading schema_catalog.SchemaCatalog instead of parsing JSON.
+    """
+    key = os.path.abspath(json_file_path)
+    registry = _registries.get(key)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.get(key)
+            if registry is None:
+                import schema_catalog
+                if schema_catalog.is_catalog_path(key):
+                    registry = schema_catalog.SchemaCatalog(key)
+                else:
+                    registry = SchemaRegistry(key)
+                _registries[key] = registry
+    return registry
+
 
 def get_table_schema_json(tablename, json_file_path="table_metadata.json"):
     """
@@ -9,31 +165,22 @@ def get_table_schema_json(tablename, json_file_path="table_metadata.json"):
         json_file_path (str): Path to the JSON file containing the table metadata.
 
     Returns:
-        dict: A JSON payload containing the columnname and columntype for the given tablename.
+        Mapping: A read-only JSON-style payload containing the columnname and columntype for the given tablename.
     """
     try:
-        # Load the JSON file
-        with open(json_file_path, "r") as file:
-            data = json.load(file)
-
-        # Find the table with the given tablename
-        for table in data.get("tables", []):
-            if table.get("tablename") == tablename:
-                # Return the schema as a JSON payload
-                return {
-                    "tablename": tablename,
-                    "schema": table.get("schema", [])
-                }
+        table = get_registry(json_file_path).get_table(tablename)
+        if table is not None:
+            return table
 
         # If the tablename is not found, return an error message
         return {"error": f"Table '{tablename}' not found in the schema."}
 
     except FileNotFoundError:
         return {"error": f"File '{json_file_path}' not found."}
-    except json.JSONDecodeError:
+    except json_codec.JSONDecodeError:
         return {"error": "Invalid JSON format in the file."}
 
 if __name__ == "__main__":
     table_name_from_json = "td_agg_threat"
     schema = get_table_schema_json(table_name_from_json)
-    print(json.dumps(schema, indent=4))
+    print(json_codec.dumps_str(schema, indent=True))
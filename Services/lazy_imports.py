@@ -0,0 +1,141 @@
+"""Deferred imports for the CLI entry points, with an import-time breakdown.
+
+Heavy optional dependencies (agents SDK, openai, the ClickHouse MCP module,
+dotenv, requests) are loaded on first use through `load`, which caches the
+module and records how long the import took. `report` prints those
+timings together with any stages recorded via `timed`, which is what the
+``--startup-profile`` flag of main.py and natural_language_to_sql.py shows.
+
+With ``--startup-profile`` on the command line, `profile_imports` is
+installed as soon as this module is imported (the entry points import it
+first), so every later first import of a module is timed on its own, like
+``python -X importtime``.
+"""
+import _thread
+import builtins
+import importlib
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Legacy checkouts keep the agents SDK and the ClickHouse MCP package next to
+# Services instead of installing them; only directories that exist are added.
+VENDOR_PATHS = [
+    os.path.join(SERVICES_DIR, 'openai-agents-python/src'),
+    os.path.join(SERVICES_DIR, '../openai-agents-python/src'),
+    os.path.join(SERVICES_DIR, '../mcp-clickhouse'),
+    os.path.join(SERVICES_DIR, '../mcp-clickhouse/mcp_server'),
+]
+
+TIMINGS = []
+# (module, self seconds, cumulative seconds) per first import, in completion order
+IMPORTS = []
+_modules = {}
+_paths_added = False
+_builtin_import = builtins.__import__
+# Child import time of each import in progress, innermost last
+_import_stack = []
+_profiled_thread = None
+
+
+def record(label, seconds):
+    """Record a named startup stage."""
+    TIMINGS.append((label, seconds))
+
+
+@contextmanager
+def timed(label):
+    """Record the duration of the enclosed block as a startup stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(label, time.perf_counter() - started)
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    module_name = name
+    if level:
+        from importlib.util import resolve_name
+        try:
+            module_name = resolve_name('.' * level + name, (globals or {}).get('__package__'))
+        except (ImportError, ValueError):
+            pass
+    if module_name in sys.modules or _thread.get_ident() != _profiled_thread:
+        return _builtin_import(name, globals, locals, fromlist, level)
+    _import_stack.append(0.0)
+    started = time.perf_counter()
+    try:
+        return _builtin_import(name, globals, locals, fromlist, level)
+    finally:
+        total = time.perf_counter() - started
+        children = _import_stack.pop()
+        if _import_stack:
+            _import_stack[-1] += total
+        IMPORTS.append((module_name, total - children, total))
+
+
+def profile_imports():
+    """Time every first import made from this thread from now on (see IMPORTS)."""
+    global _profiled_thread
+    _profiled_thread = _thread.get_ident()
+    builtins.__import__ = _timed_import
+
+
+def add_vendor_paths():
+    """Append the legacy vendored package directories that exist to sys.path."""
+    global _paths_added
+    if _paths_added:
+        return
+    _paths_added = True
+    for path in VENDOR_PATHS:
+        path = os.path.normpath(path)
+        if os.path.isdir(path) and path not in sys.path:
+            sys.path.append(path)
+
+
+def load(name, optional=False):
+    """Import `name` once and return the module.
+
+    Args:
+        name (str): Dotted module name.
+        optional (bool): Return None instead of raising when the import fails.
+    """
+    if name in _modules:
+        return _modules[name]
+    add_vendor_paths()
+    started = time.perf_counter()
+    try:
+        module = importlib.import_module(name)
+    except ImportError as e:
+        if not optional:
+            raise
+        print(f"Optional dependency {name} is unavailable: {e}", file=sys.stderr)
+        module = None
+    record(f"import {name}", time.perf_counter() - started)
+    _modules[name] = module
+    return module
+
+
+def report(file=None, top=25):
+    """Print the recorded stages and the `top` slowest module imports, slowest first."""
+    file = file or sys.stderr
+    print("Startup profile:", file=file)
+    print(f"  {'ms':>9}  stage", file=file)
+    for label, seconds in sorted(TIMINGS, key=lambda item: item[1], reverse=True):
+        print(f"  {seconds * 1000:9.2f}  {label}", file=file)
+    if IMPORTS:
+        print(f"  {'self ms':>9}  {'total ms':>9}  module ({len(IMPORTS)} imported, slowest {top} by self time)",
+              file=file)
+        for module_name, own, total in sorted(IMPORTS, key=lambda item: item[1], reverse=True)[:top]:
+            print(f"  {own * 1000:9.2f}  {total * 1000:9.2f}  {module_name}", file=file)
+    print(f"  {'modules':>9}  {len(sys.modules)} loaded", file=file)
+
+
+# Profiling has to start before the entry point imports the service modules,
+# so the flag is read from the command line here rather than after argparse
+if '--startup-profile' in sys.argv:
+    profile_imports()
@@ -0,0 +1,393 @@
+"""Admission control in front of the Azure OpenAI client.
+
+Every chat completion the agents make passes through one LLMGateway:
+
+* token buckets for requests per minute (LLM_RPM) and estimated tokens per
+  minute (LLM_TPM), each holding LLM_BURST_SECONDS worth of budget, so
+  bursts are spread out instead of turning into 429s and retry storms;
+* at most LLM_MAX_CONCURRENCY requests in flight;
+* a priority queue: callers wait in priority order, interactive requests
+  (the default) ahead of batch ones marked with ``priority(PRIORITY_BATCH)``.
+
+A 429 that still gets through pauses the whole gateway for its
+Retry-After. The gateway sits in the httpx transport of the client
+returned by ``http_client``, which also fixes the connection pool and
+keep-alive settings (LLM_MAX_CONNECTIONS, LLM_KEEPALIVE_EXPIRY):
+
+    client = openai.AsyncAzureOpenAI(..., http_client=llm_gateway.http_client())
+
+``install_default_client`` does this for the agents SDK; main.py and
+natural_language_to_sql.py both call it. Limits set to 0 are off. ``stats`` reports queue waits per priority.
+"""
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import os
+import re
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_BURST_SECONDS = 1.0
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+DEFAULT_TIMEOUT = 120.0
+# Completion tokens assumed when a request does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 512
+# Rough bytes per token of a JSON chat request
+BYTES_PER_TOKEN = 4
+# Queue waits kept per priority for the percentiles
+WAIT_SAMPLES = 1024
+
+_priority = contextvars.ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+_MAX_TOKENS_RE = re.compile(rb'"max_(?:completion_)?tokens"\s*:\s*(\d+)')
+_TOTAL_TOKENS_RE = re.compile(rb'"total_tokens"\s*:\s*(\d+)')
+# Bytes kept from the end of a response to read its usage block
+_USAGE_TAIL = 4096
+
+
+@contextmanager
+def priority(level):
+    """Run the enclosed LLM calls (and tasks started inside) at `level`; lower goes first."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def estimate_tokens(body):
+    """Prompt plus completion tokens a request body may use."""
+    if not body:
+        return 0
+    match = _MAX_TOKENS_RE.search(body)
+    completion = int(match.group(1)) if match else DEFAULT_COMPLETION_TOKENS
+    return len(body) // BYTES_PER_TOKEN + completion
+
+
+class TokenBucket:
+    """Budget refilled at `per_minute` / 60 per second, holding `burst_seconds` of it.
+
+    ``take`` may overdraw the bucket; later callers wait until it is repaid,
+    so one request larger than the capacity is admitted rather than stuck.
+    """
+
+    def __init__(self, per_minute, burst_seconds=DEFAULT_BURST_SECONDS, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount):
+        """Seconds until `amount` can be taken."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self._refill()
+        self.level -= amount
+
+    def give_back(self, amount):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class LLMGateway:
+    """Rate limits, a concurrency limit and priority ordering for LLM requests.
+
+    Args:
+        rpm (int): Requests per minute; 0 for no limit.
+        tpm (int): Estimated tokens per minute; 0 for no limit.
+        max_concurrency (int): Requests in flight; 0 for no limit.
+        burst_seconds (float): Seconds of budget each bucket can hold.
+        clock: Monotonic time source, replaceable in tests.
+    """
+
+    def __init__(self, rpm=0, tpm=0, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 burst_seconds=DEFAULT_BURST_SECONDS, clock=time.monotonic):
+        self.requests = TokenBucket(rpm, burst_seconds, clock) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, burst_seconds, clock) if tpm > 0 else None
+        self.max_concurrency = max_concurrency
+        self.clock = clock
+        self.active = 0
+        self.granted = 0
+        self.rate_limited = 0
+        self.paused_until = 0.0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._timer = None
+        self._waits = {}
+
+    async def acquire(self, tokens=0, priority=None):
+        """Wait for a slot and the budget for one request of about `tokens` tokens.
+
+        Every successful acquire must be paired with ``release``.
+        """
+        priority = current_priority() if priority is None else priority
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._sequence), tokens, self.clock(), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Granted just before the caller was cancelled: hand the slot back
+            if future.done() and not future.cancelled():
+                self.release(tokens, 0)
+            raise
+
+    def release(self, reserved_tokens=0, used_tokens=None):
+        """Free a slot; `used_tokens` corrects the token bucket for the estimate."""
+        self.active -= 1
+        if self.tokens is not None and used_tokens is not None:
+            if used_tokens < reserved_tokens:
+                self.tokens.give_back(reserved_tokens - used_tokens)
+            else:
+                self.tokens.take(used_tokens - reserved_tokens)
+        self._dispatch()
+
+    def pause(self, seconds):
+        """Stop granting for `seconds`, after the service answered 429."""
+        self.rate_limited += 1
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._waiting:
+            priority, _, tokens, queued_at, future = self._waiting[0]
+            if future.done():
+                heapq.heappop(self._waiting)
+                continue
+            if self.max_concurrency and self.active >= self.max_concurrency:
+                return  # release() dispatches again
+            now = self.clock()
+            delay = self.paused_until - now
+            if self.requests is not None:
+                delay = max(delay, self.requests.delay(1))
+            if self.tokens is not None:
+                delay = max(delay, self.tokens.delay(tokens))
+            if delay > 0:
+                self._wake_in(delay)
+                return
+            heapq.heappop(self._waiting)
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None:
+                self.tokens.take(tokens)
+            self.active += 1
+            self.granted += 1
+            self._waits.setdefault(priority, deque(maxlen=WAIT_SAMPLES)).append(now - queued_at)
+            future.set_result(None)
+
+    def _wake_in(self, delay):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    def stats(self):
+        """Grants, 429s, current queue and queue-wait percentiles (ms) per priority."""
+        waits = {}
+        for level, samples in sorted(self._waits.items()):
+            ordered = sorted(samples)
+            waits[level] = {"count": len(ordered),
+                            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 1),
+                            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 1),
+                            "max_ms": round(ordered[-1] * 1000, 1)}
+        return {"granted": self.granted, "rate_limited": self.rate_limited, "active": self.active,
+                "queued": sum(1 for entry in self._waiting if not entry[4].done()), "wait": waits}
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class _GatedStream:
+    """Response body that frees the gateway slot when closed, reporting the tokens used.
+
+    Mixed into the AsyncByteStream of the client's httpx module by ``_stream_class``.
+    """
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._tail = b""
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._tail = (self._tail + chunk)[-_USAGE_TAIL:]
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close is not None:
+                match = _TOTAL_TOKENS_RE.search(self._tail)
+                self._on_close(int(match.group(1)) if match else None)
+                self._on_close = None
+
+
+@functools.lru_cache(maxsize=None)
+def _stream_class(http):
+    return type("GatedStream", (_GatedStream, http.AsyncByteStream), {})
+
+
+def _http_module(client_class):
+    """The httpx-compatible module a client class is built on (openai may ship its own fork)."""
+    for base in client_class.__mro__:
+        root = base.__module__.partition(".")[0]
+        if root.startswith("httpx"):
+            return sys.modules[root]
+    return httpx
+
+
+class GatewayTransport:
+    """httpx transport that admits each request through an LLMGateway.
+
+    Args:
+        gateway (LLMGateway): Gateway requests wait on.
+        transport: Transport that sends the request once admitted.
+        http: httpx module the transport belongs to (default httpx).
+    """
+
+    def __init__(self, gateway, transport, http=None):
+        self.gateway = gateway
+        self.transport = transport
+        self.http = http or httpx
+
+    async def handle_async_request(self, request):
+        try:
+            tokens = estimate_tokens(request.content)
+        except self.http.RequestNotRead:
+            tokens = DEFAULT_COMPLETION_TOKENS
+        await self.gateway.acquire(tokens)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self.gateway.release(tokens, 0)
+            raise
+        if response.status_code == 429:
+            self.gateway.pause(_retry_after(response.headers))
+        # The slot is held until the body has been read
+        response.stream = _stream_class(self.http)(response.stream, lambda used: self.gateway.release(tokens, used))
+        return response
+
+    async def __aenter__(self):
+        await self.transport.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.transport.__aexit__(*exc_info)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def _retry_after(headers):
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        try:
+            return float(headers[name]) * scale
+        except (KeyError, ValueError):
+            pass
+    return 1.0
+
+
+def http_client(gateway=None, client_class=None, max_connections=None, keepalive_expiry=None, timeout=None):
+    """httpx AsyncClient for the OpenAI SDK with a pooled, gated transport.
+
+    Args:
+        gateway (LLMGateway): Gateway to admit requests through (default get_gateway()).
+        client_class: AsyncClient subclass to build, e.g. openai.DefaultAsyncHttpxClient.
+        max_connections (int): Pool size (LLM_MAX_CONNECTIONS, default the concurrency limit).
+        keepalive_expiry (float): Seconds an idle connection is kept (LLM_KEEPALIVE_EXPIRY).
+        timeout (float): Request timeout in seconds (LLM_TIMEOUT).
+    """
+    gateway = gateway or get_gateway()
+    client_class = client_class or httpx.AsyncClient
+    http = _http_module(client_class)
+    max_connections = max_connections or int(os.getenv("LLM_MAX_CONNECTIONS") or 0) or gateway.max_concurrency or 20
+    keepalive_expiry = keepalive_expiry or float(os.getenv("LLM_KEEPALIVE_EXPIRY") or DEFAULT_KEEPALIVE_EXPIRY)
+    timeout = timeout or float(os.getenv("LLM_TIMEOUT") or DEFAULT_TIMEOUT)
+    limits = http.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                         keepalive_expiry=keepalive_expiry)
+    transport = GatewayTransport(gateway, http.AsyncHTTPTransport(limits=limits), http)
+    return client_class(transport=transport, timeout=http.Timeout(timeout, connect=10.0))
+
+
+_gateway = None
+
+
+def get_gateway():
+    """The process-wide gateway configured from LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY and LLM_BURST_SECONDS."""
+    global _gateway
+    if _gateway is None:
+        try:
+            rpm = int(os.getenv("LLM_RPM") or 0)
+            tpm = int(os.getenv("LLM_TPM") or 0)
+            concurrency = int(os.getenv("LLM_MAX_CONCURRENCY") or DEFAULT_MAX_CONCURRENCY)
+            burst_seconds = float(os.getenv("LLM_BURST_SECONDS") or DEFAULT_BURST_SECONDS)
+        except ValueError:
+            print("Ignoring invalid LLM_* gateway settings", file=sys.stderr)
+            rpm, tpm, concurrency, burst_seconds = 0, 0, DEFAULT_MAX_CONCURRENCY, DEFAULT_BURST_SECONDS
+        _gateway = LLMGateway(rpm, tpm, concurrency, burst_seconds)
+    return _gateway
+
+
+_client = None
+
+
+def install_default_client(sdk, api_key=None, azure_endpoint=None, api_version=None):
+    """Make an OpenAI client that sends through the gateway the agents SDK default.
+
+    With `azure_endpoint` the client is AsyncAzureOpenAI on the chat
+    completions API; otherwise AsyncOpenAI
+    reads the usual OPENAI_* environment, as the SDK's own default would. The
+    first call builds the client and later calls return it.
+
+    Returns:
+        The client, or None when it could not be built (the SDK default is kept).
+    """
+    global _client
+    if _client is None:
+        import lazy_imports
+        openai = lazy_imports.load("openai")
+        client_options = {"http_client": http_client(client_class=getattr(openai, "DefaultAsyncHttpxClient", None))}
+        try:
+            if azure_endpoint:
+                _client = openai.AsyncAzureOpenAI(api_key=api_key, azure_endpoint=azure_endpoint,
+                                                  api_version=api_version, **client_options)
+                # Azure deployments serve chat completions, not the responses API
+                sdk.set_default_openai_api("chat_completions")
+            else:
+                _client = openai.AsyncOpenAI(api_key=api_key or None, **client_options)
+        except openai.OpenAIError as e:
+            print(f"LLM gateway not installed: {e}", file=sys.stderr)
+            return None
+        sdk.set_default_openai_client(_client, use_for_tracing=False)
+    return _client
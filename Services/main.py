@@ -1,107 +1,223 @@
+import time
+_import_started = time.perf_counter()
+# First, so --startup-profile times every import below
+import lazy_imports
+import contextvars
 import os
 import sys
-import json
 import argparse
 import re
 from datetime import datetime, timedelta
-import asyncio
-
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-#from Services.functools import listdatabases, listtables, runselectquery
-from dotenv import load_dotenv
-
-
-# Load environment variables from .env file
-load_dotenv()
-
-# Read Azure OpenAI API configuration
-API_BASE = os.getenv("OPENAI_API_BASE") or ""
-API_KEY = os.getenv("OPENAI_API_KEY") or ""
-MODEL_NAME =  os.getenv("OPENAI_API_VERSION") or ""
-DEPLOYMENT_NAME = os.getenv("OPENAI_API_DEPLOYMENT_NAME") or ""
-#API_BASE = ""
-#MODEL_NAME ="2025-01-01-preview"
-
-if not API_KEY:
-    print("Error: OPENAI_API_BASE or OPENAI_API_KEY is not set in the environment or .env file.", file=sys.stderr)
-else:
-    print(f"OpenAI API Base: {API_BASE}")
-    #lord murugan
-
-sys.path.append("../mcp-clickhouse/.venv/lib/python3.13/site-packages")
-# Add the openai-agents-python/src to the path to properly access the agents module
-sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../openai-agents-python/src'))
-sys.path.append("/Users/dkumar1/Projects/Threatdefence/github/aiagent/mcp-clickhouse/.venv/lib/python3.13/site-packages")
-current_dir = os.getcwd()
-path_to_add = os.path.join(current_dir, '../mcp-clickhouse')
-if not os.path.exists(path_to_add):
-    os.makedirs(path_to_add)
- 
-sys.path.append(path_to_add)
-
-from agents import function_tool
-import mcp_clickhouse.mcp_server as mcp_my_app
-# Import MCP server clients
-from mcp_clickhouse.mcp_server import list_databases, list_tables, run_select_query
-# Import MCP server clients
-from mcp_clickhouse.mcp_server import mcp, create_clickhouse_client
-
-from mcp_grafana_client import create_grafana_client, create_dashboard
 from typing import Any
 
+import json_codec
+from clickhouse_sql import REFUSAL_PREFIX
+
 demodashboard = 1
 
-# Add the openai-agents-python/src to the path to properly access the agents module
-sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../openai-agents-python/src'))
-#print(sys.path)
+# Azure OpenAI configuration; filled in by load_settings() after .env is read
+API_BASE = ""
+API_KEY = ""
+MODEL_NAME = ""
+DEPLOYMENT_NAME = ""
+_settings_loaded = False
+_openai_client = None
+_clickhouse_tools = None
+# Per request: a dict that receives the schema selection's token accounting
+_schema_tokens = contextvars.ContextVar("schema_tokens", default=None)
+
+
+def load_settings():
+    """Load the .env file and the Azure OpenAI configuration once."""
+    global API_BASE, API_KEY, MODEL_NAME, DEPLOYMENT_NAME, _settings_loaded
+    if _settings_loaded:
+        return
+    _settings_loaded = True
+    dotenv = lazy_imports.load("dotenv", optional=True)
+    if dotenv:
+        dotenv.load_dotenv()
+
+    API_BASE = os.getenv("OPENAI_API_BASE") or ""
+    API_KEY = os.getenv("OPENAI_API_KEY") or ""
+    MODEL_NAME = os.getenv("OPENAI_API_VERSION") or ""
+    DEPLOYMENT_NAME = os.getenv("OPENAI_API_DEPLOYMENT_NAME") or ""
+    if not API_KEY:
+        print("Error: OPENAI_API_BASE or OPENAI_API_KEY is not set in the environment or .env file.", file=sys.stderr)
+    else:
+        print(f"OpenAI API Base: {API_BASE}", file=sys.stderr)
+
+
+def agents_sdk():
+    """Return the OpenAI Agents SDK wired to the Azure client, or None when it is not installed.
+
+    The client is created on the first call rather than at import time.
+    """
+    global _openai_client
+    sdk = lazy_imports.load("agents", optional=True)
+    if sdk is not None and _openai_client is None:
+        load_settings()
+        # Requests are admitted through the LLM gateway (rate limits, priority, pooling)
+        import llm_gateway
+        _openai_client = llm_gateway.install_default_client(sdk, API_KEY, API_BASE, MODEL_NAME)
+        sdk.set_tracing_disabled(disabled=True)
+        sdk.set_default_openai_api("chat_completions")
+    return sdk
+
+
+def clickhouse_mcp():
+    """Return the ClickHouse MCP server module."""
+    return lazy_imports.load("mcp_clickhouse.mcp_server")
+
+
+def grafana_client():
+    """Return the Grafana MCP client module."""
+    return lazy_imports.load("mcp_grafana_client")
+
+
+def __getattr__(name):
+    # USING_AGENTS_SDK and the FastAPI app are built on first access so that
+    # importing this module stays cheap
+    if name == "USING_AGENTS_SDK":
+        return agents_sdk() is not None
+    if name == "app":
+        globals()["app"] = _create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-@function_tool
 async def list_databases()-> list:
     """List database."""
-    #print("getting database", type(list_databases()))
     print("getting database-1")
     return ["reports"]
-    #return ["reports"]
 
-@function_tool
 async def list_tables(database: str) -> list[dict[str, Any]]:
     """List all tables."""
+    import asyncio
     print("list tables -2", database)
-    # query = "SELECT COLUMN_NAME AS name, DATA_TYPE AS type FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = 'reports'"
-    # result = mcp_my_app.runselectquery(query)
-    # print("queries result", query)
-    return mcp_my_app.list_tables(database)
+    return await discovery_cache().get(("list_tables", database),
+                                       lambda: asyncio.to_thread(clickhouse_mcp().list_tables, database))
     
-@function_tool
 async def run_select_query(query: str) -> str:
     """Run a SELECT query."""
-    temp = mcp_my_app.run_select_query(query)
+    temp = clickhouse_mcp().run_select_query(query)
     print("running query returned", temp)
     return temp
 
-try:
-    from openai import AsyncOpenAI, AsyncAzureOpenAI
-    from agents import Agent, Runner, set_tracing_disabled, set_default_openai_client, set_default_openai_api
-    USING_AGENTS_SDK = True
-    print("Successfully imported OpenAI Agents SDK", file=sys.stderr)
-except ImportError as e:
-    print(f"Error importing the OpenAI Agents SDK: {e}", file=sys.stderr)
-    print("Using fallback approach without external dependencies.", file=sys.stderr)
-    USING_AGENTS_SDK = False
 
-#client = AsyncOpenAI(base_url=API_BASE, api_key=API_KEY)
-#set_tracing_disabled(disabled=True)
+# Table lists almost never change, so list_tables answers from memory for
+# DISCOVERY_CACHE_TTL seconds (default 300); the schema watcher invalidates
+# it as soon as tables are added or removed. list_databases is static.
+_discovery_cache = None
 
 
+def discovery_cache():
+    """The shared cache behind the discovery tools, created on first use."""
+    global _discovery_cache
+    if _discovery_cache is None:
+        from async_cache import AsyncTTLCache
+        _discovery_cache = AsyncTTLCache(ttl=float(os.getenv("DISCOVERY_CACHE_TTL") or 300))
+    return _discovery_cache
 
-client = AsyncAzureOpenAI(
-         api_key=API_KEY,
-         azure_endpoint=API_BASE,
-         api_version=MODEL_NAME  # Or the appropriate API version
-    )
-set_tracing_disabled(disabled=True)
-set_default_openai_client(client, use_for_tracing=False) # Optional: use_for_tracing=False
-set_default_openai_api("chat_completions")
+
+def _invalidate_discovery(event):
+    if event.added or event.removed:
+        discovery_cache().invalidate()
+
+
+def clickhouse_tools(names=None):
+    """Wrap the ClickHouse helpers as agent function tools on first use.
+
+    Args:
+        names (list): Tool names to return, e.g. ["run_select_query"]; all by default.
+    """
+    global _clickhouse_tools
+    if _clickhouse_tools is None:
+        function_tool = agents_sdk().function_tool
+        _clickhouse_tools = {tool.__name__: function_tool(tool) for tool in (list_databases, list_tables, run_select_query)}
+    return [tool for name, tool in _clickhouse_tools.items() if names is None or name in names]
+
+
+# AGENT_SCHEMA_MODE=context writes the relevant tables from the local schema
+# catalog into the agent instructions, so the agent no longer spends turns on
+# list_databases / list_tables and keeps run_select_query only to validate its
+# query. AGENT_MAX_TURNS caps the agent loop in either mode.
+SCHEMA_MODE_TOOLS = "tools"
+SCHEMA_MODE_CONTEXT = "context"
+DEFAULT_CONTEXT_MAX_TURNS = 3
+
+
+def agent_schema_mode():
+    """How the agent learns the schema: tools (default) or context."""
+    mode = (os.getenv("AGENT_SCHEMA_MODE") or SCHEMA_MODE_TOOLS).lower()
+    return SCHEMA_MODE_CONTEXT if mode == SCHEMA_MODE_CONTEXT else SCHEMA_MODE_TOOLS
+
+
+def agent_max_turns(schema_mode):
+    """Turn limit for the agent loop, or None for the SDK default."""
+    try:
+        max_turns = int(os.getenv("AGENT_MAX_TURNS") or 0)
+    except ValueError:
+        print("Ignoring invalid AGENT_MAX_TURNS", file=sys.stderr)
+        max_turns = 0
+    if max_turns > 0:
+        return max_turns
+    # Writing the query plus one validation call; discovery no longer needs turns
+    return DEFAULT_CONTEXT_MAX_TURNS if schema_mode == SCHEMA_MODE_CONTEXT else None
+
+
+AGENT_INSTRUCTIONS_CONTEXT = """You are a SQL expert. Write a ClickHouse SQL query that retrieves data for a time-series graph to be displayed in a Grafana dashboard.
+        The query should:
+        1. Include a `timestamp` column for the x-axis of the time-series graph.
+        2. Fetch relevant metrics or values for the y-axis
+        3. Use only the tables and columns of the reports database given with the question. They are complete; do not look up databases, tables or columns.
+        4. Limit the results to 1000 rows for performance.
+        5. You may call run_select_query once with your query and LIMIT 1 to check that it runs; fix it if it fails.
+        6. Give the sql query in one line no line break.
+
+        Respond ONLY with the SQL query. Do not include explanations or additional text."""
+
+AGENT_INSTRUCTIONS_TOOLS = """You are a SQL expert. Write an SQL query that retrieves data for a time-series graph to be displayed in a Grafana dashboard.
+        The query should:
+        1. Include a `timestamp` column for the x-axis of the time-series graph.
+        2. Fetch relevant metrics or values for the y-axis
+        3. Use the database and table schema provided with the question.
+        4. Limit the results to 1000 rows for performance.
+        5. Use the tool list_databases, list_tables and run_select_query to get the sql query.
+        6. Do not rely on your own knowledge.
+        7. Give the sql query in one line no line break.
+        8. Wait for the tool result if not throw error
+        
+
+        Respond ONLY with the SQL query. Do not include explanations or additional text."""
+
+# Agents are built once per (schema mode, schema fingerprint, deployment) and
+# shared by every request, so their instructions stay byte-identical and the
+# provider's prompt cache can serve the prefix. Per-request data (date,
+# relevant tables, statistics) goes into the input instead.
+_sql_agents = {}
+
+
+def get_sql_agent(schema_mode):
+    """The shared SQL agent for a schema mode and the current schema."""
+    from entity_lexicon import schema_fingerprint
+    key = (schema_mode, schema_fingerprint(), DEPLOYMENT_NAME)
+    agent = _sql_agents.get(key)
+    if agent is None:
+        if schema_mode == SCHEMA_MODE_CONTEXT:
+            instructions, tools = AGENT_INSTRUCTIONS_CONTEXT, clickhouse_tools(["run_select_query"])
+        else:
+            instructions, tools = AGENT_INSTRUCTIONS_TOOLS, clickhouse_tools()
+        agent = agents_sdk().Agent(
+            name="SQL Generator (ClickHouse)",
+            instructions=instructions,
+            model=DEPLOYMENT_NAME,
+            tools=tools
+        )
+        # Agents built for an older schema are not used again
+        for stale in [cached for cached in _sql_agents if cached[1] != key[1]]:
+            del _sql_agents[stale]
+        _sql_agents[key] = agent
+    return agent
 
 
 def load_schema_from_file(schema_file):
@@ -111,9 +227,9 @@ def load_schema_from_file(schema_file):
             content = f.read()
             # Try to parse as JSON first
             try:
-                json_schema = json.loads(content)
+                json_schema = json_codec.loads(content)
                 return json_schema
-            except json.JSONDecodeError:
+            except json_codec.JSONDecodeError:
                 # If not valid JSON, return as is (assuming it's already DDL)
                 return content
     except Exception as e:
@@ -121,6 +237,33 @@ def load_schema_from_file(schema_file):
         return None
     
 
+# Learned router that sends simple prompts to the rule-based generator.
+# ROUTER_MODEL_PATH / ROUTER_THRESHOLD configure it, ROUTER_RECORD_PATH
+# records agent answers as training pairs.
+_prompt_router = None
+_prompt_router_loaded = False
+
+
+def get_prompt_router():
+    """Load the prompt router once; None when no model is configured."""
+    global _prompt_router, _prompt_router_loaded
+    if not _prompt_router_loaded:
+        from prompt_router import load_router
+        _prompt_router = load_router()
+        _prompt_router_loaded = True
+        if _prompt_router:
+            print(f"Prompt router loaded, threshold {_prompt_router.threshold}", file=sys.stderr)
+    return _prompt_router
+
+
+def rule_based_sql(query, table_schema):
+    """Generate SQL with the rule engine from natural_language_to_sql."""
+    from natural_language_to_sql import generate_better_sql_example
+    sql_query = generate_better_sql_example(query, table_schema if isinstance(table_schema, str) else "")
+    # The dashboard template embeds the query in a JSON string; keep it on one line
+    return " ".join(sql_query.split())
+
+
     
 
     
@@ -132,21 +275,21 @@ async def setup_mcp_servers():
 
     try:
         # Set up ClickHouse MCP server
-        clickhouse_server = create_clickhouse_client()
+        clickhouse_server = clickhouse_mcp().create_clickhouse_client()
         clickhouse_server.name = "ClickHouse MCP Server"
         #await clickhouse_server.connect()
         print(f"Connected to ClickHouse MCP server: {clickhouse_server.name}", file=sys.stderr)
 
         # List available tools for ClickHouse
 
-        clickhouse_tools = [list_databases, list_tables, run_select_query]
-        print(f"Available ClickHouse tools: {[tool.name for tool in clickhouse_tools]}", file=sys.stderr)
+        tool_names = [tool.__name__ for tool in (list_databases, list_tables, run_select_query)]
+        print(f"Available ClickHouse tools: {tool_names}", file=sys.stderr)
     except Exception as e:
         print(f"Error setting up ClickHouse MCP server: {e}", file=sys.stderr)
 
     try:
         # Set up Grafana MCP server
-        grafana_server = create_grafana_client("", "", 30, False)
+        grafana_server = grafana_client().create_grafana_client("", "", 30, False)
         #await grafana_server.connect()
         #print(f"Connected to Grafana MCP server: {grafana_server.name}", file=sys.stderr)
         print("Grafana server url: ", grafana_server.server_url)
@@ -162,96 +305,233 @@ async def setup_mcp_servers():
 
 
 async def nl_to_sql_with_mcp(natural_language_query, table_schema, clickhouse_server=None, grafana_server=None):
-    """Convert natural language to SQL using MCP servers (ClickHouse and Grafana)."""
-    print("nl_to_sql_with_mcp - ", clickhouse_server, grafana_server)
-    if not (clickhouse_server or grafana_server) or not USING_AGENTS_SDK:
-        # Fall back to the standard method if MCP servers are not available
-        #return nl_to_sql(natural_language_query, table_schema)
-        pass
-
-    try:
-        # Create a system prompt that includes the schema and task
-        # Example schema fetched from MCP protocol
-        database_name = "reports"
-        #table_name = "example_table"
-        column_list = ["timestamp", "metric_value", "category"]
-
-        # Generate the prompt
-        # prompt = f"""You are a SQL expert. Given the following database schema, write a SQL query that answers the user's question.
+    """Convert natural language to SQL with the agent and the ClickHouse MCP tools.
 
-        # query tool list database use reports in it and then query the tool List all tables to get the list of table and then execute Run a SELECT query to get the table schema don't use any generic table or schemas
+    Returns None when the ClickHouse MCP server is not available. The agents
+    SDK raises MaxTurnsExceeded when the agent reaches AGENT_MAX_TURNS; see
+    agent_sql.
+    """
+    print("nl_to_sql_with_mcp - ", clickhouse_server, grafana_server)
+    sdk = agents_sdk()
+    schema_mode = agent_schema_mode()
+    import schema_retrieval
+    if schema_mode == SCHEMA_MODE_CONTEXT:
+        # The schema comes with the question; tools are only for checking the query
+        selection = schema_retrieval.select_schema(natural_language_query)
+        print(selection.summary(), file=sys.stderr)
+        schema_section = f"Tables and columns in the reports database:\n{selection.text}"
+    else:
+        # With SCHEMA_TOP_K set, hand the agent the relevant tables up front
+        selection = schema_retrieval.schema_context(natural_language_query)
+        schema_section = f"Relevant tables and columns in the reports database:\n{selection.text}" if selection else ""
+    # Row counts, time ranges and cardinalities of the selected tables, from
+    # table_stats.json when collected; without a selection the agent looks tables up itself
+    import table_stats
+    statistics = table_stats.prompt_section([tablename for tablename, _ in selection.tables]) if selection else ""
+    schema_tokens = _schema_tokens.get()
+    if selection and schema_tokens is not None:
+        schema_tokens.update(selection.token_counts())
+    # Earlier answers to similar questions, so the agent need not explore the tables again
+    import fewshot_index
+    examples = fewshot_index.prompt_section(natural_language_query)
+    from natural_language_to_sql import request_with_context
+    agent_request = request_with_context(natural_language_query, schema_section, statistics, examples)
+
+    if not clickhouse_mcp().mcp:
+        return None
+    agent = get_sql_agent(schema_mode)
+    max_turns = agent_max_turns(schema_mode)
+    result = await sdk.Runner.run(
+        starting_agent=agent,
+        input=agent_request,
+        **({"max_turns": max_turns} if max_turns else {})
+    )
+    return result.final_output
 
-        # Current date: {datetime.now().strftime("%Y-%m-%d")}.
-        # Please include the timestamp column if present in table and provide SELECT query as it needs to be displayed in grafana dashbaord
 
-        # Respond ONLY with the SQL query, no explanations or additional text."""
+async def agent_sql(query, table_schema, clickhouse_server=None, grafana_server=None):
+    """Agent SQL for a query, or None when the agent hit the turn limit without answering."""
+    try:
+        return await nl_to_sql_with_mcp(query, table_schema, clickhouse_server, grafana_server)
+    except Exception as e:
+        sdk = agents_sdk()
+        if sdk is None or not isinstance(e, sdk.MaxTurnsExceeded):
+            raise
+        print(f"Agent stopped at the turn limit: {e}", file=sys.stderr)
+        return None
 
-        prompt = f"""You are a SQL expert. Write an SQL query that retrieves data for a time-series graph to be displayed in a Grafana dashboard.
-        The query should:
-        1. Include a `timestamp` column for the x-axis of the time-series graph.
-        2. Fetch relevant metrics or values for the y-axis
-        3. Use the database and table schema provided below.
-        4. Limit the results to 1000 rows for performance.
-        5. Use the tool list_databases, list_tables and run_select_query to get the sql query.
-        6. Do not rely on your own knowledge.
-        7. Give the sql query in one line no line break.
-        8. Wait for the tool result if not throw error
-        
 
-        Respond ONLY with the SQL query. Do not include explanations or additional text."""
+# Hedged generation. With HEDGE_DEADLINE_SECONDS set, a request waits at most
+# that long for the agent before answering with the rule engine's SQL, marked
+# provisional. HEDGE_LATE_RESULTS=finish (default) lets the agent complete in
+# the background and hands its answer to the late-result listeners, so caches
+# can be updated; HEDGE_LATE_RESULTS=cancel cancels it instead.
+_late_result_listeners = []
+_background_tasks = set()
 
-        #- Table: {table_name}
-        #Database and Table Schema:
-        #- Database: {database_name}
-        
 
-        #print(prompt)   
-
-        # list_databases.name = "List Database"
-        # list_tables.name = "List tables in reports database"
-        # run_select_query.name = "Run SQL Query in reports database"
-        # Use ClickHouse server if available
-        if mcp:
-            agent = Agent(
-                name="SQL Generator (ClickHouse)",
-                instructions=prompt,
-                #mcp_servers=[mcp],
-                model=DEPLOYMENT_NAME,
-                tools=[list_databases, list_tables, run_select_query]
-                
-            )
-           
-            result = await Runner.run(
-                starting_agent=agent,
-                input=natural_language_query
-            )
-            return result.final_output
-
-        # Use Grafana server if ClickHouse is not available
-        # if grafana_server:
-        #     agent = Agent(
-        #         name="SQL Generator (Grafana)",
-        #         instructions=instructions,
-        #         mcp_servers=[grafana_server]
-        #     )
-        #     result = await Runner.run(
-        #         starting_agent=agent,
-        #         input=natural_language_query
-        #     )
-        #     return result.final_output
-
-    #except Exception as e:
-        #print(f"Error generating SQL with MCP servers: {e}", file=sys.stderr)
-        # Fall back to the non-MCP method
-        #TODO - removed fallback
-        #return nl_to_sql(natural_language_query, table_schema)
-    finally:
-        pass
+def hedge_deadline():
+    """Seconds to wait for the agent before serving rule SQL; 0 disables hedging."""
+    try:
+        return max(0.0, float(os.getenv("HEDGE_DEADLINE_SECONDS") or 0))
+    except ValueError:
+        print("Ignoring invalid HEDGE_DEADLINE_SECONDS", file=sys.stderr)
+        return 0.0
+
+
+def add_late_result_listener(listener):
+    """Call ``listener(query, sql_query)`` when an agent answer arrives after the deadline."""
+    _late_result_listeners.append(listener)
+
+
+def record_agent_answer(query, sql_query):
+    """Store an agent answer as a router training pair when ROUTER_RECORD_PATH is set."""
+    from prompt_router import append_pair
+    record_path = os.getenv("ROUTER_RECORD_PATH")
+    if record_path and sql_query:
+        append_pair(record_path, query, sql_query)
+
+
+def _on_late_result(query, task):
+    _background_tasks.discard(task)
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        print(f"Background agent call failed: {task.exception()}", file=sys.stderr)
+        return
+    sql_query = task.result()
+    if not sql_query:
+        return
+    record_agent_answer(query, sql_query)
+    for listener in list(_late_result_listeners):
+        try:
+            listener(query, sql_query)
+        except Exception as e:
+            print(f"Late result listener failed: {e}", file=sys.stderr)
+
+
+async def hedged_sql_result(query, table_schema, route, deadline, clickhouse_server=None, grafana_server=None):
+    """Race the agent against the rule engine and answer within `deadline` seconds.
+
+    Returns:
+        dict: ``sql``, ``route`` and ``provisional`` (True when the rule SQL was served).
+    """
+    import asyncio
+    from prompt_router import ROUTE_RULES
+    agent_task = asyncio.create_task(agent_sql(query, table_schema, clickhouse_server, grafana_server))
+    rule_sql = rule_based_sql(query, table_schema)
+    if rule_sql.startswith(REFUSAL_PREFIX):
+        # Nothing to hedge with; the agent is the only answer
+        sql_query = await agent_task
+        if not sql_query:
+            return {"sql": rule_sql, "route": dict(route, path=ROUTE_RULES, reason="agent returned no SQL"),
+                    "provisional": True}
+        record_agent_answer(query, sql_query)
+        return {"sql": sql_query, "route": route, "provisional": False}
+
+    done, _ = await asyncio.wait({agent_task}, timeout=deadline)
+    if agent_task in done:
+        if agent_task.exception() is None and agent_task.result():
+            sql_query = agent_task.result()
+            record_agent_answer(query, sql_query)
+            return {"sql": sql_query, "route": route, "provisional": False}
+        reason = f"agent failed: {agent_task.exception()}" if agent_task.exception() else "agent returned no SQL"
+    else:
+        reason = f"agent exceeded {deadline}s deadline"
+        if (os.getenv("HEDGE_LATE_RESULTS") or "finish").lower() == "cancel":
+            agent_task.cancel()
+        else:
+            _background_tasks.add(agent_task)
+            agent_task.add_done_callback(lambda task: _on_late_result(query, task))
+
+    return {"sql": rule_sql, "route": dict(route, path=ROUTE_RULES, reason=reason), "provisional": True}
+
+
+# Generated SQL is cached per normalized prompt and schema fingerprint
+# (RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_MAX_BYTES; size 0
+# disables it). Provisional answers are not cached; the agent's late answer
+# replaces them when it arrives.
+_result_cache_ready = False
+
+
+def get_result_cache():
+    """The NL -> SQL result cache, wired to late agent answers and schema events on first use."""
+    global _result_cache_ready
+    import result_cache
+    cache = result_cache.get_cache()
+    if cache is not None and not _result_cache_ready:
+        _result_cache_ready = True
+        from entity_lexicon import schema_fingerprint
+        from prompt_router import ROUTE_AGENT
+        from schema_watcher import subscribe
+        add_late_result_listener(lambda query, sql_query: cache.put(
+            query, schema_fingerprint(),
+            {"sql": sql_query, "route": {"path": ROUTE_AGENT, "confidence": None, "threshold": None},
+             "provisional": False}))
+        subscribe(result_cache.on_schema_event)
+    return cache
+
+
+async def generate_sql_result(query, table_schema, clickhouse_server=None, grafana_server=None):
+    """Generate SQL for a query, answering repeated questions from the result cache.
+
+    Returns:
+        dict: ``sql``, the ``route`` decision (path, confidence, threshold),
+        ``provisional``, which is True when rule SQL stood in for the agent,
+        and ``cached``, which is True when the answer came from the cache.
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return dict(await route_sql_result(query, table_schema, clickhouse_server, grafana_server), cached=False)
+    from entity_lexicon import schema_fingerprint
+    fingerprint = schema_fingerprint()
+    cached = cache.get(query, fingerprint)
+    if cached is not None:
+        return dict(cached, cached=True)
+    result = await route_sql_result(query, table_schema, clickhouse_server, grafana_server)
+    if result["sql"] and not result["provisional"] and not result["sql"].startswith(REFUSAL_PREFIX):
+        cache.put(query, fingerprint, result)
+    return dict(result, cached=False)
+
+
+async def route_sql_result(query, table_schema, clickhouse_server=None, grafana_server=None):
+    """Generate SQL for a query, routing simple prompts to the rule engine.
+
+    Returns:
+        dict: ``sql``, the ``route`` decision (path, confidence, threshold) and
+        ``provisional``, which is True when rule SQL was served in place of
+        the agent's answer (hedging deadline or agent turn limit).
+    """
+    from prompt_router import ROUTE_RULES, ROUTE_AGENT
+    router = get_prompt_router()
+    if router:
+        route = router.route(query)
+    else:
+        route = {"path": ROUTE_AGENT, "confidence": None, "threshold": None}
+
+    if route["path"] == ROUTE_RULES:
+        sql_query = rule_based_sql(query, table_schema)
+        if not sql_query.startswith(REFUSAL_PREFIX):
+            return {"sql": sql_query, "route": route, "provisional": False}
+        route = dict(route, path=ROUTE_AGENT, reason="rule engine refused")
+
+    deadline = hedge_deadline()
+    if deadline:
+        return await hedged_sql_result(query, table_schema, route, deadline, clickhouse_server, grafana_server)
+
+    sql_query = await agent_sql(query, table_schema, clickhouse_server, grafana_server)
+    if sql_query is None:
+        # Bounded run ended without an answer: serve the rule engine's SQL instead of an error
+        return {"sql": rule_based_sql(query, table_schema),
+                "route": dict(route, path=ROUTE_RULES, reason="agent returned no SQL"), "provisional": True}
+    record_agent_answer(query, sql_query)
+    return {"sql": sql_query, "route": route, "provisional": False}
 
 async def process_query_async(query, table_schema, verbose=False, clickhouse_server=None, grafana_server=None):
     """Process a single query asynchronously and print the result."""
     # Convert natural language to SQL
-    sql_query = await nl_to_sql_with_mcp(query, table_schema, clickhouse_server, grafana_server)
+    result = await generate_sql_result(query, table_schema, clickhouse_server, grafana_server)
+    sql_query = result["sql"]
 
     # Print output
     if verbose:
@@ -264,6 +544,11 @@ async def process_query_async(query, table_schema, verbose=False, clickhouse_ser
 
     # Additional information in verbose mode
     if verbose:
+        print(f"\nRoute: {result['route']['path']} (confidence: {result['route']['confidence']})")
+        if result["cached"]:
+            print("Answered from the result cache")
+        if result["provisional"]:
+            print(f"Provisional rule-based answer: {result['route'].get('reason')}")
         print("\nQuery with current date substituted:")
         one_week_ago = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d")
         print(f"Current date: {datetime.now().strftime('%Y-%m-%d')}")
@@ -284,26 +569,15 @@ async def interactive_mode_async(table_schema, verbose=False, clickhouse_server=
     if grafana_server:
         print(f"Using Grafana MCP server: {grafana_server.name}")
 
-    history = []
-
-    try:
-        while True:
-            print("\n" + "-" * 50)
-            query = input("Enter your natural language query: ")
-
-            # Check for exit commands
-            if query.lower() in ['exit', 'quit', 'q', ':q', ':exit', ':quit']:
-                print("Exiting interactive mode.")
-                break
-
-            # Process the query
-            sql = await process_query_async(query, table_schema, verbose, clickhouse_server, grafana_server)
+    async def run_query(query):
+        result = await generate_sql_result(query, table_schema, clickhouse_server, grafana_server)
+        if verbose:
+            return f"{result['sql']}\nRoute: {result['route']['path']} (confidence: {result['route']['confidence']})"
+        return result["sql"]
 
-            # Store in history
-            history.append((query, sql))
-
-    except KeyboardInterrupt:
-        print("\nInteractive session terminated.")
+    # Prompts run concurrently; each result is printed as soon as it is ready
+    from async_repl import AsyncRepl
+    history = await AsyncRepl(run_query).run()
 
     # Print session summary if there were queries
     if history and verbose:
@@ -321,7 +595,8 @@ async def process_grafana_asynch(grafana_server, sql_query, json_content):
     dashbooard_title = f"B1TD Dashboard {demodashboard}"
     processed_json_content = generate_grafana_json(json_content, dashbooard_title, sql_query)
     print("generate_grafana_json")
-    dashboard = create_dashboard(grafana_server, processed_json_content)
+    # Validated by generate_grafana_json; the client embeds it without parsing it again
+    dashboard = grafana_client().create_dashboard(grafana_server, json_codec.RawJSON(processed_json_content))
     print("create_dashboard")
     if dashboard:
         #print(f"Dashboard created successfully: {da    shboard.title} (UID: {dashboard.uid})")
@@ -352,8 +627,8 @@ def generate_grafana_json(json_content: str, dashboard_title: str, sql_query: st
         
         # Validate the result is valid JSON
         try:
-            json.loads(processed_content)
-        except json.JSONDecodeError as e:
+            json_codec.loads(processed_content)
+        except json_codec.JSONDecodeError as e:
             raise ValueError(f"Template processing resulted in invalid JSON: {str(e)}")
  
         #print("Processed content: ", processed_content)
@@ -369,14 +644,9 @@ def generate_grafana_json(json_content: str, dashboard_title: str, sql_query: st
         sys.exit(1)
 
 
-async def main_async():
-    parser = argparse.ArgumentParser(description='Convert natural language to SQL queries')
-    parser.add_argument('query', nargs='?', help='Natural language query to convert to SQL')
-    parser.add_argument('--schema-file', '-s', help='Path to a file containing the database schema (JSON or DDL)')
-    parser.add_argument('--verbose', '-v', action='store_true', help='Show verbose output')
-    parser.add_argument('--interactive', '-i', action='store_true', help='Run in interactive mode')
-
-    args = parser.parse_args()
+async def main_async(args=None):
+    if args is None:
+        args = build_arg_parser().parse_args()
 
     # Load schema
     if args.schema_file:
@@ -385,8 +655,10 @@ async def main_async():
     #     table_schema = get_threat_data_schema()
 
     # Set up MCP servers
-    clickhouse_server, grafana_server = await setup_mcp_servers()
+    with lazy_imports.timed("set up MCP servers"):
+        clickhouse_server, grafana_server = await setup_mcp_servers()
 
+    started = time.perf_counter()
     try:
         #Interactive mode takes precedence
         if args.interactive or args.query is None:
@@ -405,89 +677,167 @@ async def main_async():
         if grafana_server:
             #await grafana_server.cleanup()
             print("Grafana MCP server cleaned up", file=sys.stderr)
+        lazy_imports.record("run", time.perf_counter() - started)
+        if args.startup_profile:
+            lazy_imports.report()
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description='Convert natural language to SQL queries')
+    parser.add_argument('query', nargs='?', help='Natural language query to convert to SQL')
+    parser.add_argument('--schema-file', '-s', help='Path to a file containing the database schema (JSON or DDL)')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Show verbose output')
+    parser.add_argument('--interactive', '-i', action='store_true', help='Run in interactive mode')
+    parser.add_argument('--startup-profile', action='store_true', help='Print an import and startup time breakdown to stderr')
+    return parser
 
 
 def main():
     """Entry point for the script."""
-    asyncio.run(main_async())
+    args = build_arg_parser().parse_args()
+    load_settings()
+    import asyncio
+    asyncio.run(main_async(args))
 
 
-if __name__ == "__main__":
-    main() 
-
 ###########
 ##Fast API routing for web page and getting natural language query from users
 
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-
-app = FastAPI()
-
-# Allow CORS for testing purposes
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Load schema (you can replace this with your actual schema file path)
-#SCHEMA_FILE = "path/to/your/schema.json"
-#table_schema = load_schema_from_file(SCHEMA_FILE)
-
-# Set up MCP servers (ClickHouse and Grafana)
+# MCP servers (ClickHouse and Grafana) used by the web app
 clickhouse_server, grafana_server = None, None
+schema_watcher = None
+
+
+def start_schema_watcher():
+    """Start the background schema watcher when SCHEMA_WATCH_INTERVAL is set."""
+    global schema_watcher
+    interval = os.getenv("SCHEMA_WATCH_INTERVAL")
+    if not interval or schema_watcher is not None:
+        return schema_watcher
+    from entity_lexicon import DEFAULT_METADATA_FILE
+    from schema_watcher import SchemaWatcher, subscribe
+    subscribe(_invalidate_discovery)
+    databases = [name for name in (os.getenv("SCHEMA_WATCH_DATABASES") or "").split(",") if name]
+    # Refresh the file the lexicon, retriever and fingerprint read (the catalog with SCHEMA_CATALOG_PATH)
+    schema_watcher = SchemaWatcher(databases, json_file_path=DEFAULT_METADATA_FILE, interval=float(interval)).start()
+    print(f"Schema watcher polling every {interval}s", file=sys.stderr)
+    return schema_watcher
+
+
+def _create_app():
+    """Build the FastAPI app; runs on first access to ``main.app``."""
+    from fastapi import FastAPI
+    from fastapi.responses import HTMLResponse, JSONResponse
+    from fastapi.middleware.cors import CORSMiddleware
+    from pydantic import BaseModel
+
+    class CodecJSONResponse(JSONResponse):
+        """JSON responses serialized by json_codec (orjson when installed)."""
+
+        def render(self, content):
+            return json_codec.dumps(content)
+
+    load_settings()
+    app = FastAPI(default_response_class=CodecJSONResponse)
+
+    # Allow CORS for testing purposes
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
+    # Load schema (you can replace this with your actual schema file path)
+    #SCHEMA_FILE = "path/to/your/schema.json"
+    #table_schema = load_schema_from_file(SCHEMA_FILE)
+
+    # Identical prompts arriving together (a team opening the same incident
+    # view) share one generation and one dashboard instead of each running
+    # the agent and creating its own.
+    from async_cache import SingleFlight
+    from result_cache import normalize_prompt
+    prompt_flights = SingleFlight()
+
+    @app.on_event("startup")
+    async def startup_event():
+        """Initialize MCP servers on startup."""
+        global clickhouse_server, grafana_server
+        clickhouse_server, grafana_server = await setup_mcp_servers()
+        start_schema_watcher()
+
+    @app.on_event("shutdown")
+    async def shutdown_event():
+        """Clean up MCP servers on shutdown."""
+        global clickhouse_server, grafana_server
+        if schema_watcher:
+            schema_watcher.stop(timeout=5)
+        if _discovery_cache:
+            print(f"Discovery cache: {_discovery_cache.stats()}", file=sys.stderr)
+        if _result_cache_ready:
+            print(f"Result cache: {get_result_cache().stats()}", file=sys.stderr)
+        print(f"Prompt coalescing: {prompt_flights.stats()}", file=sys.stderr)
+        if "schema_retrieval" in sys.modules:
+            import schema_retrieval
+            print(f"Schema pruning: {schema_retrieval.stats()}", file=sys.stderr)
+        if _openai_client is not None:
+            import llm_gateway
+            print(f"LLM gateway: {llm_gateway.get_gateway().stats()}", file=sys.stderr)
+        if clickhouse_server:
+            print("Cleaning up ClickHouse MCP server...")
+            # await clickhouse_server.cleanup()
+        if grafana_server:
+            print("Cleaning up Grafana MCP server...")
+            # await grafana_server.cleanup()
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize MCP servers on startup."""
-    global clickhouse_server, grafana_server
-    clickhouse_server, grafana_server = await setup_mcp_servers()
-
+    @app.get("/", response_class=HTMLResponse)
+    async def index():
+        """Serve the index page with a form to input the natural language query."""
+        try:
+            with open("index.html", "r") as file:
+                html_content = file.read()
+            return HTMLResponse(content=html_content)
+        except FileNotFoundError:
+            return HTMLResponse(content="<h1>Index page not found</h1>", status_code=404)
+
+    # Define the request body schema
+    class PromptRequest(BaseModel):
+        prompt: str
+
+    async def answer_prompt(prompt):
+        table_schema = ""
+        jsonfile = "json-templates/createdashboarddemo.json"
+        # Filled in when the agent is handed a pruned schema; the hedged agent task shares the dict
+        schema_tokens = {}
+        _schema_tokens.set(schema_tokens)
+        result = await generate_sql_result(prompt, table_schema, clickhouse_server=clickhouse_server, grafana_server=grafana_server)
+        sql_query = result["sql"]
+        print(sql_query)
+        dashboard_url = await process_grafana_asynch(grafana_server, sql_query, jsonfile)
+        return {"status": "success", "query": prompt, "dashboard": dashboard_url, "route": result["route"],
+                "provisional": result["provisional"], "cached": result["cached"],
+                "schema_tokens": schema_tokens or None}
 
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Clean up MCP servers on shutdown."""
-    global clickhouse_server, grafana_server
-    if clickhouse_server:
-        print("Cleaning up ClickHouse MCP server...")
-        # await clickhouse_server.cleanup()
-    if grafana_server:
-        print("Cleaning up Grafana MCP server...")
-        # await grafana_server.cleanup()
+    @app.post("/prompt")
+    async def prompt(request: PromptRequest):
+        """Process the user's natural language query and return the generated SQL."""
+        try:
+            # Extract the prompt from the request
+            prompt = request.prompt
+            print(prompt)
+            # Process the query using the AI agent, joining an identical request already in flight
+            key = normalize_prompt(prompt)
+            coalesced = prompt_flights.in_flight(key)
+            response = await prompt_flights.do(key, lambda: answer_prompt(prompt))
+            return dict(response, query=prompt, coalesced=coalesced)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
 
+    return app
 
-@app.get("/", response_class=HTMLResponse)
-async def index():
-    """Serve the index page with a form to input the natural language query."""
-    try:
-        with open("index.html", "r") as file:
-            html_content = file.read()
-        return HTMLResponse(content=html_content)
-    except FileNotFoundError:
-        return HTMLResponse(content="<h1>Index page not found</h1>", status_code=404)
 
-# Define the request body schema
-class PromptRequest(BaseModel):
-    prompt: str
+lazy_imports.record("import main", time.perf_counter() - _import_started)
 
-@app.post("/prompt")
-async def prompt(request: PromptRequest):
-    """Process the user's natural language query and return the generated SQL."""
-    global clickhouse_server, grafana_server
-    table_schema = ""
-    try:
-        # Extract the prompt from the request
-        prompt = request.prompt
-        print(prompt)
-        # Process the query using the AI agent
-        jsonfile = "json-templates/createdashboarddemo.json"
-        sql_query = await process_query_async(prompt, table_schema, verbose=False, clickhouse_server=clickhouse_server, grafana_server=grafana_server)
-        dashboard_url = await process_grafana_asynch(grafana_server, sql_query, jsonfile)
-        return {"status": "success", "query": prompt, "dashboard": dashboard_url}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,14 @@
 # filepath: mcp_grafana_client.py
 
 import argparse
-import json
 import os
 import sys
 import requests
 from typing import List, Dict, Optional, Any
 import logging
 
+import json_codec
+
 
 class Dashboard:
     def __init__(self, uid: str, title: str, url: str = None, json_data: str = None):
@@ -104,7 +105,7 @@ class MCPGrafanaClient:
             
             data = response.json()
             meta = data.get("meta", {})
-            dashboard_json = json.dumps(data.get("dashboard", {}))
+            dashboard_json = json_codec.dumps_str(data.get("dashboard", {}))
             
             return Dashboard(
                 uid=meta.get("uid", ""),
@@ -121,15 +122,22 @@ class MCPGrafanaClient:
             raise Exception(error_msg)
     
     def create_dashboard(self, json_content: str) -> DashboardCreateResponse:
-        """Create a new dashboard from JSON content"""
+        """Create a new dashboard from JSON content.
+
+        A json_codec.RawJSON is trusted as already validated and is embedded
+        in the request body without being parsed and serialized again.
+        """
         url = f"{self.server_url}/api/dashboards/db"
         
         if self.verbose:
             self.logger.debug(f"POST {url}")
         
         try:
-            # Parse the JSON content
-            dashboard_obj = json.loads(json_content)
+            # Parse the JSON content unless the caller already validated it
+            if isinstance(json_content, json_codec.RawJSON):
+                dashboard_obj = json_content
+            else:
+                dashboard_obj = json_codec.loads(json_content)
             
             # Create the dashboard payload
             payload = {
@@ -137,10 +145,11 @@ class MCPGrafanaClient:
                 "overwrite": True
             }
             
+            # Serialized once here; the headers already declare application/json
             response = requests.post(
                 url,
                 headers=self._get_headers(),
-                json=payload,
+                data=json_codec.dumps(payload),
                 timeout=self.timeout
             )
             response.raise_for_status()
@@ -154,7 +163,7 @@ class MCPGrafanaClient:
                 id=data.get("id", 0)
             )
             
-        except json.JSONDecodeError:
+        except json_codec.JSONDecodeError:
             error_msg = "Invalid dashboard JSON content"
             self.logger.error(error_msg)
             raise Exception(error_msg)
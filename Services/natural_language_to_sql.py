@@ -1,74 +1,54 @@
+import time
+_import_started = time.perf_counter()
+# First, so --startup-profile times every import below
+import lazy_imports
 import os
 import sys
-import json
 import argparse
+import functools
 import re
 from datetime import datetime, timedelta
-import asyncio
-
-# Get the current working directory
-current_dir = os.getcwd()
-path_to_add = os.path.join(current_dir, '../mcp-clickhouse/mcp_server')
-if not os.path.exists(path_to_add):
-    os.makedirs(path_to_add)
- 
-sys.path.append(path_to_add)
- 
-print(path_to_add)
-
-from mcp_clickhouse import create_clickhouse_client, list_databases, list_tables, run_select_query
-
-
-# Add the openai-agents-python/src to the path to properly access the agents module
-sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'openai-agents-python/src'))
-
-try:
-    from agents import Agent, Runner
-    from agents.mcp import MCPServerStdio, MCPServerSse
-    USING_AGENTS_SDK = True
-    print("Successfully imported OpenAI Agents SDK", file=sys.stderr)
-except ImportError as e:
-    print(f"Error importing the OpenAI Agents SDK: {e}", file=sys.stderr)
-    print("Using fallback approach without external dependencies.", file=sys.stderr)
-    USING_AGENTS_SDK = False
+
+import json_codec
+import clickhouse_sql
+import entity_lexicon
+import intent_engine
+import table_stats
+
+
+def agents_sdk():
+    """Return the OpenAI Agents SDK module, or None when it is not installed.
+
+    Its default client is sent through the LLM gateway, so batch prompts are
+    rate limited and queue behind interactive ones.
+    """
+    sdk = lazy_imports.load('agents', optional=True)
+    if sdk is not None:
+        import llm_gateway
+        llm_gateway.install_default_client(sdk, os.getenv("OPENAI_API_KEY"), os.getenv("OPENAI_API_BASE"),
+                                           os.getenv("OPENAI_API_VERSION"))
+    return sdk
+
+
+def __getattr__(name):
+    # USING_AGENTS_SDK is resolved on first access so that importing this
+    # module does not pull in the agents SDK and openai
+    if name == 'USING_AGENTS_SDK':
+        return agents_sdk() is not None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Setup for generation without external dependencies
+DEFAULT_TABLE = "td_agg_threat"
+
 def get_query_intent(query_text):
     """Determine the intent of the natural language query"""
-    query_lower = query_text.lower().strip()
-    
-    # Define patterns to match different intents
-    patterns = {
-        'delete': r'delete|remove|drop|truncate',
-        'insert': r'insert|add|create new|put in',
-        'update': r'update|modify|change|set',
-        'select_count': r'count|how many|number of|total',
-        'select_top': r'top|highest|most|maximum|best',
-        'select_bottom': r'bottom|lowest|least|minimum|worst',
-        'select_avg': r'average|mean|avg',
-        'select_sum': r'sum|total of|add up',
-        'select_recent': r'recent|latest|newest|last|yesterday|this week|this month',
-        'select_time_range': r'between|from.*to|since|last week|last month|last year|previous|ago',
-        'select_group': r'group by|grouped by|categories|categorize|distribution|breakdown',
-        'select_filter': r'where|with|filter|having|specific|only',
-        'select_join': r'join|related|relation|connected|association|link',
-        'select_distinct': r'distinct|unique|different',
-        'describe': r'describe|explain|tell me about|what is|details|schema|columns'
-    }
-    
-    # Check each pattern
-    matched_intents = []
-    for intent, pattern in patterns.items():
-        if re.search(pattern, query_lower):
-            matched_intents.append(intent)
-    
-    # If no intents matched, default to basic select
-    if not matched_intents:
-        return ['select_basic']
-    
-    return matched_intents
+    return intent_engine.classify(query_text)
+
+def classify_many(queries):
+    """Determine the intents of a batch of natural language queries"""
+    return intent_engine.classify_many(queries)
 
-def extract_entities(query_text):
+def extract_entities(query_text, table_name=None):
     """Extract entities like table names, columns, and values from the query"""
     query_lower = query_text.lower()
     
@@ -93,32 +73,8 @@ def extract_entities(query_text):
             time_entities['period'] = 'day'
             time_entities['value'] = int(day_match.group(1))
     
-    # Try to extract columns of interest
-    columns = []
-    important_columns = [
-        'feed_name', 'severity', 'threat_type', 'country', 'region', 
-        'timestamp', 'confidence', 'category', 'count'
-    ]
-    for col in important_columns:
-        if col in query_lower:
-            columns.append(col)
-    
-    # Try to extract specific values or conditions
-    conditions = {}
-    # Check for severity levels
-    severity_match = re.search(r'(high|medium|low)\s+severity', query_lower)
-    if severity_match:
-        conditions['severity'] = severity_match.group(1)
-    
-    # Check for specific feed names
-    feed_match = re.search(r'feed\s+name\s+(?:is|=|equals)\s+[\'"]?([a-zA-Z0-9_\-]+)[\'"]?', query_lower)
-    if feed_match:
-        conditions['feed_name'] = feed_match.group(1)
-    
-    # Check for country mentions
-    country_match = re.search(r'country\s+(?:is|=|equals)\s+[\'"]?([a-zA-Z]+)[\'"]?', query_lower)
-    if country_match:
-        conditions['country'] = country_match.group(1)
+    # Resolve table, columns and LowCardinality values from the schema lexicon
+    lexicon_entities = entity_lexicon.get_lexicon().extract(query_lower, table_name, DEFAULT_TABLE)
     
     # Check for limit
     limit_match = re.search(r'(?:top|limit)\s+(\d+)', query_lower)
@@ -128,189 +84,129 @@ def extract_entities(query_text):
     
     return {
         'time': time_entities,
-        'columns': columns,
-        'conditions': conditions,
+        'table': lexicon_entities['table'],
+        'tables': lexicon_entities['tables'],
+        'columns': lexicon_entities['columns'],
+        'conditions': lexicon_entities['conditions'],
         'limit': limit
     }
 
-def generate_sql_from_intent(intents, entities, table_name="td_agg_threat"):
-    """Generate SQL based on identified intents and entities"""
-    
-    if 'delete' in intents:
-        # Handle DELETE operation
-        if entities['conditions']:
-            conditions = []
-            for col, val in entities['conditions'].items():
-                conditions.append(f"{col} = '{val}'")
-            
-            if entities['time'] and 'period' in entities['time']:
-                period = entities['time']['period']
-                value = entities['time']['value']
-                conditions.append(f"timestamp_day < DATE_SUB(CURRENT_DATE(), INTERVAL {value} {period.upper()})")
-            
-            where_clause = " AND ".join(conditions) if conditions else "1=1"
-            return f"DELETE FROM {table_name} WHERE {where_clause}"
-        else:
-            return f"DELETE FROM {table_name}"
-    
-    elif 'insert' in intents:
-        # Simple insert example
-        return f"""INSERT INTO {table_name} (feed_name, severity, threat_type, timestamp_day)
-VALUES ('example_feed', 'high', 'malware', CURRENT_DATE())"""
-    
-    elif 'update' in intents:
-        # Handle UPDATE operation
-        set_clause = "SET "
-        if entities['conditions']:
-            set_parts = []
-            for col, val in entities['conditions'].items():
-                set_parts.append(f"{col} = '{val}'")
-            set_clause += ", ".join(set_parts)
-        else:
-            set_clause += "column_name = 'new_value'"
-        
-        where_clause = "WHERE 1=1"
-        if entities['time'] and 'period' in entities['time']:
-            period = entities['time']['period']
-            value = entities['time']['value']
-            where_clause = f"WHERE timestamp_day >= DATE_SUB(CURRENT_DATE(), INTERVAL {value} {period.upper()})"
-        
-        return f"UPDATE {table_name}\n{set_clause}\n{where_clause}"
-    
-    # Handle various SELECT operations
-    select_clause = "SELECT "
-    
-    # Determine columns to select
-    if 'select_count' in intents:
-        select_clause += "COUNT(*) AS threat_count"
-        if entities['columns']:
-            select_clause += ",\n    " + ",\n    ".join(entities['columns'])
-    elif 'select_distinct' in intents:
-        if entities['columns']:
-            select_clause += "DISTINCT " + ", ".join(entities['columns'])
-        else:
-            select_clause += "DISTINCT feed_name, severity"
-    elif 'select_avg' in intents:
-        if 'count' in entities['columns']:
-            select_clause += "AVG(count) AS average_count"
-        elif 'bandwidth' in entities['columns']:
-            select_clause += "AVG(bandwidth) AS average_bandwidth"
-        else:
-            select_clause += "AVG(count) AS average_count"
-    elif 'select_sum' in intents:
-        if 'count' in entities['columns']:
-            select_clause += "SUM(count) AS total_count"
-        elif 'bandwidth' in entities['columns']:
-            select_clause += "SUM(bandwidth_total) AS total_bandwidth"
-        else:
-            select_clause += "SUM(count) AS total_count"
-    elif entities['columns']:
-        select_clause += ", ".join(entities['columns'])
-    else:
-        select_clause += "*"
-    
-    from_clause = f"\nFROM {table_name}"
-    
-    # Determine WHERE clause
-    where_conditions = []
-    if 'select_time_range' in intents or 'select_recent' in intents:
-        if entities['time'] and 'period' in entities['time']:
-            period = entities['time']['period']
-            value = entities['time']['value']
-            where_conditions.append(f"timestamp_day >= DATE_SUB(CURRENT_DATE(), INTERVAL {value} {period.upper()})")
-    
-    if entities['conditions']:
-        for col, val in entities['conditions'].items():
-            where_conditions.append(f"{col} = '{val}'")
-    
-    where_clause = ""
-    if where_conditions:
-        where_clause = "\nWHERE " + " AND ".join(where_conditions)
-    
-    # Determine GROUP BY
-    group_by = ""
-    if 'select_group' in intents:
-        if entities['columns']:
-            group_by = "\nGROUP BY " + ", ".join(entities['columns'])
-        else:
-            # Default grouping
-            group_by = "\nGROUP BY feed_name, severity"
-    
-    # Determine ORDER BY
-    order_by = ""
-    if 'select_top' in intents:
-        order_metric = "count" if 'count' in entities['columns'] else "count"
-        order_by = f"\nORDER BY {order_metric} DESC"
-    elif 'select_bottom' in intents:
-        order_metric = "count" if 'count' in entities['columns'] else "count"
-        order_by = f"\nORDER BY {order_metric} ASC"
-    elif 'select_recent' in intents:
-        order_by = "\nORDER BY timestamp_day DESC"
-    
-    # Add LIMIT
-    limit_clause = f"\nLIMIT {entities['limit']}"
-    
-    # Put it all together
-    sql = select_clause + from_clause + where_clause + group_by + order_by + limit_clause
-    
-    return sql
+def generate_sql_from_intent(intents, entities, table_name="td_agg_threat", column_types=None):
+    """Generate ClickHouse SQL based on identified intents and entities"""
+    if column_types is None:
+        # Column types drive aggregate handling; unknown tables get generic SQL
+        column_types = entity_lexicon.column_types(table_name)
+    # Row counts and time ranges from table_stats.json pick time windows and buckets
+    stats = table_stats.get_table_stats(table_name)
+    return clickhouse_sql.build_query(intents, entities, table_name, column_types, stats)
 
 def generate_better_sql_example(query, schema):
     """Generate a more intelligent SQL example based on the query and schema."""
-    # Get query intents and entities
-    intents = get_query_intent(query)
-    entities = extract_entities(query)
-    
     # Extract the table name from the schema if possible
-    table_name = "td_agg_threat"  # Default
+    schema_table = None
+    schema_columns = {}
     if "CREATE TABLE" in schema:
         match = re.search(r'CREATE TABLE\s+(\w+)', schema)
         if match:
-            table_name = match.group(1)
+            schema_table = match.group(1)
+        # Column types of the tables the schema defines, which may be missing from table_metadata.json
+        import schema_render
+        schema_columns = dict(schema_render.parse_ddl(schema) or ())
+    
+    # Get query intents and entities
+    intents = get_query_intent(query)
+    entities = extract_entities(query, schema_table)
+    table_name = entities['table'] or DEFAULT_TABLE
+    column_types = dict(schema_columns[table_name]) if table_name in schema_columns else None
     
     # Generate SQL based on intents and entities
-    return generate_sql_from_intent(intents, entities, table_name)
+    return generate_sql_from_intent(intents, entities, table_name, column_types)
 
-# Try to import the OpenAI Agents library
-try:
-    # Check if the agents module is available at the expected location
-    agent_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
-                                  'openai-agents-python/src/agents/__init__.py')
-    
-    if os.path.exists(agent_file_path):
-        from agents import Agent
-        USING_REAL_AGENT = True
-        print("Successfully imported OpenAI Agents library.", file=sys.stderr)
-    else:
-        raise ImportError(f"Agent file not found at {agent_file_path}")
-        
-except ImportError as e:
-    print(f"Error importing the OpenAI Agents Python library: {e}", file=sys.stderr)
-    print("Using enhanced fallback approach.", file=sys.stderr)
-    USING_REAL_AGENT = False
-    
-    # Define a mock Agent class that will be used if import fails
-    class MockAgent:
-        def __init__(self, system_prompt=None):
-            self.system_prompt = system_prompt
-            
-        def run(self, query):
-            # Create a simple object with a content attribute
-            class Result:
-                def __init__(self, content):
-                    self.content = content
-            
-            # Extract the schema from the system_prompt
-            try:
-                schema = self.system_prompt.split("Database Schema:")[1].split("Current date:")[0].strip()
-            except:
-                schema = ""
-            
-            # Generate better SQL using our enhanced logic
-            return Result(generate_better_sql_example(query, schema))
+# The legacy checkout vendors the agents library next to this file; without
+# it nl_to_sql answers with the rule-based generator through MockAgent
+AGENT_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'openai-agents-python/src/agents/__init__.py')
+USING_REAL_AGENT = os.path.exists(AGENT_FILE_PATH)
+
+
+class MockAgent:
+    def __init__(self, system_prompt=None):
+        self.system_prompt = system_prompt
+
+    def run(self, query):
+        # Create a simple object with a content attribute
+        class Result:
+            def __init__(self, content):
+                self.content = content
+
+        # Extract the schema from the system_prompt
+        try:
+            schema = self.system_prompt.split("Database Schema:")[1].split("Respond ONLY")[0].strip()
+        except:
+            schema = ""
+
+        # Generate better SQL using our enhanced logic
+        return Result(generate_better_sql_example(question_of(query), schema))
+
+
+def get_agent_class():
+    """Return the vendored Agent class, or MockAgent when it is not present."""
+    if USING_REAL_AGENT:
+        sdk = agents_sdk()
+        if sdk is not None:
+            return sdk.Agent
+    return MockAgent
+
+# The system prompt depends only on the schema; per-request data such as the
+# current date goes into the request (request_with_context), so one agent per
+# schema is shared and its prompt prefix stays byte-identical across requests.
+SYSTEM_PROMPT_TEMPLATE = """You are a SQL expert. Given the following database schema, write a SQL query that answers the user's question.
+
+Database Schema:
+{schema}
+
+Respond ONLY with the SQL query, no explanations or additional text."""
+
+# Stands in for the schema when the relevant tables are pruned per question
+SCHEMA_WITH_QUESTION = "The tables relevant to each question are listed with the question."
+
+
+@functools.lru_cache(maxsize=64)
+def system_prompt(table_schema):
+    """The system prompt for a schema, formatted once."""
+    return SYSTEM_PROMPT_TEMPLATE.format(schema=table_schema)
+
+
+def request_with_context(query, *sections):
+    """Agent input: the current date and any per-request sections, then the question."""
+    parts = [f"Current date: {datetime.now().strftime('%Y-%m-%d')}"]
+    parts.extend(section.strip() for section in sections if section)
+    parts.append(f"Question: {query}")
+    return "\n\n".join(parts)
+
+
+def question_of(request):
+    """The question of an input built by request_with_context (any other text is returned as is)."""
+    if request.startswith("Current date: "):
+        return request.rpartition("\n\nQuestion: ")[2]
+    return request
+
+
+@functools.lru_cache(maxsize=32)
+def get_sql_agent(table_schema):
+    """The agent for a schema, built once and shared across requests."""
+    return get_agent_class()(system_prompt=system_prompt(table_schema))
+
+
+@functools.lru_cache(maxsize=32)
+def get_mcp_agent(schema_text, mcp_server):
+    """The agents SDK agent for a schema and MCP server, built once and shared across requests."""
+    return agents_sdk().Agent(
+        name="SQL Generator",
+        instructions=system_prompt(schema_text),
+        mcp_servers=[mcp_server]
+    )
 
-    # Create a mock Agent for fallback
-    Agent = MockAgent
 
 def nl_to_sql(natural_language_query, table_schema):
     """
@@ -323,27 +219,12 @@ def nl_to_sql(natural_language_query, table_schema):
     Returns:
         str: The generated SQL query.
     """
-    # Get current date for context
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    
-    # Create a system prompt that includes the schema and task
-    system_prompt = f"""You are a SQL expert. Given the following database schema, write a SQL query that answers the user's question.
-
-Database Schema:
-{table_schema}
-
-Current date: {current_date}
-
-Respond ONLY with the SQL query, no explanations or additional text."""
-
-    # Create an agent
+    # Shared agent for this schema; the current date travels with the request
     try:
-        agent = Agent(
-            system_prompt=system_prompt,
-        )
+        agent = get_sql_agent(table_schema)
         
         # Generate the SQL query
-        result = agent.run(natural_language_query)
+        result = agent.run(request_with_context(natural_language_query))
         sql_query = result.content
         
         # Check if we got a default response and try fallback if needed
@@ -366,8 +247,8 @@ def convert_schema_json_to_ddl(schema_json):
         # Parse the JSON schema if it's a string
         if isinstance(schema_json, str):
             try:
-                schema_data = json.loads(schema_json)
-            except json.JSONDecodeError:
+                schema_data = json_codec.loads(schema_json)
+            except json_codec.JSONDecodeError:
                 # If not valid JSON, return it as is (assuming it's already DDL)
                 return schema_json
         else:
@@ -396,47 +277,48 @@ def convert_schema_json_to_ddl(schema_json):
         print(f"Error converting schema JSON to DDL: {e}", file=sys.stderr)
         return str(schema_json)  # Return the original as a fallback
 
+THREAT_DATA_SCHEMA = {
+    "tablename": "td_agg_threat",
+    "schema": [
+        {"columnname": "storage_id", "columntype": "UInt32"},
+        {"columnname": "timestamp_day", "columntype": "DateTime"},
+        {"columnname": "type", "columntype": "FixedString(1)"},
+        {"columnname": "policy_action", "columntype": "LowCardinality(String)"},
+        {"columnname": "tclass", "columntype": "String"},
+        {"columnname": "tproperty", "columntype": "String"},
+        {"columnname": "tfamily", "columntype": "String"},
+        {"columnname": "severity", "columntype": "LowCardinality(String)"},
+        {"columnname": "confidence", "columntype": "LowCardinality(String)"},
+        {"columnname": "category", "columntype": "LowCardinality(String)"},
+        {"columnname": "threat_type", "columntype": "String"},
+        {"columnname": "threat_technique", "columntype": "String"},
+        {"columnname": "threat_classification", "columntype": "String"},
+        {"columnname": "feed_name", "columntype": "LowCardinality(String)"},
+        {"columnname": "response_region", "columntype": "String"},
+        {"columnname": "response_country", "columntype": "String"},
+        {"columnname": "device_region", "columntype": "String"},
+        {"columnname": "device_country", "columntype": "String"},
+        {"columnname": "threat_indicator", "columntype": "String"},
+        {"columnname": "asset_cq_id", "columntype": "String"},
+        {"columnname": "qip", "columntype": "String"},
+        {"columnname": "device_type", "columntype": "String"},
+        {"columnname": "actor_id", "columntype": "String"},
+        {"columnname": "actor_name", "columntype": "String"},
+        {"columnname": "policy_name", "columntype": "String"},
+        {"columnname": "network", "columntype": "String"},
+        {"columnname": "bandwidth", "columntype": "Float32"},
+        {"columnname": "bandwidth_total", "columntype": "SimpleAggregateFunction(sum, Float64)"},
+        {"columnname": "count", "columntype": "SimpleAggregateFunction(sum, UInt64)"},
+        {"columnname": "min_timestamp", "columntype": "SimpleAggregateFunction(min, DateTime)"},
+        {"columnname": "max_timestamp", "columntype": "SimpleAggregateFunction(max, DateTime)"}
+    ]
+}
+
+@functools.lru_cache(maxsize=None)
 def get_threat_data_schema():
-    """Return the schema for the td_agg_threat table."""
-    schema_json = {
-        "tablename": "td_agg_threat",
-        "schema": [
-            {"columnname": "storage_id", "columntype": "UInt32"},
-            {"columnname": "timestamp_day", "columntype": "DateTime"},
-            {"columnname": "type", "columntype": "FixedString(1)"},
-            {"columnname": "policy_action", "columntype": "LowCardinality(String)"},
-            {"columnname": "tclass", "columntype": "String"},
-            {"columnname": "tproperty", "columntype": "String"},
-            {"columnname": "tfamily", "columntype": "String"},
-            {"columnname": "severity", "columntype": "LowCardinality(String)"},
-            {"columnname": "confidence", "columntype": "LowCardinality(String)"},
-            {"columnname": "category", "columntype": "LowCardinality(String)"},
-            {"columnname": "threat_type", "columntype": "String"},
-            {"columnname": "threat_technique", "columntype": "String"},
-            {"columnname": "threat_classification", "columntype": "String"},
-            {"columnname": "feed_name", "columntype": "LowCardinality(String)"},
-            {"columnname": "response_region", "columntype": "String"},
-            {"columnname": "response_country", "columntype": "String"},
-            {"columnname": "device_region", "columntype": "String"},
-            {"columnname": "device_country", "columntype": "String"},
-            {"columnname": "threat_indicator", "columntype": "String"},
-            {"columnname": "asset_cq_id", "columntype": "String"},
-            {"columnname": "qip", "columntype": "String"},
-            {"columnname": "device_type", "columntype": "String"},
-            {"columnname": "actor_id", "columntype": "String"},
-            {"columnname": "actor_name", "columntype": "String"},
-            {"columnname": "policy_name", "columntype": "String"},
-            {"columnname": "network", "columntype": "String"},
-            {"columnname": "bandwidth", "columntype": "Float32"},
-            {"columnname": "bandwidth_total", "columntype": "SimpleAggregateFunction(sum, Float64)"},
-            {"columnname": "count", "columntype": "SimpleAggregateFunction(sum, UInt64)"},
-            {"columnname": "min_timestamp", "columntype": "SimpleAggregateFunction(min, DateTime)"},
-            {"columnname": "max_timestamp", "columntype": "SimpleAggregateFunction(max, DateTime)"}
-        ]
-    }
-    
+    """Return the schema for the td_agg_threat table (rendered once per process)."""
     # Convert to DDL for better LLM understanding
-    return convert_schema_json_to_ddl(schema_json)
+    return convert_schema_json_to_ddl(THREAT_DATA_SCHEMA)
 
 def load_schema_from_file(schema_file):
     """Load database schema from a file."""
@@ -445,9 +327,9 @@ def load_schema_from_file(schema_file):
             content = f.read()
             # Try to parse as JSON first
             try:
-                json_schema = json.loads(content)
+                json_schema = json_codec.loads(content)
                 return convert_schema_json_to_ddl(json_schema)
-            except json.JSONDecodeError:
+            except json_codec.JSONDecodeError:
                 # If not valid JSON, return as is (assuming it's already DDL)
                 return content
     except Exception as e:
@@ -529,7 +411,7 @@ async def setup_mcp_server():
         # )
         
         # Connect to the server
-        mcp_server = create_clickhouse_client()
+        mcp_server = lazy_imports.load('mcp_clickhouse').create_clickhouse_client()
         print("MCP server called>>>>", mcp_server)
         await mcp_server.connect()
         print(f"Connected to MCP server: {mcp_server.name}", file=sys.stderr)
@@ -545,32 +427,36 @@ async def setup_mcp_server():
 
 async def nl_to_sql_with_mcp(natural_language_query, table_schema, mcp_server=None):
     """Convert natural language to SQL using MCP server (if available)."""
-    if not mcp_server or not USING_AGENTS_SDK:
+    sdk = agents_sdk() if mcp_server else None
+    if sdk is None:
         # Fall back to the standard method if MCP server is not available
         return nl_to_sql(natural_language_query, table_schema)
         
     try:
-        # Create a system prompt that includes the schema and task
-        instructions = f"""You are a SQL expert. Given the following database schema, write a SQL query that answers the user's question.
-
-Database Schema:
-{table_schema}
-
-Current date: {datetime.now().strftime("%Y-%m-%d")}
-
-Respond ONLY with the SQL query, no explanations or additional text."""
-
-        # Create an agent with the MCP server
-        agent = Agent(
-            name="SQL Generator",
-            instructions=instructions,
-            mcp_servers=[mcp_server]
-        )
+        # Only the tables relevant to the query when schema pruning is enabled
+        import schema_render
+        import schema_retrieval
+        selection = schema_retrieval.schema_context(natural_language_query)
+        if selection:
+            # The pruned schema differs per question, so it goes into the request
+            table_schema = selection.ddl
+            schema_text = SCHEMA_WITH_QUESTION
+            schema_section = f"Database Schema:\n{selection.text}"
+        else:
+            schema_text = schema_render.for_prompt(table_schema)
+            schema_section = ""
+        tables = schema_render.parse_ddl(table_schema) if isinstance(table_schema, str) else None
+        statistics = table_stats.prompt_section([tablename for tablename, _ in tables or ()])
+        import fewshot_index
+        examples = fewshot_index.prompt_section(natural_language_query)
+
+        # Shared agent for this schema and MCP server
+        agent = get_mcp_agent(schema_text, mcp_server)
         
-        # Run the agent with the natural language query
-        result = await Runner.run(
+        # Run the agent with the natural language query and its per-request context
+        result = await sdk.Runner.run(
             starting_agent=agent,
-            input=natural_language_query
+            input=request_with_context(natural_language_query, schema_section, statistics, examples)
         )
         
         # Return the generated SQL
@@ -612,27 +498,13 @@ async def interactive_mode_async(table_schema, verbose=False, mcp_server=None):
     if mcp_server:
         print(f"Using MCP server: {mcp_server.name}")
     
-    history = []
-    
-    try:
-        while True:
-            print("\n" + "-" * 50)
-            query = input("Enter your natural language query: ")
-            
-            # Check for exit commands
-            if query.lower() in ['exit', 'quit', 'q', ':q', ':exit', ':quit']:
-                print("Exiting interactive mode.")
-                break
-            
-            # Process the query
-            sql = await process_query_async(query, table_schema, verbose, mcp_server)
-            
-            # Store in history
-            history.append((query, sql))
-            
-    except KeyboardInterrupt:
-        print("\nInteractive session terminated.")
-    
+    async def run_query(query):
+        return await nl_to_sql_with_mcp(query, table_schema, mcp_server)
+
+    # Prompts run concurrently; each result is printed as soon as it is ready
+    from async_repl import AsyncRepl
+    history = await AsyncRepl(run_query).run()
+
     # Print session summary if there were queries
     if history and verbose:
         print("\nSession Summary:")
@@ -642,30 +514,123 @@ async def interactive_mode_async(table_schema, verbose=False, mcp_server=None):
     
     return history
 
-async def main_async():
+def parse_batch_line(line, line_number):
+    """Turn one batch input line (JSON object or plain text) into a request dict."""
+    line = line.strip()
+    if line.startswith("{"):
+        record = json_codec.loads(line)
+        prompt = record.get("prompt") or record.get("query") or ""
+        return {"id": record.get("id", line_number), "prompt": prompt}
+    return {"id": line_number, "prompt": line}
+
+async def batch_mode_async(batch_file, table_schema, mcp_server=None, concurrency=8, output=None):
+    """Stream JSONL prompts in and write one JSONL result per prompt as it finishes.
+
+    Args:
+        batch_file (str): Path to the input file, or '-' for stdin.
+        table_schema (str): The database schema information to provide context.
+        mcp_server: Optional MCP server passed to nl_to_sql_with_mcp.
+        concurrency (int): Maximum number of prompts in flight at once.
+        output: Writable text stream for results (defaults to stdout).
+
+    Returns:
+        dict: Counts of processed and failed prompts.
+    """
+    import asyncio
+    import llm_gateway
+    output = output or sys.stdout
+    concurrency = max(1, concurrency)
+    # Bounded so that neither the input nor the results are held in memory
+    queue = asyncio.Queue(maxsize=concurrency)
+    stats = {"processed": 0, "failed": 0}
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                line_number, line = item
+                result = {"id": line_number, "prompt": None, "sql": None, "intent": None, "error": None}
+                started = time.perf_counter()
+                try:
+                    request = parse_batch_line(line, line_number)
+                    result.update(request)
+                    result["intent"] = get_query_intent(request["prompt"])
+                    result["sql"] = await nl_to_sql_with_mcp(request["prompt"], table_schema, mcp_server)
+                except Exception as e:
+                    result["error"] = f"{type(e).__name__}: {e}"
+                    stats["failed"] += 1
+                result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                stats["processed"] += 1
+                output.write(json_codec.dumps_str(result) + "\n")
+                output.flush()
+            finally:
+                queue.task_done()
+
+    # Workers inherit the batch priority: their LLM calls queue behind interactive ones
+    with llm_gateway.priority(llm_gateway.PRIORITY_BATCH):
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    infile = sys.stdin if batch_file == "-" else open(batch_file, "r")
+    try:
+        line_number = 0
+        while True:
+            # Read off the event loop so in-flight prompts keep running
+            line = await asyncio.to_thread(infile.readline)
+            if not line:
+                break
+            line_number += 1
+            if line.strip():
+                await queue.put((line_number, line))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        if infile is not sys.stdin:
+            infile.close()
+
+    print(f"Batch complete: {stats['processed']} prompts, {stats['failed']} failed", file=sys.stderr)
+    return stats
+
+def build_arg_parser():
     parser = argparse.ArgumentParser(description='Convert natural language to SQL queries')
     parser.add_argument('query', nargs='?', help='Natural language query to convert to SQL')
     parser.add_argument('--schema-file', '-s', help='Path to a file containing the database schema (JSON or DDL)')
     parser.add_argument('--verbose', '-v', action='store_true', help='Show verbose output')
     parser.add_argument('--interactive', '-i', action='store_true', help='Run in interactive mode')
     parser.add_argument('--use-mcp', '-m', action='store_true', help='Use MCP server for SQL generation')
-    
-    args = parser.parse_args()
+    parser.add_argument('--batch', '-b', metavar='FILE', help="Stream JSONL prompts from FILE ('-' for stdin) and write JSONL results to stdout")
+    parser.add_argument('--concurrency', '-c', type=int, default=8, help='Maximum prompts in flight in batch mode')
+    parser.add_argument('--startup-profile', action='store_true', help='Print an import and startup time breakdown to stderr')
+    return parser
+
+def load_table_schema(args):
+    with lazy_imports.timed("load schema"):
+        if args.schema_file:
+            return load_schema_from_file(args.schema_file)
+        return get_threat_data_schema()
+
+async def main_async(args=None):
+    if args is None:
+        args = build_arg_parser().parse_args()
     
     # Load schema
-    if args.schema_file:
-        table_schema = load_schema_from_file(args.schema_file)
-    else:
-        table_schema = get_threat_data_schema()
+    table_schema = load_table_schema(args)
     
     # Set up MCP server if requested
     mcp_server = None
-    if args.use_mcp and USING_AGENTS_SDK:
-        mcp_server = await setup_mcp_server()
+    if args.use_mcp and agents_sdk() is not None:
+        with lazy_imports.timed("set up MCP server"):
+            mcp_server = await setup_mcp_server()
     
+    started = time.perf_counter()
     try:
-        # Interactive mode takes precedence
-        if args.interactive or args.query is None:
+        # Batch mode takes precedence, then interactive mode
+        if args.batch:
+            await batch_mode_async(args.batch, table_schema, mcp_server, args.concurrency)
+        elif args.interactive or args.query is None:
             await interactive_mode_async(table_schema, args.verbose, mcp_server)
         else:
             # Single query mode
@@ -675,10 +640,25 @@ async def main_async():
         if mcp_server:
             await mcp_server.cleanup()
             print("MCP server cleaned up", file=sys.stderr)
+        lazy_imports.record("run", time.perf_counter() - started)
+        if args.startup_profile:
+            lazy_imports.report()
+
+lazy_imports.record("import natural_language_to_sql", time.perf_counter() - _import_started)
 
 def main():
     """Entry point for the script."""
-    asyncio.run(main_async())
+    args = build_arg_parser().parse_args()
+    if args.query and not (args.use_mcp or args.batch or args.interactive):
+        # A single fallback query needs no event loop, so skip importing asyncio
+        table_schema = load_table_schema(args)
+        with lazy_imports.timed("run"):
+            process_query(args.query, table_schema, args.verbose)
+        if args.startup_profile:
+            lazy_imports.report()
+        return
+    import asyncio
+    asyncio.run(main_async(args))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
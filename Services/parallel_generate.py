@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Run the rule-based SQL generator over large prompt corpora on every core.
+
+Input is sharded into chunks that are handed to a ProcessPoolExecutor;
+each worker builds the compiled intent/entity tables once in its
+initializer, and results stream back chunk by chunk in input order with
+a bounded number of chunks in flight.
+
+    python parallel_generate.py questions.jsonl --workers 8 --output results.jsonl
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import json_codec
+
+_worker_schema = ""
+
+
+def _init_worker(schema):
+    """Load the generator and its compiled tables once per worker process."""
+    global _worker_schema
+    import entity_lexicon
+    import natural_language_to_sql  # noqa: F401  (builds the intent engine)
+    entity_lexicon.get_lexicon()
+    _worker_schema = schema
+
+
+def _generate_chunk(queries):
+    from natural_language_to_sql import generate_better_sql_example
+    results = []
+    for query in queries:
+        try:
+            results.append((generate_better_sql_example(query, _worker_schema), None))
+        except Exception as e:
+            results.append((None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def generate_parallel(queries, schema="", workers=None, chunksize=256, max_pending=None):
+    """Yield (query, sql, error) for every query, in input order.
+
+    Args:
+        queries (iterable): Natural language prompts; consumed lazily.
+        schema (str): Schema text passed to generate_better_sql_example.
+        workers (int): Worker processes, default os.cpu_count(). 0 runs in-process.
+        chunksize (int): Prompts per task sent to a worker.
+        max_pending (int): Chunks in flight, default 2 per worker.
+    """
+    if workers == 0:
+        _init_worker(schema)
+        for chunk in _chunks(queries, chunksize):
+            for query, (sql, error) in zip(chunk, _generate_chunk(chunk)):
+                yield query, sql, error
+        return
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(schema,)) as executor:
+        pending = deque()
+        for chunk in _chunks(queries, chunksize):
+            pending.append((chunk, executor.submit(_generate_chunk, chunk)))
+            if len(pending) >= max_pending:
+                done_chunk, future = pending.popleft()
+                for query, (sql, error) in zip(done_chunk, future.result()):
+                    yield query, sql, error
+        while pending:
+            done_chunk, future = pending.popleft()
+            for query, (sql, error) in zip(done_chunk, future.result()):
+                yield query, sql, error
+
+
+def read_prompts(path):
+    """Yield prompts from a text or JSONL file ('-' for stdin)."""
+    infile = sys.stdin if path == "-" else open(path, "r")
+    try:
+        for line in infile:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json_codec.loads(line)
+                yield record.get("prompt") or record.get("query") or ""
+            else:
+                yield line
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate SQL for a prompt corpus with the rule-based generator on all cores')
+    parser.add_argument('input', help="Text or JSONL file of prompts ('-' for stdin)")
+    parser.add_argument('--output', '-o', help='JSONL output file (default stdout)')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Worker processes (default: CPU count, 0: in-process)')
+    parser.add_argument('--chunksize', type=int, default=256, help='Prompts per worker task')
+    parser.add_argument('--schema-file', '-s', help='Schema file passed to the generator (JSON or DDL)')
+    args = parser.parse_args()
+
+    schema = ""
+    if args.schema_file:
+        from natural_language_to_sql import load_schema_from_file
+        schema = load_schema_from_file(args.schema_file)
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    started = time.perf_counter()
+    count = 0
+    try:
+        for index, (query, sql, error) in enumerate(
+                generate_parallel(read_prompts(args.input), schema, args.workers, args.chunksize), 1):
+            output.write(json_codec.dumps_str({"id": index, "prompt": query, "sql": sql, "error": error}) + "\n")
+            count = index
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - started
+    print(f"Generated {count} queries in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.1f} queries/s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
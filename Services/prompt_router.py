@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Learned router that decides whether a prompt can skip the LLM agent.
+
+A logistic regression over hashed character/word n-grams (NumPy only,
+CPU) scores how likely the rule-based generator produces the same query
+shape the agent would. Prompts scoring above the threshold go to the rule
+engine; everything else goes to the agent.
+
+Train from recorded prompt/SQL pairs (JSONL with ``prompt`` and ``sql``,
+optionally ``route`` set to ``rules`` or ``agent`` to force a label):
+
+    python prompt_router.py train pairs.jsonl --output router_model.npz
+    python prompt_router.py score "count of high severity threats last week"
+"""
+import argparse
+import os
+import re
+import sys
+
+import numpy as np
+
+import json_codec
+import text_features
+
+DEFAULT_MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'router_model.npz')
+DEFAULT_THRESHOLD = 0.9
+
+ROUTE_RULES = 'rules'
+ROUTE_AGENT = 'agent'
+
+_FROM_RE = re.compile(r'\b(?:from|join)\s+([\w.`"]+)')
+_FUNCTION_RE = re.compile(r'\b([a-z_][a-z0-9_]*)\s*\(')
+_PREDICATE_RE = re.compile(r'\b([a-z_][a-z0-9_]*)\s*(?:=|!=|<>|>=|<=|<|>|\bin\b|\blike\b)')
+_GROUP_RE = re.compile(r'\bgroup\s+by\s+(.+?)(?:\border\b|\blimit\b|\bhaving\b|$)')
+
+
+def sql_signature(sql):
+    """Reduce a query to its shape: tables, functions, filtered and grouped columns."""
+    text = text_features.normalize_text(sql or '').rstrip(';')
+    group = _GROUP_RE.search(text)
+    return (
+        frozenset(name.strip('`"').split('.')[-1] for name in _FROM_RE.findall(text)),
+        frozenset(_FUNCTION_RE.findall(text)),
+        frozenset(_PREDICATE_RE.findall(text)),
+        frozenset(part.strip() for part in group.group(1).split(',')) if group else frozenset(),
+    )
+
+
+def label_pairs(pairs, rule_sql):
+    """Label each recorded pair 1 when the rule engine reproduces its shape.
+
+    Args:
+        pairs (iterable): dicts with ``prompt``, ``sql`` and optional ``route``.
+        rule_sql (callable): prompt -> SQL from the rule-based generator.
+
+    Returns:
+        tuple: (prompts, labels) lists.
+    """
+    prompts = []
+    labels = []
+    for pair in pairs:
+        prompt = pair.get('prompt')
+        if not prompt:
+            continue
+        route = pair.get('route')
+        if route in (ROUTE_RULES, ROUTE_AGENT):
+            label = 1 if route == ROUTE_RULES else 0
+        else:
+            label = int(sql_signature(rule_sql(prompt)) == sql_signature(pair.get('sql')))
+        prompts.append(prompt)
+        labels.append(label)
+    return prompts, labels
+
+
+class PromptRouter:
+    """Logistic regression over hashed n-gram features."""
+
+    def __init__(self, weights, bias=0.0, threshold=DEFAULT_THRESHOLD):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.threshold = threshold
+        self.dim = len(self.weights)
+
+    @classmethod
+    def train(cls, prompts, labels, dim=text_features.DEFAULT_DIM, epochs=300,
+              learning_rate=2.0, l2=1e-4, threshold=DEFAULT_THRESHOLD):
+        """Fit with full-batch gradient descent on the sparse feature matrix."""
+        indptr, indices, values = text_features.hashed_matrix(prompts, dim)
+        y = np.asarray(labels, dtype=np.float32)
+        n = len(y)
+        if n == 0:
+            raise ValueError("No training examples")
+        rows = np.repeat(np.arange(n), np.diff(indptr))
+        weights = np.zeros(dim, dtype=np.float32)
+        # Start from the class prior so an unbalanced corpus converges quickly.
+        prior = min(max(y.mean(), 1e-3), 1 - 1e-3)
+        bias = float(np.log(prior / (1 - prior)))
+        for _ in range(epochs):
+            logits = np.bincount(rows, weights=weights[indices] * values, minlength=n) + bias
+            error = (1.0 / (1.0 + np.exp(-logits)) - y) / n
+            gradient = np.bincount(indices, weights=error[rows] * values, minlength=dim)
+            weights -= learning_rate * (gradient + l2 * weights).astype(np.float32)
+            bias -= learning_rate * float(error.sum())
+        return cls(weights, bias, threshold)
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_FILE, threshold=None):
+        with np.load(path) as data:
+            router = cls(data['weights'], float(data['bias']), float(data['threshold']))
+        if threshold is not None:
+            router.threshold = threshold
+        return router
+
+    def save(self, path=DEFAULT_MODEL_FILE):
+        with open(path, 'wb') as file:
+            np.savez_compressed(file, weights=self.weights, bias=self.bias, threshold=self.threshold)
+
+    def score(self, prompt):
+        """Probability that the rule engine handles the prompt."""
+        indices, values = text_features.hashed_features(prompt, self.dim)
+        logit = float(np.dot(self.weights[indices], values)) + self.bias
+        return float(1.0 / (1.0 + np.exp(-logit)))
+
+    def route(self, prompt):
+        """Return the routing decision for a prompt."""
+        confidence = self.score(prompt)
+        return {
+            'path': ROUTE_RULES if confidence >= self.threshold else ROUTE_AGENT,
+            'confidence': round(confidence, 4),
+            'threshold': self.threshold,
+        }
+
+
+def load_router(path=None, threshold=None):
+    """Load the router named by ROUTER_MODEL_PATH, or None when no model is available."""
+    path = path or os.getenv("ROUTER_MODEL_PATH") or DEFAULT_MODEL_FILE
+    if threshold is None and os.getenv("ROUTER_THRESHOLD"):
+        threshold = float(os.getenv("ROUTER_THRESHOLD"))
+    if not os.path.exists(path):
+        return None
+    try:
+        return PromptRouter.load(path, threshold)
+    except Exception as e:
+        print(f"Error loading prompt router from {path}: {e}", file=sys.stderr)
+        return None
+
+
+def read_pairs(path):
+    """Yield recorded pairs from a JSONL file."""
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield json_codec.loads(line)
+
+
+def append_pair(path, prompt, sql, **extra):
+    """Record a prompt/SQL pair for later training."""
+    record = {'prompt': prompt, 'sql': sql}
+    record.update(extra)
+    with open(path, 'a') as file:
+        file.write(json_codec.dumps_str(record) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train or query the prompt router')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help='Train from recorded prompt/SQL pairs')
+    train_parser.add_argument('pairs', help='JSONL file with prompt and sql fields')
+    train_parser.add_argument('--output', '-o', default=DEFAULT_MODEL_FILE, help='Where to write the model')
+    train_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='Confidence needed to use the rule engine')
+    train_parser.add_argument('--epochs', type=int, default=300)
+
+    score_parser = subparsers.add_parser('score', help='Score prompts with a trained model')
+    score_parser.add_argument('prompts', nargs='+')
+    score_parser.add_argument('--model', default=DEFAULT_MODEL_FILE)
+
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        from natural_language_to_sql import generate_better_sql_example
+        prompts, labels = label_pairs(read_pairs(args.pairs), lambda prompt: generate_better_sql_example(prompt, ""))
+        router = PromptRouter.train(prompts, labels, epochs=args.epochs, threshold=args.threshold)
+        router.save(args.output)
+        routed = sum(router.score(p) >= router.threshold for p in prompts)
+        print(f"Trained on {len(prompts)} pairs ({sum(labels)} rule-answerable); "
+              f"{routed} would route to the rule engine at threshold {router.threshold}")
+    else:
+        router = PromptRouter.load(args.model)
+        for prompt in args.prompts:
+            print(json_codec.dumps_str({'prompt': prompt, **router.route(prompt)}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Cache of generated SQL keyed on the normalized prompt and schema fingerprint.
+
+Prompts that differ only in case, whitespace or trailing punctuation share
+an entry, and relative time phrases are folded into symbolic intervals
+("last week", "past week" and "previous 1 week" all become ``{1 week}``)
+so they hit the same entry. Cached SQL for such prompts must stay correct
+on later days: date literals in it are rewritten relative to ``today()``,
+and SQL that still pins a point in time is kept only until midnight.
+Dates the prompt itself names are absolute and left alone.
+
+Entries are evicted least recently used first when the entry count or
+the approximate memory bound is exceeded, and expire after a TTL. The
+schema fingerprint in the key retires entries when the schema changes;
+schema_watcher events also drop entries that mention a changed table.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+DEFAULT_SIZE = 1024
+DEFAULT_TTL = 3600.0
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+# Rough per-entry overhead of the key tuple, the entry and the dict slots
+_ENTRY_OVERHEAD = 400
+
+_NUMBER_WORDS = {'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+                 'seven': 7, 'ten': 10, 'twelve': 12, 'thirty': 30}
+_UNIT = r'(minute|hour|day|week|month|quarter|year)s?'
+_INTERVAL_PATTERNS = (
+    # last week, past 7 days, previous two months, in the last 24 hours
+    (re.compile(rf'\b(?:in the |over the |for the |during the )?(?:last|past|previous|prior)\s+(?:(\d+|{"|".join(_NUMBER_WORDS)})\s+)?{_UNIT}\b'),
+     lambda match: f"{{{_count(match.group(1))} {match.group(2)}}}"),
+    # 3 days ago, a week ago
+    (re.compile(rf'\b(\d+|{"|".join(_NUMBER_WORDS)})\s+{_UNIT}\s+ago\b'),
+     lambda match: f"{{{_count(match.group(1))} {match.group(2)} ago}}"),
+    (re.compile(r'\b(today|yesterday|this (?:week|month|quarter|year))\b'), lambda match: f"{{{match.group(1)}}}"),
+)
+_PUNCTUATION_RE = re.compile(r'[\s?.!;,]+$')
+_DATE_LITERAL_RE = re.compile(r"'(\d{4}-\d{2}-\d{2})'")
+_PROMPT_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_DATETIME_LITERAL_RE = re.compile(r"'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}")
+
+
+def _count(text):
+    if not text:
+        return 1
+    return int(text) if text.isdigit() else _NUMBER_WORDS[text]
+
+
+def normalize_prompt(prompt):
+    """Cache key text: lowercase, single spaces, relative time phrases as symbolic intervals."""
+    text = " ".join(prompt.lower().split())
+    text = _PUNCTUATION_RE.sub("", text)
+    for pattern, replace in _INTERVAL_PATTERNS:
+        text = pattern.sub(replace, text)
+    return text
+
+
+def relative_sql(sql_query, today=None, keep=()):
+    """Rewrite date literals (other than those in `keep`) as ``today() - N``.
+
+    Returns:
+        tuple: (sql, pinned) where pinned is True when the SQL still names a
+        point in time (a DateTime literal) and is only valid today.
+    """
+    today = today or date.today()
+
+    def replace(match):
+        if match.group(1) in keep:
+            return match.group(0)
+        days = (today - date.fromisoformat(match.group(1))).days
+        if days < 0 or days > 3660:
+            return match.group(0)
+        return "today()" if days == 0 else f"(today() - {days})"
+
+    sql_query = _DATE_LITERAL_RE.sub(replace, sql_query)
+    return sql_query, bool(_DATETIME_LITERAL_RE.search(sql_query))
+
+
+class ResultCache:
+    """LRU + TTL cache of generation results with a memory bound and hit-rate metrics.
+
+    Args:
+        max_entries (int): Most entries kept.
+        ttl (float): Seconds an entry is served.
+        max_bytes (int): Approximate memory bound for keys and SQL text.
+    """
+
+    def __init__(self, max_entries=DEFAULT_SIZE, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(prompt, fingerprint):
+        return (normalize_prompt(prompt), fingerprint or "")
+
+    def get(self, prompt, fingerprint):
+        """Return the cached result dict for a prompt, or None."""
+        key = self.key(prompt, fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, prompt, fingerprint, result):
+        """Store a result dict (``sql`` plus metadata); its SQL is made date-independent first."""
+        key = self.key(prompt, fingerprint)
+        sql_query, pinned = result["sql"], False
+        if "{" in key[0]:
+            # A relative time phrase: the SQL must not be tied to the day it was generated
+            sql_query, pinned = relative_sql(sql_query, keep=set(_PROMPT_DATE_RE.findall(prompt)))
+        result = dict(result, sql=sql_query)
+        expires = time.time() + self.ttl
+        if pinned:
+            midnight = datetime.combine(date.today() + timedelta(days=1), datetime.min.time())
+            expires = min(expires, midnight.timestamp())
+        size = len(key[0]) + len(key[1]) + len(sql_query) + _ENTRY_OVERHEAD
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires, result, size)
+            self.bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        self.bytes -= self._entries.pop(key)[2]
+
+    def invalidate_tables(self, tablenames):
+        """Drop entries whose SQL mentions any of the tables; returns how many were dropped."""
+        names = [name.rpartition(".")[2] for name in tablenames]
+        if not names:
+            return 0
+        pattern = re.compile(r'\b(?:' + "|".join(re.escape(name) for name in names) + r')\b')
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if pattern.search(entry[1]["sql"])]
+            for key in stale:
+                self._remove(key)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Hit rate and size metrics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions,
+                    "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+_cache = None
+_cache_created = False
+
+
+def get_cache():
+    """The process-wide cache from RESULT_CACHE_SIZE / _TTL / _MAX_BYTES; None when RESULT_CACHE_SIZE=0."""
+    global _cache, _cache_created
+    if not _cache_created:
+        _cache_created = True
+        try:
+            size = int(os.getenv("RESULT_CACHE_SIZE") or DEFAULT_SIZE)
+            ttl = float(os.getenv("RESULT_CACHE_TTL") or DEFAULT_TTL)
+            max_bytes = int(os.getenv("RESULT_CACHE_MAX_BYTES") or DEFAULT_MAX_BYTES)
+        except ValueError:
+            print("Ignoring invalid RESULT_CACHE_* settings", file=sys.stderr)
+            size, ttl, max_bytes = DEFAULT_SIZE, DEFAULT_TTL, DEFAULT_MAX_BYTES
+        if size > 0:
+            _cache = ResultCache(size, ttl, max_bytes)
+    return _cache
+
+
+def on_schema_event(event):
+    """schema_watcher listener: drop answers that use a changed or removed table."""
+    if _cache is not None:
+        dropped = _cache.invalidate_tables(event.changed + event.removed)
+        if dropped:
+            print(f"Result cache: dropped {dropped} answers after a schema change", file=sys.stderr)
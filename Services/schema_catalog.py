@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""SQLite-backed schema catalog for clusters with thousands of tables.
+
+Offers the same lookups as jsonschema.SchemaRegistry, but keeps the
+schema on disk in an indexed SQLite file and loads a table's columns only
+when a request asks for it (with a small LRU of recently used tables), so
+start-up memory and lookup time stay flat as the catalog grows.
+jsonschema.get_registry picks this backend for .sqlite/.sqlite3/.db paths.
+
+    python schema_catalog.py import table_metadata.json -o schema_catalog.sqlite
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from types import MappingProxyType
+
+import json_codec
+
+CATALOG_EXTENSIONS = ('.sqlite', '.sqlite3', '.db')
+CHECK_INTERVAL = 1.0
+CACHE_SIZE = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS catalog_tables (
+    id INTEGER PRIMARY KEY,
+    tablename TEXT NOT NULL UNIQUE,
+    database TEXT NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS catalog_columns (
+    table_id INTEGER NOT NULL REFERENCES catalog_tables(id),
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    PRIMARY KEY (table_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS catalog_tables_database ON catalog_tables(database, name);
+CREATE INDEX IF NOT EXISTS catalog_columns_name ON catalog_columns(name);
+CREATE INDEX IF NOT EXISTS catalog_columns_type ON catalog_columns(type);
+"""
+
+
+def is_catalog_path(path):
+    return str(path).lower().endswith(CATALOG_EXTENSIONS)
+
+
+def import_metadata(metadata, db_path):
+    """Replace the catalog at `db_path` with a table_metadata.json style dict.
+
+    Returns:
+        str: The fingerprint of the imported schema.
+    """
+    content = json_codec.dumps(metadata, sort_keys=True)
+    fingerprint = hashlib.sha256(content).hexdigest()
+    connection = sqlite3.connect(db_path)
+    try:
+        with connection:
+            connection.executescript(SCHEMA)
+            connection.execute("DELETE FROM catalog_columns")
+            connection.execute("DELETE FROM catalog_tables")
+            for table in metadata.get("tables", []):
+                tablename = table.get("tablename")
+                if not tablename:
+                    continue
+                database, _, name = tablename.rpartition(".")
+                cursor = connection.execute(
+                    "INSERT INTO catalog_tables (tablename, database, name) VALUES (?, ?, ?)",
+                    (tablename, database, name))
+                connection.executemany(
+                    "INSERT INTO catalog_columns (table_id, position, name, type) VALUES (?, ?, ?, ?)",
+                    [(cursor.lastrowid, position, column.get("columnname"), column.get("columntype", "String"))
+                     for position, column in enumerate(table.get("schema", []), 1)])
+            connection.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('fingerprint', ?)",
+                               (fingerprint,))
+    finally:
+        connection.close()
+    return fingerprint
+
+
+def import_json(json_file_path, db_path):
+    """Build or refresh a catalog from a table_metadata.json snapshot."""
+    with open(json_file_path, "rb") as file:
+        return import_metadata(json_codec.loads(file.read()), db_path)
+
+
+class _LazyTables(Mapping):
+    """Read-only tablename -> entry mapping that loads entries on access."""
+
+    def __init__(self, catalog):
+        self._catalog = catalog
+
+    def __getitem__(self, tablename):
+        table = self._catalog.get_table(tablename)
+        if table is None:
+            raise KeyError(tablename)
+        return table
+
+    def __iter__(self):
+        rows = self._catalog._query("SELECT tablename FROM catalog_tables ORDER BY id")
+        return (row[0] for row in rows)
+
+    def __len__(self):
+        return self._catalog._query("SELECT count(*) FROM catalog_tables")[0][0]
+
+    def __contains__(self, tablename):
+        return bool(self._catalog._query("SELECT 1 FROM catalog_tables WHERE tablename = ?", (tablename,)))
+
+
+class SchemaCatalog:
+    """SQLite catalog with the jsonschema.SchemaRegistry lookup API."""
+
+    def __init__(self, db_path, check_interval=CHECK_INTERVAL, cache_size=CACHE_SIZE):
+        if not os.path.exists(db_path):
+            raise FileNotFoundError(db_path)
+        self.json_file_path = db_path
+        self.check_interval = check_interval
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._stat = None
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self.refresh(force=True)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"file:{self.json_file_path}?mode=ro", uri=True)
+            self._local.connection = connection
+        return connection
+
+    def _query(self, sql, parameters=()):
+        return self._connection().execute(sql, parameters).fetchall()
+
+    def _check(self):
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.refresh()
+
+    def refresh(self, force=False):
+        """Drop cached tables if the catalog was re-imported; return True when it changed."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            stat = os.stat(self.json_file_path)
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+            if not force and stat_key == self._stat:
+                return False
+            self._stat = stat_key
+            rows = self._query("SELECT value FROM catalog_meta WHERE key = 'fingerprint'")
+            fingerprint = rows[0][0] if rows else ""
+            if fingerprint == self._fingerprint:
+                return False
+            self._fingerprint = fingerprint
+            self._cache.clear()
+            return True
+
+    @property
+    def fingerprint(self):
+        self._check()
+        return self._fingerprint
+
+    @property
+    def tables(self):
+        """Read-only mapping of tablename -> {"tablename", "schema"}, loaded lazily."""
+        self._check()
+        return _LazyTables(self)
+
+    def column_rows(self):
+        """Yield (tablename, columnname, columntype) for every column in import order.
+
+        One joined query over the (table_id, position) key, read row by
+        row: a pass over the whole catalog builds no table entries and
+        leaves the LRU alone. A table without columns yields one row with
+        None for both.
+        """
+        self._check()
+        yield from self._connection().execute(
+            "SELECT t.tablename, c.name, c.type FROM catalog_tables t "
+            "LEFT JOIN catalog_columns c ON c.table_id = t.id ORDER BY t.id, c.position")
+
+    def get_table(self, tablename):
+        """Return the read-only entry for a table, or None."""
+        self._check()
+        with self._lock:
+            table = self._cache.get(tablename)
+            if table is not None:
+                self._cache.move_to_end(tablename)
+                return table
+        rows = self._query(
+            "SELECT c.name, c.type FROM catalog_tables t JOIN catalog_columns c ON c.table_id = t.id "
+            "WHERE t.tablename = ? ORDER BY c.position", (tablename,))
+        if not rows and not self._query("SELECT 1 FROM catalog_tables WHERE tablename = ?", (tablename,)):
+            return None
+        schema = tuple(MappingProxyType({"columnname": name, "columntype": columntype}) for name, columntype in rows)
+        table = MappingProxyType({"tablename": tablename, "schema": schema})
+        with self._lock:
+            self._cache[tablename] = table
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return table
+
+    def columns(self, tablename):
+        """Return a read-only {columnname: columntype} mapping for a table, or None."""
+        table = self.get_table(tablename)
+        if table is None:
+            return None
+        return MappingProxyType({column["columnname"]: column["columntype"] for column in table["schema"]})
+
+    def tables_with_column(self, columnname):
+        """Return the names of the tables that have a column, in import order."""
+        self._check()
+        return tuple(row[0] for row in self._query(
+            "SELECT t.tablename FROM catalog_columns c JOIN catalog_tables t ON t.id = c.table_id "
+            "WHERE c.name = ? ORDER BY t.id", (columnname,)))
+
+    def columns_of_type(self, columntype):
+        """Return (tablename, columnname) pairs whose column has exactly this type."""
+        self._check()
+        return tuple(self._query(
+            "SELECT t.tablename, c.name FROM catalog_columns c JOIN catalog_tables t ON t.id = c.table_id "
+            "WHERE c.type = ? ORDER BY t.id, c.position", (columntype,)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the SQLite schema catalog')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='Import a table_metadata.json snapshot')
+    import_parser.add_argument('json_file', help='table_metadata.json style file')
+    import_parser.add_argument('--output', '-o', default='schema_catalog.sqlite', help='Catalog file to write')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        fingerprint = import_json(args.json_file, args.output)
+        print(f"Imported {args.json_file} into {args.output} (fingerprint {fingerprint[:12]})", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Schema text for prompts: full DDL or a compact, token-efficient form.
+
+Rendered text is memoized per table and column list, so a request never
+re-renders a table that an earlier request already produced; prompts carry
+per-request subsets of tables, which reuse those renders.
+
+The compact form puts one table per line and groups columns by type:
+
+    td_agg_threat: DateTime timestamp_day | LC(String) severity,confidence | sum(UInt64) count
+
+with ``LC(T)`` = LowCardinality(T), ``T?`` = Nullable(T), ``f(T)`` =
+SimpleAggregateFunction(f, T) and ``fState(T)`` = AggregateFunction(f, T).
+"""
+import os
+import re
+from functools import lru_cache
+
+FORMAT_FULL = "full"
+FORMAT_COMPACT = "compact"
+
+# Legend entries (full type pattern, explanation); a compact render only
+# carries the entries for the types it contains
+_LEGEND = (
+    (re.compile(r'LowCardinality\('), "LC(T)=LowCardinality(T)"),
+    (re.compile(r'Nullable\('), "T?=Nullable(T)"),
+    (re.compile(r'SimpleAggregateFunction\('), "f(T)=SimpleAggregateFunction(f,T), aggregate with f()"),
+    (re.compile(r'(?<!Simple)AggregateFunction\('), "fState(T)=AggregateFunction(f,T), read with fMerge()"),
+)
+
+_DDL_TABLE_RE = re.compile(r'CREATE TABLE\s+([\w.]+)\s*\((.*?)\n\)', re.S)
+
+
+def prompt_format():
+    """Schema format for agent prompts, from SCHEMA_FORMAT (full or compact)."""
+    return FORMAT_COMPACT if (os.getenv("SCHEMA_FORMAT") or "").lower() == FORMAT_COMPACT else FORMAT_FULL
+
+
+def _split_arguments(text):
+    depth, start, parts = 0, 0, []
+    for index, char in enumerate(text):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(text[start:index].strip())
+            start = index + 1
+    parts.append(text[start:].strip())
+    return parts
+
+
+@lru_cache(maxsize=1024)
+def abbreviate_type(columntype):
+    """Short spelling of a ClickHouse type for the compact format."""
+    name, _, rest = columntype.partition('(')
+    if not rest:
+        return columntype
+    arguments = _split_arguments(rest[:-1])
+    if name == 'LowCardinality':
+        return f"LC({abbreviate_type(arguments[0])})"
+    if name == 'Nullable':
+        return f"{abbreviate_type(arguments[0])}?"
+    if name == 'SimpleAggregateFunction' and len(arguments) == 2:
+        return f"{arguments[0]}({abbreviate_type(arguments[1])})"
+    if name == 'AggregateFunction' and len(arguments) >= 2:
+        return f"{arguments[0]}State({','.join(abbreviate_type(a) for a in arguments[1:])})"
+    if name == 'DateTime64':
+        return 'DateTime64'
+    return f"{name}({','.join(abbreviate_type(a) for a in arguments)})"
+
+
+@lru_cache(maxsize=4096)
+def render_table(tablename, columns, schema_format=FORMAT_FULL):
+    """Render one table; `columns` is a tuple of (columnname, columntype) pairs."""
+    if schema_format == FORMAT_COMPACT:
+        groups = {}
+        for columnname, columntype in columns:
+            groups.setdefault(abbreviate_type(columntype), []).append(columnname)
+        return f"{tablename}: " + " | ".join(f"{columntype} {','.join(names)}" for columntype, names in groups.items())
+    definitions = ",\n".join(f"    {columnname} {columntype}" for columnname, columntype in columns)
+    return f"CREATE TABLE {tablename} (\n{definitions}\n)"
+
+
+def compact_legend(tables):
+    """One-line legend for the abbreviations used by the compact render of `tables`."""
+    types = " ".join({columntype for _, columns in tables for _, columntype in columns})
+    entries = [text for pattern, text in _LEGEND if pattern.search(types)]
+    return "-- table: type cols | ..." + (f"; {', '.join(entries)}" if entries else "")
+
+
+def render(tables, schema_format=FORMAT_FULL):
+    """Render (tablename, columns) pairs; compact output starts with a one-line legend."""
+    rendered = [render_table(tablename, tuple(columns), schema_format) for tablename, columns in tables]
+    if schema_format == FORMAT_COMPACT:
+        return "\n".join([compact_legend(tables)] + rendered)
+    return "\n\n".join(rendered)
+
+
+@lru_cache(maxsize=256)
+def parse_ddl(ddl):
+    """Return the (tablename, columns) pairs of DDL in the format rendered here, or None."""
+    tables = []
+    for tablename, body in _DDL_TABLE_RE.findall(ddl):
+        columns = []
+        for line in body.split(",\n"):
+            columnname, _, columntype = line.strip().partition(' ')
+            if not columnname or not columntype:
+                return None
+            columns.append((columnname, columntype.strip()))
+        tables.append((tablename, tuple(columns)))
+    return tuple(tables) or None
+
+
+@lru_cache(maxsize=256)
+def _for_prompt(table_schema, schema_format):
+    tables = parse_ddl(table_schema)
+    if tables is None:
+        return table_schema
+    return render(tables, schema_format)
+
+
+def for_prompt(table_schema, schema_format=None):
+    """Re-render DDL text in the prompt format; text that is not DDL is returned unchanged."""
+    schema_format = schema_format or prompt_format()
+    if schema_format == FORMAT_FULL or not isinstance(table_schema, str):
+        return table_schema
+    return _for_prompt(table_schema, schema_format)
+
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""Local BM25 retrieval that prunes the schema handed to the LLM.
+
+Table names, table contents (column names) and single columns are
+indexed as BM25 documents, each expanded with domain synonyms. A prompt
+is scored against them with NumPy, the top-k tables are kept and each
+keeps only its matching columns plus its time and aggregate columns.
+The selection reports the estimated prompt tokens it saved compared with
+sending the whole schema.
+
+    python schema_retrieval.py "top 5 feeds by threat count last week" --top-tables 3
+"""
+import argparse
+import math
+import os
+import re
+import sys
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+
+import jsonschema
+import schema_render
+from entity_lexicon import DEFAULT_METADATA_FILE
+
+DEFAULT_TOP_TABLES = 3
+DEFAULT_TOP_COLUMNS = 12
+
+_TERM_RE = re.compile(r'[a-z0-9]+')
+
+# Domain vocabulary for abbreviated column and table names
+SYNONYMS = {
+    'qip': ['ip', 'client', 'address', 'source'],
+    'rip': ['ip', 'resolved', 'response', 'address'],
+    'qname': ['domain', 'query', 'name', 'hostname'],
+    'qtype': ['query', 'type', 'record'],
+    'rcode': ['response', 'code', 'nxdomain'],
+    'sld': ['domain', 'second', 'level'],
+    'dns': ['domain', 'query', 'resolution'],
+    'rpz': ['response', 'policy', 'zone', 'block'],
+    'tclass': ['threat', 'class'],
+    'tproperty': ['threat', 'property'],
+    'tfamily': ['threat', 'family', 'malware'],
+    'threat': ['attack', 'malicious', 'detection', 'ioc'],
+    'indicator': ['ioc', 'domain', 'ip'],
+    'feed': ['source', 'intel', 'intelligence'],
+    'severity': ['critical', 'high', 'medium', 'low', 'risk'],
+    'confidence': ['certainty', 'likelihood'],
+    'actor': ['attacker', 'group', 'apt'],
+    'device': ['host', 'client', 'endpoint', 'machine'],
+    'asset': ['device', 'host', 'endpoint', 'inventory'],
+    'os': ['operating', 'system', 'platform'],
+    'bandwidth': ['traffic', 'bytes', 'volume'],
+    'count': ['number', 'many', 'total', 'hits'],
+    'timestamp': ['time', 'date', 'day', 'when', 'recent'],
+    'day': ['date', 'daily'],
+    'country': ['geo', 'location', 'nation'],
+    'region': ['geo', 'location'],
+    'policy': ['rule', 'blocked', 'allowed'],
+    'action': ['blocked', 'allowed', 'logged'],
+    'webcontent': ['web', 'content', 'category', 'url'],
+    'app': ['application'],
+    'mac': ['hardware', 'address'],
+    'agg': ['aggregated', 'summary'],
+    'raw': ['event', 'log'],
+}
+
+
+def _normalize(term):
+    if term.endswith('ies') and len(term) > 4:
+        return term[:-3] + 'y'
+    if term.endswith('s') and len(term) > 3 and not term.endswith('ss'):
+        return term[:-1]
+    return term
+
+
+def terms(text):
+    """Lowercased, plural-folded word terms of `text` (identifiers split on '_')."""
+    return [_normalize(term) for term in _TERM_RE.findall(text.lower())]
+
+
+def expand(words):
+    """Add the synonyms of every term."""
+    expanded = list(words)
+    for word in words:
+        expanded.extend(_normalize(synonym) for synonym in SYNONYMS.get(word, ()))
+    return expanded
+
+
+# tiktoken encoding, resolved on first use; False when tiktoken is not installed
+_encoding = None
+
+
+def estimate_tokens(text):
+    """Estimate LLM prompt tokens; uses tiktoken when installed, else ~4 characters per token."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except ImportError:
+            _encoding = False
+    if not _encoding:
+        return math.ceil(len(text) / 4)
+    return len(_encoding.encode(text))
+
+
+class BM25Index:
+    """Okapi BM25 over token lists, stored as flat posting arrays.
+
+    Each posting carries its precomputed BM25 weight, so scoring a query
+    is a single ``np.bincount`` over the postings of its terms, no matter
+    how many documents the index holds.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.size = len(documents)
+        self.vocabulary = {}
+        doc_ids, term_ids = [], []
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for doc_id, document in enumerate(documents):
+            lengths[doc_id] = len(document)
+            for term in document:
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                doc_ids.append(doc_id)
+        if not term_ids:
+            self._offsets = np.zeros(1, dtype=np.int64)
+            self._docs = np.zeros(0, dtype=np.int64)
+            self._weights = np.zeros(0, dtype=np.float32)
+            return
+
+        # Unique (term, doc) pairs with their term frequency, grouped by term
+        pairs = np.array(term_ids, dtype=np.int64) * self.size + np.array(doc_ids, dtype=np.int64)
+        pairs, tf = np.unique(pairs, return_counts=True)
+        terms_of_pair = pairs // self.size
+        docs = pairs % self.size
+        df = np.bincount(terms_of_pair, minlength=len(self.vocabulary))
+        idf = np.log(1 + (self.size - df + 0.5) / (df + 0.5))
+        average = lengths.mean() or 1.0
+        norm = k1 * (1 - b + b * lengths[docs] / average)
+        self._weights = (idf[terms_of_pair] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+        self._docs = docs
+        self._offsets = np.concatenate(([0], np.cumsum(df)))
+
+    def scores(self, query_terms):
+        """BM25 score of every document for the query terms."""
+        ids = {self.vocabulary[term] for term in query_terms if term in self.vocabulary}
+        if not ids:
+            return np.zeros(self.size, dtype=np.float32)
+        slices = [np.arange(self._offsets[i], self._offsets[i + 1]) for i in ids]
+        postings = np.concatenate(slices)
+        return np.bincount(self._docs[postings], weights=self._weights[postings], minlength=self.size)
+
+
+class SchemaSelection:
+    """Tables and columns chosen for one prompt, with the token accounting."""
+
+    def __init__(self, tables, full_tokens, schema_format=None):
+        self.tables = tables
+        self.ddl = schema_render.render(tables, schema_render.FORMAT_FULL)
+        # What goes into the prompt: the DDL, or the compact form with SCHEMA_FORMAT=compact
+        self.text = schema_render.render(tables, schema_format or schema_render.prompt_format())
+        self.prompt_tokens = estimate_tokens(self.text)
+        self.full_tokens = full_tokens
+        self.tokens_saved = max(0, full_tokens - self.prompt_tokens)
+
+    def token_counts(self):
+        """Token accounting as a JSON-ready dict."""
+        return {"tables": len(self.tables), "prompt_tokens": self.prompt_tokens,
+                "full_tokens": self.full_tokens, "tokens_saved": self.tokens_saved}
+
+    def summary(self):
+        return (f"Schema pruning: {len(self.tables)} tables, ~{self.prompt_tokens} prompt tokens "
+                f"instead of ~{self.full_tokens} (saved ~{self.tokens_saved})")
+
+
+class SchemaRetriever:
+    """BM25 indexes over the table names, table contents and columns of a schema.
+
+    Table names and column contents are scored as separate fields and
+    summed, so a name match is not drowned out by wide tables. Synonyms
+    expand the documents only; the prompt is matched as written.
+
+    Args:
+        rows (iterable): (tablename, columnname, columntype) grouped by table,
+            as yielded by the registry's ``column_rows``.
+        columns_of (callable): tablename -> {columnname: columntype}; the
+            types of the selected tables are looked up through it, so only
+            column names are kept for the whole schema.
+    """
+
+    def __init__(self, rows, columns_of):
+        self.columns_of = columns_of
+        # (tablename, column names, positions of the always kept columns)
+        self.tables = []
+        self.full_tokens = 0
+        name_documents, content_documents, column_documents = [], [], []
+        for tablename, group in groupby(rows, key=itemgetter(0)):
+            columns = tuple((columnname, columntype) for _, columnname, columntype in group if columnname is not None)
+            name_documents.append(expand(terms(tablename)))
+            content_documents.append(expand([term for columnname, _ in columns for term in terms(columnname)]))
+            column_documents.extend(expand(terms(columnname)) for columnname, _ in columns)
+            always = frozenset(i for i, (_, columntype) in enumerate(columns) if self._always_kept(columntype))
+            self.tables.append((tablename, tuple(sys.intern(columnname) for columnname, _ in columns), always))
+            # Summed per table; render_table's cache is left to the prompt renders
+            self.full_tokens += estimate_tokens(schema_render.render_table.__wrapped__(tablename, columns))
+        self.name_index = BM25Index(name_documents)
+        self.content_index = BM25Index(content_documents)
+        self.column_index = BM25Index(column_documents)
+        self._column_offsets = np.cumsum([0] + [len(names) for _, names, _ in self.tables])
+
+    @staticmethod
+    def _always_kept(columntype):
+        # Time and pre-aggregated columns are what most generated queries need
+        return columntype.startswith(('Date', 'DateTime', 'SimpleAggregateFunction', 'AggregateFunction'))
+
+    def select(self, prompt, top_tables=DEFAULT_TOP_TABLES, top_columns=DEFAULT_TOP_COLUMNS):
+        """Return the SchemaSelection for a prompt."""
+        query_terms = terms(prompt)
+        table_scores = self.name_index.scores(query_terms) + self.content_index.scores(query_terms)
+        column_scores = self.column_index.scores(query_terms)
+        ranking = np.argsort(-table_scores, kind='stable')[:top_tables]
+
+        selected = []
+        for table_id in ranking:
+            tablename, names, always = self.tables[table_id]
+            offset = self._column_offsets[table_id]
+            scores = column_scores[offset:offset + len(names)]
+            matching = {int(i) for i in np.argsort(-scores, kind='stable')[:top_columns] if scores[i] > 0}
+            types = self.columns_of(tablename) or {}
+            columns = [(columnname, types.get(columnname, 'String')) for columnname in names]
+            kept = [column for i, column in enumerate(columns) if i in matching or i in always]
+            selected.append((tablename, kept or columns[:top_columns]))
+        return SchemaSelection(selected, self.full_tokens)
+
+
+_retrievers = {}
+# Token accounting summed over the selections made in this process
+_totals = {"selections": 0, "prompt_tokens": 0, "full_tokens": 0, "tokens_saved": 0}
+
+
+def get_retriever(json_file_path=DEFAULT_METADATA_FILE):
+    """Return the retriever for a metadata file, rebuilt when the schema changes."""
+    registry = jsonschema.get_registry(json_file_path)
+    fingerprint = registry.fingerprint
+    cached = _retrievers.get(json_file_path)
+    if cached is None or cached[0] != fingerprint:
+        cached = (fingerprint, SchemaRetriever(registry.column_rows(), registry.columns))
+        _retrievers[json_file_path] = cached
+    return cached[1]
+
+
+def select_schema(prompt, top_tables=None, top_columns=None, json_file_path=None):
+    """Prune the schema for a prompt; SCHEMA_TOP_K / SCHEMA_TOP_COLUMNS give the defaults."""
+    top_tables = top_tables or int(os.getenv("SCHEMA_TOP_K") or DEFAULT_TOP_TABLES)
+    top_columns = top_columns or int(os.getenv("SCHEMA_TOP_COLUMNS") or DEFAULT_TOP_COLUMNS)
+    retriever = get_retriever(json_file_path or DEFAULT_METADATA_FILE)
+    selection = retriever.select(prompt, top_tables, top_columns)
+    _totals["selections"] += 1
+    _totals["prompt_tokens"] += selection.prompt_tokens
+    _totals["full_tokens"] += selection.full_tokens
+    _totals["tokens_saved"] += selection.tokens_saved
+    return selection
+
+
+def stats():
+    """Selections made and prompt tokens sent, whole-schema tokens and tokens saved, summed."""
+    return dict(_totals)
+
+
+def schema_context(prompt):
+    """Selection to put in the agent prompt, or None when SCHEMA_TOP_K is not set."""
+    if not os.getenv("SCHEMA_TOP_K"):
+        return None
+    selection = select_schema(prompt)
+    print(selection.summary(), file=sys.stderr)
+    return selection
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show the schema subset selected for a prompt')
+    parser.add_argument('prompt', help='Natural language prompt')
+    parser.add_argument('--top-tables', '-k', type=int, default=DEFAULT_TOP_TABLES)
+    parser.add_argument('--top-columns', '-c', type=int, default=DEFAULT_TOP_COLUMNS)
+    parser.add_argument('--metadata', default=None, help='Metadata JSON or schema catalog file')
+    args = parser.parse_args()
+    selection = select_schema(args.prompt, args.top_tables, args.top_columns, args.metadata)
+    print(selection.text)
+    print(selection.summary(), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
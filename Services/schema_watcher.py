@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""Background watcher that detects ClickHouse schema changes table by table.
+
+Every poll runs one cheap aggregate over system.columns that returns a
+fingerprint per table. Only tables whose fingerprint changed are
+re-fetched; the table_metadata.json snapshot is rewritten and a
+SchemaEvent naming the added, changed and removed tables is published to
+every subscriber, so derived data (DDL strings, prompt fragments, cached
+NL -> SQL answers) is invalidated only when the schema actually changes.
+
+    python schema_watcher.py reports --interval 60
+"""
+import argparse
+import hashlib
+import sys
+import threading
+from typing import NamedTuple
+
+FINGERPRINT_QUERY = """SELECT database, table, sum(cityHash64(name, type, position)) AS fingerprint
+FROM system.columns
+WHERE database IN {databases:Array(String)}
+GROUP BY database, table"""
+
+DEFAULT_INTERVAL = 60.0
+
+
+class SchemaEvent(NamedTuple):
+    added: tuple
+    changed: tuple
+    removed: tuple
+    fingerprint: str
+
+    @property
+    def tables(self):
+        """Every table the event touches."""
+        return self.added + self.changed + self.removed
+
+
+_listeners = []
+_listeners_lock = threading.Lock()
+
+
+def subscribe(listener):
+    """Call ``listener(event)`` with every published SchemaEvent."""
+    with _listeners_lock:
+        _listeners.append(listener)
+    return listener
+
+
+def unsubscribe(listener):
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def publish(event):
+    """Deliver an event to every subscriber; a failing subscriber does not stop the others."""
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(event)
+        except Exception as e:
+            print(f"Schema event listener failed: {e}", file=sys.stderr)
+
+
+class SchemaWatcher:
+    """Poll per-table schema fingerprints and refresh only what changed.
+
+    Args:
+        databases (list): Databases to watch (default dbconnect.DEFAULT_DATABASES).
+        json_file_path (str): Snapshot rewritten on change (default table_metadata.json);
+            a .sqlite path is re-imported as a schema catalog instead.
+        interval (float): Seconds between polls in the background thread.
+        client: ClickHouse client; one is created on the first poll when omitted.
+    """
+
+    def __init__(self, databases=None, json_file_path=None, interval=DEFAULT_INTERVAL, client=None):
+        import dbconnect
+        self.databases = list(databases or dbconnect.DEFAULT_DATABASES)
+        self.json_file_path = json_file_path or dbconnect.DEFAULT_METADATA_FILE
+        self.interval = interval
+        self.client = client
+        self.fingerprints = {}
+        self.columns = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _client(self):
+        if self.client is None:
+            from mcp_clickhouse import create_clickhouse_client
+            self.client = create_clickhouse_client()
+        return self.client
+
+    def _tablename(self, database, table):
+        # Matches dbconnect.build_metadata: qualify only across several databases
+        return f"{database}.{table}" if len(self.databases) > 1 else table
+
+    def fetch_fingerprints(self):
+        """Return {(database, table): fingerprint} in one query."""
+        result = self._client().query(FINGERPRINT_QUERY, parameters={"databases": self.databases})
+        return {(database, table): int(fingerprint) for database, table, fingerprint in result.result_rows}
+
+    def poll(self):
+        """Check once; refresh changed tables and publish an event. Returns the event or None."""
+        import dbconnect
+        fingerprints = self.fetch_fingerprints()
+        added = [key for key in fingerprints if key not in self.fingerprints]
+        changed = [key for key in fingerprints if key in self.fingerprints and fingerprints[key] != self.fingerprints[key]]
+        removed = [key for key in self.fingerprints if key not in fingerprints]
+        if not (added or changed or removed):
+            return None
+
+        stale = set(added) | set(changed)
+        if stale:
+            rows = dbconnect.fetch_columns(sorted({database for database, _ in stale}),
+                                           sorted({table for _, table in stale}), self._client())
+            fetched = {}
+            for row in rows:
+                if (row.database, row.table) in stale:
+                    fetched.setdefault((row.database, row.table), []).append(row)
+            self.columns.update(fetched)
+        for key in removed:
+            self.columns.pop(key, None)
+        self.fingerprints = fingerprints
+
+        if self.json_file_path:
+            import jsonschema
+            import schema_catalog
+            rows = [row for key in sorted(self.columns) for row in self.columns[key]]
+            metadata = dbconnect.build_metadata(rows)
+            if schema_catalog.is_catalog_path(self.json_file_path):
+                schema_catalog.import_metadata(metadata, self.json_file_path)
+            else:
+                dbconnect.write_snapshot(metadata, self.json_file_path)
+            # Reload now rather than at the registry's next periodic stat
+            jsonschema.get_registry(self.json_file_path).refresh()
+
+        digest = hashlib.sha256(repr(sorted(fingerprints.items())).encode()).hexdigest()
+        event = SchemaEvent(
+            added=tuple(self._tablename(*key) for key in added),
+            changed=tuple(self._tablename(*key) for key in changed),
+            removed=tuple(self._tablename(*key) for key in removed),
+            fingerprint=digest,
+        )
+        publish(event)
+        return event
+
+    def run(self):
+        """Poll until stop() is called."""
+        while not self._stop.is_set():
+            try:
+                event = self.poll()
+                if event:
+                    print(f"Schema change: {len(event.added)} added, {len(event.changed)} changed, "
+                          f"{len(event.removed)} removed", file=sys.stderr)
+            except Exception as e:
+                print(f"Schema watcher poll failed: {e}", file=sys.stderr)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """Start polling in a daemon thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="schema-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Watch ClickHouse schemas and refresh the metadata snapshot on change')
+    parser.add_argument('databases', nargs='*', help='Databases to watch (default: reports)')
+    parser.add_argument('--output', '-o', help='Snapshot file to rewrite (default: table_metadata.json)')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help='Seconds between polls')
+    args = parser.parse_args()
+    watcher = SchemaWatcher(args.databases, args.output, args.interval)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == '__main__':
+    main()
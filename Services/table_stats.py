@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Per-table statistics that steer query generation.
+
+Row counts and partition counts come from system.parts, the time range
+from min/max of the table's time column (answered from part metadata when
+the table is partitioned by it) and the cardinality of LowCardinality
+columns from ``uniq`` over a recent, partition-pruned window. The result
+is cached in table_stats.json; requests only read that file, so nothing
+here touches ClickHouse on the request path.
+
+The agent prompt gets a one-line summary per table and the fallback SQL
+builder uses the statistics to pick a default time window for large
+tables and a ``toStartOfInterval`` bucket for time series.
+
+    python table_stats.py reports -o table_stats.json
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+import json_codec
+
+DEFAULT_STATS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "table_stats.json")
+
+# How often (seconds) load_stats stats the file to look for changes
+CHECK_INTERVAL = 1.0
+# Days of data scanned by uniq() for column cardinalities
+CARDINALITY_DAYS = 30
+
+PARTS_QUERY = """SELECT database, table, sum(rows) AS rows, uniqExact(partition) AS partitions
+FROM system.parts
+WHERE active AND database IN {databases:Array(String)}
+GROUP BY database, table"""
+
+
+class TableStats(NamedTuple):
+    rows: int
+    partitions: int
+    time_column: str = None
+    min_time: str = None
+    max_time: str = None
+    # column -> approximate distinct values; None when not collected
+    cardinality: dict = None
+
+    def span_days(self):
+        """Days between the first and last timestamp, or None when unknown."""
+        if not (self.min_time and self.max_time):
+            return None
+        return (_parse_date(self.max_time) - _parse_date(self.min_time)).days + 1
+
+    def summary(self, tablename):
+        """One line for the agent prompt."""
+        text = f"{tablename}: ~{_human(self.rows)} rows, {self.partitions} partitions"
+        if self.min_time and self.max_time:
+            text += f", {self.time_column} {self.min_time[:10]} .. {self.max_time[:10]}"
+        if self.cardinality:
+            text += "; distinct " + ", ".join(f"{column}~{_human(count)}" for column, count in self.cardinality.items())
+        return text
+
+
+def _parse_date(value):
+    return datetime.fromisoformat(str(value)[:10]).date()
+
+
+def _human(number):
+    for divisor, suffix in ((1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if number >= divisor:
+            return f"{number / divisor:.1f}{suffix}"
+    return str(int(number))
+
+
+def collect(databases=None, json_file_path=None, client=None):
+    """Compute statistics for every table of the databases.
+
+    Args:
+        databases (list): Databases to read (default dbconnect.DEFAULT_DATABASES).
+        json_file_path (str): Schema metadata giving column types (default table_metadata.json).
+        client: ClickHouse client; one is created when omitted.
+
+    Returns:
+        dict: tablename -> TableStats, named like table_metadata.json.
+    """
+    import dbconnect
+    import jsonschema
+    from clickhouse_sql import ClickHouseQueryBuilder
+    databases = list(databases or dbconnect.DEFAULT_DATABASES)
+    if client is None:
+        from mcp_clickhouse import create_clickhouse_client
+        client = create_clickhouse_client()
+    registry = jsonschema.get_registry(json_file_path or dbconnect.DEFAULT_METADATA_FILE)
+
+    stats = {}
+    parts = client.query(PARTS_QUERY, parameters={"databases": databases}).result_rows
+    for database, table, rows, partitions in parts:
+        tablename = f"{database}.{table}" if len(databases) > 1 else table
+        column_types = registry.columns(tablename) or {}
+        # The column the SQL builder filters and buckets on
+        time_column = ClickHouseQueryBuilder(tablename, column_types).time_column if column_types else None
+        min_time = max_time = None
+        cardinality = {}
+        try:
+            if time_column:
+                row = client.query(f"SELECT min({time_column}), max({time_column}) FROM {database}.{table}").result_rows[0]
+                if row[1]:
+                    min_time, max_time = str(row[0]), str(row[1])
+            low_cardinality = [column for column, column_type in column_types.items()
+                               if column_type.startswith("LowCardinality(")]
+            if low_cardinality:
+                query = f"SELECT {', '.join(f'uniq({column})' for column in low_cardinality)} FROM {database}.{table}"
+                if time_column and max_time:
+                    query += f" WHERE {time_column} >= toDateTime('{max_time[:10]}') - INTERVAL {CARDINALITY_DAYS} DAY"
+                counts = client.query(query).result_rows[0]
+                cardinality = {column: int(count) for column, count in zip(low_cardinality, counts)}
+        except Exception as e:
+            print(f"Partial statistics for {tablename}: {e}", file=sys.stderr)
+        stats[tablename] = TableStats(int(rows), int(partitions), time_column, min_time, max_time, cardinality)
+    return stats
+
+
+def write_stats(stats, stats_file=DEFAULT_STATS_FILE):
+    """Atomically write collected statistics to `stats_file`."""
+    import dbconnect
+    payload = {"collected_at": int(time.time()),
+               "tables": {tablename: table._asdict() for tablename, table in stats.items()}}
+    dbconnect.write_snapshot(payload, stats_file)
+
+
+def refresh_stats(databases=None, stats_file=DEFAULT_STATS_FILE, json_file_path=None, client=None):
+    """Collect statistics and write them to `stats_file`."""
+    stats = collect(databases, json_file_path, client)
+    write_stats(stats, stats_file)
+    _cache.clear()
+    return stats
+
+
+# stats_file -> (checked_at, mtime_ns, {tablename: TableStats})
+_cache = {}
+
+
+def load_stats(stats_file=None, check_interval=CHECK_INTERVAL):
+    """Return the cached {tablename: TableStats}; re-read only when the file changed.
+
+    The file is stat'ed at most every `check_interval` seconds. A missing
+    or unreadable file yields an empty dict: statistics are a hint.
+    """
+    stats_file = stats_file or os.getenv("TABLE_STATS_PATH") or DEFAULT_STATS_FILE
+    cached = _cache.get(stats_file)
+    now = time.monotonic()
+    if cached is not None and now - cached[0] < check_interval:
+        return cached[2]
+    try:
+        mtime = os.stat(stats_file).st_mtime_ns
+    except OSError:
+        mtime = None
+    if cached is not None and cached[1] == mtime:
+        stats = cached[2]
+    elif mtime is None:
+        stats = {}
+    else:
+        try:
+            with open(stats_file, "rb") as file:
+                tables = json_codec.loads(file.read()).get("tables", {})
+            stats = {tablename: TableStats(**table) for tablename, table in tables.items()}
+        except (OSError, ValueError, TypeError) as e:
+            print(f"Ignoring table statistics in {stats_file}: {e}", file=sys.stderr)
+            stats = {}
+    _cache[stats_file] = (now, mtime, stats)
+    return stats
+
+
+def get_table_stats(tablename, stats_file=None):
+    """Return the TableStats of one table, or None."""
+    return load_stats(stats_file).get(tablename)
+
+
+def prompt_text(tablenames=None, stats_file=None):
+    """Statistics lines for the agent prompt (all tables by default); empty without statistics."""
+    stats = load_stats(stats_file)
+    names = tablenames if tablenames is not None else list(stats)
+    return "\n".join(stats[tablename].summary(tablename) for tablename in names if tablename in stats)
+
+
+def prompt_section(tablenames=None, stats_file=None):
+    """Statistics block appended to agent instructions; empty without statistics."""
+    text = prompt_text(tablenames, stats_file)
+    if not text:
+        return ""
+    return ("\n\nTable statistics (approximate). Filter large tables on their time column and "
+            f"pick a toStartOfInterval bucket that suits the time range:\n{text}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Collect per-table statistics into table_stats.json')
+    parser.add_argument('databases', nargs='*', help='Databases to read (default: reports)')
+    parser.add_argument('--output', '-o', default=DEFAULT_STATS_FILE, help='Statistics file to write')
+    parser.add_argument('--metadata', default=None, help='Metadata JSON or schema catalog file')
+    args = parser.parse_args()
+    stats = refresh_stats(args.databases, args.output, args.metadata)
+    print(f"Wrote statistics for {len(stats)} tables to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import re
+import zlib
+
+import numpy as np
+
+DEFAULT_DIM = 1 << 16
+
+_SPACE_RE = re.compile(r'\s+')
+_WORD_RE = re.compile(r'[a-z0-9_]+')
+
+
+def normalize_text(text):
+    """Lowercase and collapse whitespace."""
+    return _SPACE_RE.sub(' ', text.lower()).strip()
+
+
+def ngram_terms(text, n_min=3, n_max=5):
+    """Character n-grams of the padded text plus word unigrams and bigrams."""
+    padded = f" {normalize_text(text)} "
+    terms = []
+    for n in range(n_min, n_max + 1):
+        terms.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    words = _WORD_RE.findall(padded)
+    terms.extend('w:' + word for word in words)
+    terms.extend('b:' + first + ' ' + second for first, second in zip(words, words[1:]))
+    return terms
+
+
+def hashed_features(text, dim=DEFAULT_DIM, n_min=3, n_max=5):
+    """Return (indices, values) of the L2-normalised hashed n-gram vector.
+
+    crc32 keeps the hashing stable across processes, unlike ``hash()``.
+    """
+    terms = ngram_terms(text, n_min, n_max)
+    if not terms:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    hashes = np.fromiter((zlib.crc32(term.encode('utf-8')) for term in terms),
+                         dtype=np.int64, count=len(terms)) % dim
+    indices, counts = np.unique(hashes, return_counts=True)
+    values = counts.astype(np.float32)
+    values /= np.sqrt(np.dot(values, values))
+    return indices, values
+
+
+def hashed_matrix(texts, dim=DEFAULT_DIM, n_min=3, n_max=5):
+    """Stack hashed vectors into CSR-style (indptr, indices, values) arrays."""
+    indptr = [0]
+    all_indices = []
+    all_values = []
+    for text in texts:
+        indices, values = hashed_features(text, dim, n_min, n_max)
+        all_indices.append(indices)
+        all_values.append(values)
+        indptr.append(indptr[-1] + len(indices))
+    if not all_indices:
+        return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    return np.asarray(indptr, dtype=np.int64), np.concatenate(all_indices), np.concatenate(all_values)
+